@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from apps.authentication.models import APIUser, TokenBlacklist
+from apps.authentication.models import APIUser, OutboxMessage, TokenBlacklist
 
 # Register your models here.
 
@@ -9,8 +9,22 @@ admin.site.register(APIUser)
 
 @admin.register(TokenBlacklist)
 class TokenBlacklistAdmin(admin.ModelAdmin):
-    list_display = ("jti", "user_id", "token_type", "revoked_at", "expires_at")
+    list_display = ("jti_hex", "user_id", "token_type", "revoked_at", "expires_at")
     list_filter = ("token_type", "revoked_at", "expires_at")
-    search_fields = ("jti", "user_id", "token")
-    readonly_fields = ("jti", "token", "user_id", "token_type", "revoked_at", "expires_at")
+    search_fields = ("user_id",)
+    readonly_fields = ("jti_hex", "user_id", "token_type", "revoked_at", "expires_at")
+    exclude = ("jti",)
     ordering = ("-revoked_at",)
+
+    @admin.display(description="jti")
+    def jti_hex(self, obj):
+        return bytes(obj.jti).hex()
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ("id", "event", "attempts", "available_at", "created_at")
+    list_filter = ("event",)
+    search_fields = ("last_error",)
+    readonly_fields = ("event", "payload", "created_at", "attempts", "last_error")
+    ordering = ("id",)
@@ -1,4 +1,6 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 
 
 class AuthenticationConfig(AppConfig):
@@ -6,6 +8,16 @@ class AuthenticationConfig(AppConfig):
     name = 'apps.authentication'
 
     def ready(self):
+        # Una clave que firma antes de que caduque el JWKS cacheado daría tokens que otros servicios rechazan
+        signing = settings.JWT_SIGNING_KEYS
+        if signing["ACTIVATION_DELAY_SECONDS"] < signing["JWKS_MAX_AGE_SECONDS"]:
+            raise ImproperlyConfigured(
+                'JWT_SIGNING_KEYS["ACTIVATION_DELAY_SECONDS"] debe ser mayor o igual que "JWKS_MAX_AGE_SECONDS"'
+            )
+
+        # Registramos las señales que invalidan la caché de usuarios
+        import apps.authentication.signals  # noqa: F401
+
         # Importamos la extensión de drf-spectacular para la autenticación personalizada
         try:
             import apps.authentication.authentication_extensions  # noqa: F401
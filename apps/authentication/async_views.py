@@ -0,0 +1,275 @@
+"""
+Vistas asíncronas para el despliegue ASGI (``main/asgi.py``).
+
+Responden igual que sus equivalentes DRF síncronas:
+
+- Login y registro calculan el hash de la contraseña en el pool de procesos de
+  ``hashing.py`` y el worker queda libre mientras tanto. Si el pool está lleno
+  responden 503 con ``Retry-After`` sin esperar turno.
+- ``/me/``, ``/token/refresh/`` y ``/token/revoke/`` autentican la cookie JWT con
+  ``CookieJWTAuthentication.aauthenticate``: con las cachés calientes no salen del
+  bucle de eventos. Las peticiones sin cookie (OAuth2, Basic) se delegan en la
+  vista DRF síncrona.
+"""
+import json
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, serializers
+
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from apps.authentication.authentication import CookieJWTAuthentication
+from apps.authentication.hashing import HashingPoolFull, HashingPoolUnavailable, password_hashing_pool
+from apps.authentication.models import APIUser
+from apps.authentication.serializers import (
+    APITokenObtainPairSerializer,
+    APITokenRefreshSerializer,
+    APIUserRegistrationSerializer,
+)
+from apps.authentication.throttling import client_ip, login_throttle
+from apps.authentication.views import (
+    JWTViews,
+    MeView,
+    complete_signup,
+    login_response_data,
+    me_response_data,
+    refresh_error_data,
+    refresh_response_data,
+    revoke_session_tokens,
+    set_login_cookies,
+)
+from main.logging_config import APILogger
+
+_cookie_authentication = CookieJWTAuthentication()
+
+
+def _parse_body(request):
+    if request.content_type == "application/json":
+        return json.loads(request.body or b"{}")
+    return request.POST.dict()
+
+
+def _exception_response(exc):
+    """Respuesta con el mismo formato que el manejador de excepciones de DRF"""
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+    response = JsonResponse(data, status=exc.status_code, safe=False)
+    if isinstance(exc, (exceptions.AuthenticationFailed, exceptions.NotAuthenticated)):
+        response["WWW-Authenticate"] = _cookie_authentication.authenticate_header(None)
+    return response
+
+
+async def _pool_unavailable_response(request, error):
+    # El log toca request.user (sesión en BD): se ejecuta fuera del bucle de eventos
+    await sync_to_async(APILogger.log_request)(
+        "warning",
+        "Password hashing pool full - request rejected"
+        if isinstance(error, HashingPoolFull)
+        else "Password hashing pool broken - request rejected",
+        request,
+        password_hashing_pool.stats(),
+    )
+    response = JsonResponse(
+        {"error": "El servidor está ocupado. Inténtalo de nuevo en unos segundos."},
+        status=503,
+    )
+    response["Retry-After"] = str(settings.PASSWORD_HASHING_POOL["RETRY_AFTER_SECONDS"])
+    return response
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncJWTObtainPairView(View):
+    """Login JWT con el hash de la contraseña fuera del bucle de eventos"""
+
+    http_method_names = ["post"]
+
+    async def post(self, request, *args, **kwargs):
+        try:
+            payload = _parse_body(request)
+        except ValueError:
+            return JsonResponse({"detail": "JSON mal formado"}, status=400)
+
+        # Los intentos por encima del límite se rechazan antes de comprobar la contraseña
+        wait = await login_throttle.acheck(
+            email=payload.get("email") if isinstance(payload, dict) else None,
+            ip=client_ip(request),
+            app=request.headers.get("X-App-Name"),
+        )
+        if wait is not None:
+            throttled = exceptions.Throttled(wait)
+            response = JsonResponse({"detail": throttled.detail}, status=throttled.status_code)
+            response["Retry-After"] = str(math.ceil(wait))
+            return response
+
+        serializer = APITokenObtainPairSerializer()
+        try:
+            attrs = serializer.to_internal_value(payload)
+            data = await serializer.avalidate(attrs, password_hashing_pool)
+        except serializers.ValidationError as e:
+            return JsonResponse(serializers.as_serializer_error(e), status=400)
+        except HashingPoolUnavailable as e:
+            return await _pool_unavailable_response(request, e)
+
+        response = JsonResponse(login_response_data(data, serializer.user), status=200)
+        set_login_cookies(response, getattr(request, "app_name", None), data)
+        return response
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncSignUpView(View):
+    """Registro de usuarios con el hash de la contraseña fuera del bucle de eventos"""
+
+    http_method_names = ["post"]
+
+    async def post(self, request, *args, **kwargs):
+        app_name = getattr(request, "app_name", None)
+        auth_type = getattr(request, "auth_type", None)
+
+        if not app_name or not auth_type:
+            await sync_to_async(APILogger.log_request)(
+                "warning",
+                "SingUp Failed: App name or auth type not provided",
+                request,
+                {"validation_error": "Missing app name or auth type"},
+            )
+            return JsonResponse(
+                {"error": "No se ha proporcionado el nombre de la aplicación"},
+                status=400,
+            )
+
+        try:
+            payload = _parse_body(request)
+        except ValueError:
+            return JsonResponse({"detail": "JSON mal formado"}, status=400)
+
+        serializer = APIUserRegistrationSerializer(data=payload)
+        if not await sync_to_async(serializer.is_valid)():
+            return JsonResponse(serializer.errors, status=400)
+
+        try:
+            encoded_password = await password_hashing_pool.make_password(serializer.validated_data["password1"])
+        except HashingPoolUnavailable as e:
+            return await _pool_unavailable_response(request, e)
+
+        try:
+            user = await sync_to_async(serializer.save)(
+                encoded_password=encoded_password,
+                origin_app=APIUser.origin_app_for(app_name),
+            )
+        except serializers.ValidationError as e:
+            return JsonResponse(serializers.as_serializer_error(e), status=400)
+
+        response_data = await sync_to_async(complete_signup)(user, app_name, auth_type)
+
+        # Evento correcto: muestreado como los de log_api_call, sin salto de hilo si no se registra
+        if APILogger.is_enabled("info") and APILogger.sampled("AsyncSignUpView.post"):
+            await sync_to_async(APILogger.log_request)(
+                "info",
+                "API Call Finished: AsyncSignUpView.post",
+                request,
+                {"event_type": "request_completed", "status_code": 200, "response_data": "[FILTERED]"},
+            )
+        return JsonResponse(response_data, status=200)
+
+
+class _CookieJWTView(View):
+    """
+    Base de las vistas autenticadas con la cookie JWT. ``drf_view`` atiende las
+    peticiones sin cookie para conservar el resto de métodos de autenticación.
+    """
+
+    drf_view = None
+
+    async def authenticate(self, request):
+        """Devuelve ``None`` si la petición está autenticada o la respuesta de error"""
+        try:
+            user, token = await _cookie_authentication.aauthenticate(request)
+        except exceptions.APIException as e:
+            return _exception_response(e)
+
+        request.user, request.auth = user, token
+        return None
+
+    async def fallback(self, request, *args, **kwargs):
+        return await sync_to_async(self.drf_view)(request, *args, **kwargs)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncMeView(_CookieJWTView):
+    drf_view = staticmethod(MeView.as_view())
+    http_method_names = ["get"]
+
+    async def get(self, request, *args, **kwargs):
+        if "access_token" not in request.COOKIES:
+            return await self.fallback(request, *args, **kwargs)
+
+        error = await self.authenticate(request)
+        if error is not None:
+            return error
+
+        return JsonResponse(me_response_data(request.user, request.auth))
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncJWTRefreshView(View):
+    http_method_names = ["post"]
+
+    async def post(self, request, *args, **kwargs):
+        try:
+            payload = _parse_body(request)
+        except ValueError:
+            return JsonResponse({"detail": "JSON mal formado"}, status=400)
+
+        serializer = APITokenRefreshSerializer()
+        try:
+            attrs = serializer.to_internal_value(payload)
+            data = await serializer.avalidate(attrs)
+        except TokenError as e:
+            return _exception_response(InvalidToken(e.args[0]))
+        except serializers.ValidationError as e:
+            # Capturar específicamente errores de token expirado o inválido
+            error_data = refresh_error_data(e)
+            if error_data is None:
+                return JsonResponse(serializers.as_serializer_error(e), status=400)
+
+            await sync_to_async(APILogger.log_request)(
+                "warning",
+                "Token refresh failed - Invalid or expired refresh token",
+                request,
+                {"error": str(e)},
+            )
+            return JsonResponse(error_data, status=401)
+        except exceptions.APIException as e:
+            return _exception_response(e)
+
+        return JsonResponse(refresh_response_data(data))
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncJWTRevokeView(_CookieJWTView):
+    drf_view = staticmethod(JWTViews.JWTRevokeToken.as_view())
+    http_method_names = ["post"]
+
+    async def post(self, request, *args, **kwargs):
+        if "access_token" not in request.COOKIES:
+            return await self.fallback(request, *args, **kwargs)
+
+        error = await self.authenticate(request)
+        if error is not None:
+            return error
+
+        try:
+            payload = _parse_body(request)
+        except ValueError:
+            return JsonResponse({"detail": "JSON mal formado"}, status=400)
+        if not isinstance(payload, dict):
+            payload = {}
+
+        # La revocación escribe en una transacción: se hace en un hilo
+        data, status = await sync_to_async(revoke_session_tokens)(request, payload)
+        return JsonResponse(data, status=status)
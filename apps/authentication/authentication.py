@@ -1,6 +1,9 @@
 from jwt.exceptions import ExpiredSignatureError
+from rest_framework import exceptions
+from rest_framework.authentication import BasicAuthentication
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
 
 
 class CookieJWTAuthentication(JWTAuthentication):
@@ -14,19 +17,54 @@ class CookieJWTAuthentication(JWTAuthentication):
             #                       {})
             return None  # Regresa None si no hay token, evitando continuar con el código
 
-        try:
-            # Validar el token usando el método de la clase base
-            validated_token = self.get_validated_token(token)
+        validated_token = self.validate_cookie_token(token)
+
+        # ✅ Verificar si el token está en la blacklist usando la clave de su claim jti
+        # (con caché en memoria por proceso, ver apps.authentication.revocation)
+        from apps.authentication.revocation import is_token_revoked
+        from apps.authentication.tokens import token_key
+
+        jti = token_key(validated_token.payload, token)
+        if is_token_revoked(jti, validated_token.get("exp")):
+            # APILogger.log_request("warning", "Token is blacklisted", request, {"jti": jti.hex()})
+            raise AuthenticationFailed("Este token ha sido revocado.")
+
+        user = self.get_user(validated_token)
+        self.check_user(user, validated_token)
 
-            # ✅ Verificar si el token está en la blacklist usando hash del token
-            from apps.authentication.models import TokenBlacklist
-            import hashlib
+        # APILogger.log_request("info", "Valid JWT token from cookie", request,
+        #                       {"user_id": user.id, "username": user.username})
 
-            token_hash = hashlib.sha256(token.encode()).hexdigest()[:50]
-            if TokenBlacklist.is_token_blacklisted(token_hash):
-                # APILogger.log_request("warning", "Token is blacklisted", request, {"token_hash": token_hash})
-                raise AuthenticationFailed("Este token ha sido revocado.")
+        return user, validated_token
 
+    async def aauthenticate(self, request):
+        """
+        Variante asíncrona de ``authenticate`` para las vistas ASGI. Con las cachés
+        calientes la petición se resuelve sin salir del bucle de eventos; solo los
+        fallos de caché consultan la base de datos, con el ORM asíncrono.
+        """
+        token = request.COOKIES.get("access_token")
+        if token is None:
+            return None
+
+        validated_token = self.validate_cookie_token(token)
+
+        from apps.authentication.revocation import ais_token_revoked
+        from apps.authentication.tokens import token_key
+
+        if await ais_token_revoked(token_key(validated_token.payload, token), validated_token.get("exp")):
+            raise AuthenticationFailed("Este token ha sido revocado.")
+
+        user = await self.aget_user(validated_token)
+        self.check_user(user, validated_token)
+
+        return user, validated_token
+
+    def validate_cookie_token(self, token):
+        """Valida firma y expiración del token de la cookie (solo CPU, sin base de datos)"""
+        try:
+            # Validar el token usando el método de la clase base
+            return self.get_validated_token(token)
         except ExpiredSignatureError:
             # APILogger.log_request("warning", "Token expired", request, {})
             raise AuthenticationFailed("Token expirado. Por favor, refresca tu token.")
@@ -34,13 +72,58 @@ class CookieJWTAuthentication(JWTAuthentication):
             # APILogger.log_request("warning", "Invalid token", request, {})
             raise AuthenticationFailed("Token inválido.")
 
-        user = self.get_user(validated_token)
-
+    @staticmethod
+    def check_user(user, validated_token):
         if user is None or not user.is_active:
             # APILogger.log_request("error", "Invalid token", request, {"validation_error": "User not found or inactive"})
             raise AuthenticationFailed("Token inválido o usuario inactivo")
 
-        # APILogger.log_request("info", "Valid JWT token from cookie", request,
-        #                       {"user_id": user.id, "username": user.username})
+        # Tokens emitidos antes de la última revocación masiva del usuario
+        if user.token_issued_before_revocation(validated_token.get("iat")):
+            raise AuthenticationFailed("Este token ha sido revocado.")
 
-        return user, validated_token
+    def get_user(self, validated_token):
+        """
+        Devuelve una copia cacheada del usuario (``UserSnapshot``) en lugar de
+        consultar ``APIUser`` en cada petición.
+        """
+        from apps.authentication.user_cache import get_user_snapshot
+
+        user = get_user_snapshot(self._user_id(validated_token))
+        if user is None:
+            raise AuthenticationFailed("Usuario no encontrado", code="user_not_found")
+
+        return user
+
+    async def aget_user(self, validated_token):
+        from apps.authentication.user_cache import aget_user_snapshot
+
+        user = await aget_user_snapshot(self._user_id(validated_token))
+        if user is None:
+            raise AuthenticationFailed("Usuario no encontrado", code="user_not_found")
+
+        return user
+
+    @staticmethod
+    def _user_id(validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("El token no contiene la identificación del usuario")
+
+
+class ThrottledBasicAuthentication(BasicAuthentication):
+    """
+    ``BasicAuthentication`` que aplica el límite de intentos de login antes de
+    comprobar la contraseña: cada petición con credenciales Basic cuesta un hash.
+    """
+
+    def authenticate_credentials(self, userid, password, request=None):
+        from apps.authentication.throttling import client_ip, login_throttle
+
+        if request is not None:
+            wait = login_throttle.check(email=userid, ip=client_ip(request), app=request.headers.get("X-App-Name"))
+            if wait is not None:
+                raise exceptions.Throttled(wait)
+
+        return super().authenticate_credentials(userid, password, request)
@@ -0,0 +1,63 @@
+"""
+Filtro de Bloom en memoria para descartar sin consultar la base de datos los
+tokens que con seguridad no están revocados.
+"""
+import hashlib
+import math
+
+
+class BloomFilter:
+    """
+    Filtro de Bloom sobre un ``bytearray``.
+
+    El número de bits se calcula a partir de la capacidad esperada y la tasa de
+    falsos positivos objetivo, limitado por ``max_bytes``. Si el límite de memoria
+    recorta el filtro, la tasa real de falsos positivos será mayor que la pedida
+    (ver ``estimated_false_positive_rate``).
+    """
+
+    def __init__(self, capacity, error_rate=0.001, max_bytes=None):
+        capacity = max(int(capacity), 1)
+        num_bits = math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        if max_bytes is not None:
+            num_bits = min(num_bits, max_bytes * 8)
+
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(num_bits, 8)
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray(math.ceil(self.num_bits / 8))
+
+    def _positions(self, key):
+        """
+        Calcula las posiciones del elemento mediante doble hashing (Kirsch-Mitzenmacher)
+        a partir de un único digest de 16 bytes.
+        """
+        if isinstance(key, str):
+            key = key.encode()
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def size_bytes(self):
+        return len(self._bits)
+
+    @property
+    def estimated_false_positive_rate(self):
+        """Tasa de falsos positivos esperada con los elementos insertados actualmente"""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
@@ -0,0 +1,236 @@
+"""
+Cachés en memoria por proceso para el camino caliente de autenticación.
+
+Cada worker mantiene sus propias entradas; la coherencia entre workers se
+consigue con un contador de versión en base de datos (``CacheVersion``) que se
+consulta como mucho una vez cada ``poll_interval`` segundos.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Caché LRU acotada con expiración por entrada. Segura entre hilos.
+
+    ``generation`` cuenta las invalidaciones (``delete`` y ``clear``). Quien lee de
+    la base de datos tras un fallo de caché la toma antes de la lectura y la pasa a
+    ``set``: si entretanto otro hilo ha invalidado, el valor leído puede ser anterior
+    a la invalidación y no se guarda.
+    """
+
+    def __init__(self, maxsize=10000, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def get(self, key, default=None):
+        """
+        Devuelve el valor asociado a la clave si existe y no ha expirado.
+        """
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+
+            value, expires_at = item
+            if expires_at <= time.time():
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None, expires_at=None, generation=None):
+        """
+        Guarda un valor. El TTL efectivo nunca supera ``expires_at`` (timestamp
+        UNIX), lo que permite acotar la entrada a la expiración del token. Con
+        ``generation`` no se guarda nada si ha habido invalidaciones desde entonces.
+        """
+        now = time.time()
+        deadline = now + (self.ttl if ttl is None else ttl)
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+        if deadline <= now:
+            return
+
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._data[key] = (value, deadline)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+            self._generation += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._generation += 1
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SharedVersionTTLCache(TTLCache):
+    """
+    Base de las cachés que siguen la versión compartida ``version_key`` de la tabla
+    ``CacheVersion``. Las subclases deciden en ``_apply_version`` qué se invalida
+    al ver una versión nueva.
+    """
+
+    def __init__(self, version_key, maxsize=10000, ttl=60, poll_interval=1.0):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.version_key = version_key
+        self.poll_interval = poll_interval
+        self._version = None
+        self._checked_at = 0.0
+
+    def sync(self):
+        """
+        Consulta la versión compartida si ha pasado ``poll_interval`` desde la
+        última comprobación y, si ha cambiado, invalida lo que corresponda.
+
+        Devuelve ``True`` si la versión ha cambiado desde la última consulta.
+        """
+        if not self._poll_due():
+            return False
+
+        from apps.authentication.models import CacheVersion
+
+        return self._apply_version(CacheVersion.current(self.version_key))
+
+    async def apoll(self):
+        """
+        Variante asíncrona de ``sync`` (``async`` es palabra reservada): mientras no
+        toque consultar la versión no sale del bucle de eventos.
+        """
+        if not self._poll_due():
+            return False
+
+        from apps.authentication.models import CacheVersion
+
+        return self._apply_version(await CacheVersion.acurrent(self.version_key))
+
+    def _poll_due(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.poll_interval:
+            return False
+        self._checked_at = now
+        return True
+
+    def _apply_version(self, version):
+        """Aplica la versión leída; devuelve ``True`` si ha cambiado"""
+        raise NotImplementedError
+
+
+class VersionedTTLCache(SharedVersionTTLCache):
+    """
+    Caché que se vacía entera cuando cambia la versión compartida, de forma que
+    las invalidaciones hechas en un worker se propagan al resto.
+    """
+
+    def _apply_version(self, version):
+        if version == self._version:
+            return False
+
+        if self._version is not None:
+            self.clear()
+        self._version = version
+        return True
+
+    def bump(self):
+        """
+        Incrementa la versión compartida para invalidar la caché en todos los
+        workers. La copia local se vacía inmediatamente.
+        """
+        from apps.authentication.models import CacheVersion
+
+        self.clear()
+        self._version = CacheVersion.bump(self.version_key)
+        self._checked_at = time.monotonic()
+
+
+class KeyInvalidatedTTLCache(SharedVersionTTLCache):
+    """
+    Caché que se invalida clave a clave: ``invalidate(keys)`` anota las claves en
+    ``CacheInvalidation`` e incrementa la versión, y al ver el cambio cada worker
+    borra solo las claves anotadas desde su última lectura.
+
+    Las anotaciones se leen con un margen de ``overlap`` segundos para no perder las
+    confirmadas tarde, y se purgan cuando superan el TTL: para entonces las entradas
+    a las que se refieren ya han expirado en todos los workers.
+    """
+
+    def __init__(self, version_key, maxsize=10000, ttl=60, poll_interval=1.0, overlap=5):
+        super().__init__(version_key, maxsize=maxsize, ttl=ttl, poll_interval=poll_interval)
+        self.overlap = timedelta(seconds=overlap)
+        self._read_at = None
+
+    async def apoll(self):
+        # Leer las claves invalidadas necesita la base de datos
+        if not self._poll_due():
+            return False
+
+        from apps.authentication.models import CacheVersion
+
+        return await sync_to_async(lambda: self._apply_version(CacheVersion.current(self.version_key)))()
+
+    def _apply_version(self, version):
+        if version == self._version:
+            return False
+
+        from apps.authentication.models import CacheInvalidation
+
+        now = timezone.now()
+        if self._read_at is not None:
+            keys = CacheInvalidation.objects.filter(
+                cache_key=self.version_key, created_at__gte=self._read_at - self.overlap
+            ).values_list("item_key", flat=True)
+            for key in keys:
+                self.delete(key)
+        # En la primera lectura la caché está vacía: no hay nada que borrar
+        self._read_at = now
+        self._version = version
+        return True
+
+    def invalidate(self, keys):
+        """
+        Invalida las claves en todos los workers. Debe llamarse después del commit
+        del cambio que las invalida.
+        """
+        from apps.authentication.models import CacheInvalidation, CacheVersion
+
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return
+
+        for key in keys:
+            self.delete(key)
+        CacheInvalidation.objects.bulk_create(
+            [CacheInvalidation(cache_key=self.version_key, item_key=key) for key in keys]
+        )
+        CacheInvalidation.objects.filter(
+            cache_key=self.version_key,
+            created_at__lt=timezone.now() - timedelta(seconds=self.ttl) - self.overlap,
+        ).delete()
+        # La versión local no se actualiza: el próximo sync también debe leer las
+        # claves que otros workers hayan anotado antes que estas
+        CacheVersion.bump(self.version_key)
@@ -0,0 +1,28 @@
+"""
+Filtros de servidor para los listados de usuarios (``UserViewSet``).
+
+Cada filtro tiene un índice detrás (ver ``APIUser.Meta.indexes``) que además
+devuelve las filas en orden de ``id``, de modo que junto con la paginación por
+cursor una página filtrada es un rango de índice con ``LIMIT`` y no un recorrido
+de toda la tabla.
+"""
+from django_filters import rest_framework as filters
+
+from apps.authentication.models import APIUser
+
+
+class UserFilter(filters.FilterSet):
+    origin_app = filters.ChoiceFilter(choices=APIUser.APP_CHOICES, help_text="Aplicación de origen")
+    is_active = filters.BooleanFilter(help_text="Usuarios activos (true) o desactivados (false)")
+    email_prefix = filters.CharFilter(
+        method="filter_email_prefix",
+        help_text="Prefijo del email, sin distinguir mayúsculas (p. ej. ana o ana@ejemplo)",
+    )
+
+    class Meta:
+        model = APIUser
+        fields = ["origin_app", "is_active", "email_prefix"]
+
+    def filter_email_prefix(self, queryset, name, value):
+        # Los emails se guardan en minúsculas: basta con normalizar el prefijo para usar el índice
+        return queryset.filter(email__startswith=value.strip().lower())
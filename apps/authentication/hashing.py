@@ -0,0 +1,154 @@
+"""
+Pool de procesos dedicado al hash de contraseñas.
+
+PBKDF2 es CPU puro: ejecutado en el hilo de la petición ocupa el worker entero y
+las peticiones baratas (``/me/``, ``/token/refresh/``) esperan detrás de una ráfaga
+de logins. Las vistas asíncronas de login y registro envían el hash a este pool,
+de tamaño fijo, y el bucle de eventos sigue atendiendo el resto del tráfico.
+
+El pool limita los hashes pendientes (en curso más en cola) por proceso: cuando
+se alcanza el límite se rechaza la petición al momento con ``HashingPoolFull``
+en lugar de acumular una cola que solo aumentaría la latencia de todos. Si muere
+un proceso del pool (p. ej. por falta de memoria) los trabajos afectados fallan con
+``HashingPoolBroken`` y el siguiente uso crea un pool nuevo.
+"""
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+
+class HashingPoolUnavailable(Exception):
+    """El pool no puede calcular el hash ahora: las vistas responden 503"""
+
+
+class HashingPoolFull(HashingPoolUnavailable):
+    """El pool tiene ya el máximo de hashes pendientes"""
+
+
+class HashingPoolBroken(HashingPoolUnavailable):
+    """Un proceso del pool ha muerto con el trabajo en curso o en cola"""
+
+
+def _init_worker():
+    import django
+
+    django.setup()
+
+
+def _check_password(password, encoded):
+    from django.contrib.auth.hashers import check_password
+
+    return check_password(password, encoded)
+
+
+def _make_password(password):
+    from django.contrib.auth.hashers import make_password
+
+    return make_password(password)
+
+
+class HashingPool:
+    """
+    ``ProcessPoolExecutor`` con límite de trabajos pendientes. Los procesos se
+    crean con ``spawn`` en el primer uso, para no heredar hilos ni conexiones
+    del proceso del servidor.
+    """
+
+    def __init__(self, workers, max_pending):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._pending = 0
+        self._rejected = 0
+        self._completed = 0
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+            return self._executor
+
+    def _acquire(self):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise HashingPoolFull(f"{self._pending} hashes pendientes")
+            self._pending += 1
+
+    def _release(self, future=None):
+        with self._lock:
+            self._pending -= 1
+            self._completed += 1
+
+    def _discard(self, executor):
+        """Descarta un pool roto; el siguiente uso crea uno nuevo"""
+        with self._lock:
+            # Otra petición puede haberlo sustituido ya: no se cierra el nuevo
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, func, *args):
+        """
+        Ejecuta ``func(*args)`` en el pool. Lanza ``HashingPoolFull`` si está lleno y
+        ``HashingPoolBroken`` si un proceso del pool muere.
+        """
+        self._acquire()
+        try:
+            executor = self._get_executor()
+            future = executor.submit(func, *args)
+        except BrokenProcessPool as e:
+            self._release()
+            self._discard(executor)
+            raise HashingPoolBroken(str(e)) from e
+        except BaseException:
+            self._release()
+            raise
+
+        # El contador se libera al terminar el trabajo, aunque el cliente se haya desconectado
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wrap_future(future)
+        except BrokenProcessPool as e:
+            # El proceso murió con el trabajo en curso o en cola
+            self._discard(executor)
+            raise HashingPoolBroken(str(e)) from e
+
+    async def check_password(self, password, encoded):
+        return await self.run(_check_password, password, encoded)
+
+    async def make_password(self, password):
+        return await self.run(_make_password, password)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+
+
+_pool_settings = settings.PASSWORD_HASHING_POOL
+
+password_hashing_pool = HashingPool(
+    workers=_pool_settings["WORKERS"],
+    max_pending=_pool_settings["MAX_PENDING"],
+)
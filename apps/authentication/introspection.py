@@ -0,0 +1,190 @@
+"""
+Introspección de tokens OAuth2 (RFC 7662) con caché en memoria por proceso.
+
+Los servidores de recursos introspectan el mismo token muchas veces por segundo,
+así que el resultado se guarda por el SHA-256 del token (el mismo ``token_checksum``
+de Django OAuth Toolkit) hasta, como mucho, la expiración del token. Las
+revocaciones borran el ``AccessToken`` y la señal ``post_delete`` invalida ese
+checksum en todos los workers (``CacheInvalidation``); un cambio en un usuario
+invalida solo los checksums de sus tokens.
+
+La autenticación del cliente (el servidor de recursos) también se cachea: con los
+secretos hasheados de Django OAuth Toolkit cada comprobación cuesta un PBKDF2.
+"""
+import base64
+import calendar
+import hashlib
+from urllib.parse import quote_plus
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from oauth2_provider.models import get_access_token_model
+from oauth2_provider.oauth2_backends import get_oauthlib_core
+from oauthlib.common import Request as OauthlibRequest
+
+from apps.authentication.cache import KeyInvalidatedTTLCache, VersionedTTLCache
+
+INTROSPECTION_VERSION_KEY = "oauth2_introspection"
+CLIENT_VERSION_KEY = "oauth2_application"
+
+# Scope que permite introspectar presentando un token de acceso (igual que IntrospectTokenView)
+INTROSPECTION_SCOPE = "introspection"
+
+INACTIVE = {"active": False}
+
+_settings = settings.AUTH_CACHES["INTROSPECTION"]
+
+introspection_cache = KeyInvalidatedTTLCache(
+    INTROSPECTION_VERSION_KEY,
+    maxsize=_settings["MAX_SIZE"],
+    ttl=_settings["TTL_SECONDS"],
+    poll_interval=settings.AUTH_CACHES["VERSION_POLL_SECONDS"],
+)
+
+client_cache = VersionedTTLCache(
+    CLIENT_VERSION_KEY,
+    maxsize=1000,
+    ttl=_settings["CLIENT_TTL_SECONDS"],
+    poll_interval=settings.AUTH_CACHES["VERSION_POLL_SECONDS"],
+)
+
+
+def token_checksum(token):
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _token_data(access_token):
+    """Respuesta de introspección con el mismo formato que ``IntrospectTokenView``"""
+    data = {
+        "active": True,
+        "scope": access_token.scope,
+        "exp": int(calendar.timegm(access_token.expires.timetuple())),
+    }
+    if access_token.application_id:
+        data["client_id"] = access_token.application.client_id
+    if access_token.user_id:
+        data["username"] = access_token.user.get_username()
+    return data
+
+
+def introspect_tokens(tokens):
+    """
+    Devuelve la respuesta de introspección de cada token, en el mismo orden. Los
+    tokens que no están en caché se resuelven con una única consulta ``IN``.
+    """
+    introspection_cache.sync()
+
+    checksums = [token_checksum(token) if isinstance(token, str) and token else None for token in tokens]
+    results = {}
+    missing = set()
+    for checksum in checksums:
+        if checksum is None or checksum in results:
+            continue
+        cached = introspection_cache.get(checksum)
+        if cached is None:
+            missing.add(checksum)
+        else:
+            results[checksum] = cached
+
+    if missing:
+        now = timezone.now()
+        access_tokens = (
+            get_access_token_model()
+            .objects.filter(token_checksum__in=missing)
+            .select_related("user", "application")
+            .only(
+                "token_checksum",
+                "scope",
+                "expires",
+                "application__client_id",
+                f"user__{get_user_model().USERNAME_FIELD}",
+            )
+        )
+
+        for access_token in access_tokens:
+            if access_token.expires <= now:
+                continue
+            data = _token_data(access_token)
+            results[access_token.token_checksum] = data
+            introspection_cache.set(access_token.token_checksum, data, expires_at=data["exp"])
+            missing.discard(access_token.token_checksum)
+
+        # Un token inexistente no va a aparecer después (son aleatorios): el negativo también se cachea
+        for checksum in missing:
+            results[checksum] = INACTIVE
+            introspection_cache.set(checksum, INACTIVE, ttl=_settings["NEGATIVE_TTL_SECONDS"])
+
+    return [results[checksum] if checksum is not None else INACTIVE for checksum in checksums]
+
+
+def introspect_token(token):
+    return introspect_tokens([token])[0]
+
+
+def _client_credentials(request):
+    """Credenciales del cliente por HTTP Basic o en el cuerpo (RFC 6749, 2.3.1)"""
+    auth = request.headers.get("Authorization", "")
+    if auth.startswith("Basic "):
+        return auth[len("Basic "):].strip()
+
+    # Form o JSON: se pasan a Basic (codificadas como exige la RFC) para validarlas igual
+    data = request.data if hasattr(request.data, "get") else {}
+    client_id, client_secret = data.get("client_id"), data.get("client_secret")
+    if isinstance(client_id, str) and isinstance(client_secret, str) and client_id and client_secret:
+        return base64.b64encode(f"{quote_plus(client_id)}:{quote_plus(client_secret)}".encode()).decode()
+    return None
+
+
+def _authenticate_client(credentials):
+    """Valida unas credenciales Basic con el validador de Django OAuth Toolkit"""
+    # El backend de Django OAuth Toolkit solo lee el cuerpo como formulario y DRF ya lo ha
+    # consumido: se le pasa una petición OAuthlib con las credenciales en la cabecera
+    oauth_request = OauthlibRequest("", http_method="POST", headers={"HTTP_AUTHORIZATION": f"Basic {credentials}"})
+    return get_oauthlib_core().server.request_validator.authenticate_client(oauth_request)
+
+
+def authenticate_introspection_client(request):
+    """
+    Comprueba que quien introspecta es un cliente OAuth2 autenticado (Basic o
+    credenciales en el cuerpo) o presenta un token de acceso con el scope
+    ``introspection``, como exige ``IntrospectTokenView`` de Django OAuth Toolkit.
+    """
+    auth = request.headers.get("Authorization", "")
+    if auth.startswith("Bearer "):
+        data = introspect_token(auth[len("Bearer "):].strip())
+        return data["active"] and INTROSPECTION_SCOPE in data.get("scope", "").split()
+
+    credentials = _client_credentials(request)
+    if credentials is None:
+        return False
+
+    client_cache.sync()
+    # Solo se guarda el hash de las credenciales, y solo las que han sido válidas
+    key = hashlib.sha256(credentials.encode()).digest()
+    if client_cache.get(key):
+        return True
+
+    if not _authenticate_client(credentials):
+        return False
+    client_cache.set(key, True)
+    return True
+
+
+def invalidate_introspection(checksums):
+    """Invalida en todos los workers la introspección de los tokens indicados"""
+    introspection_cache.invalidate(checksums)
+
+
+def invalidate_user_introspection(user_id):
+    """Invalida la introspección de los tokens vigentes del usuario, que incluye su username"""
+    checksums = (
+        get_access_token_model()
+        .objects.filter(user_id=user_id, expires__gt=timezone.now())
+        .values_list("token_checksum", flat=True)
+    )
+    invalidate_introspection(checksums)
+
+
+def invalidate_clients():
+    client_cache.bump()
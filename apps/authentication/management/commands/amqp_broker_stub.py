@@ -0,0 +1,149 @@
+"""
+Comando de Django que levanta un broker AMQP 0-9-1 mínimo para probar la publicación en
+``user_queue`` sin RabbitMQ.
+Uso: python manage.py amqp_broker_stub [--port 5673] [--nack-rate 0.01] [--close-every 1000]
+
+Acepta conexiones de pika y py-amqp, declara colas, confirma publicaciones (publisher
+confirms, con acks múltiples como RabbitMQ) y descarta los mensajes tras contarlos.
+``--nack-rate`` rechaza una fracción de las publicaciones y ``--close-every`` corta la
+conexión cada N mensajes para probar la reconexión del publicador.
+"""
+import asyncio
+import random
+
+from django.core.management.base import BaseCommand
+from pika import frame, spec
+
+FRAME_MAX = 131072
+
+
+class Command(BaseCommand):
+    help = 'Levanta un broker AMQP de prueba que confirma y descarta los mensajes publicados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Dirección de escucha')
+        parser.add_argument('--port', type=int, default=5673, help='Puerto de escucha')
+        parser.add_argument('--nack-rate', type=float, default=0.0,
+                            help='Fracción de publicaciones rechazadas con basic.nack (0-1)')
+        parser.add_argument('--close-every', type=int, default=0,
+                            help='Cierra la conexión cada N mensajes (0 = nunca)')
+
+    def handle(self, *args, **options):
+        self.nack_rate = options['nack_rate']
+        self.close_every = options['close_every']
+        self.received = 0
+        self.connections = 0
+
+        try:
+            asyncio.run(self.serve(options['host'], options['port']))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stdout.write(f"{self.received} mensaje(s) recibido(s) en {self.connections} conexión(es)")
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Broker AMQP de prueba en amqp://guest:guest@{host}:{port}/ "
+            f"(nack {self.nack_rate:.1%}, cierre cada {self.close_every or '∞'} mensaje(s))"
+        ))
+        async with server:
+            await server.serve_forever()
+
+    async def handle_connection(self, reader, writer):
+        self.connections += 1
+        # Por canal: último delivery_tag (None si no está en modo confirm) y bytes pendientes del mensaje en curso
+        delivery_tags, publishing = {}, {}
+        buffer, received = b'', 0
+
+        def send(channel, method):
+            writer.write(frame.Method(channel, method).marshal())
+
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    return
+                buffer += data
+                acks = {}
+
+                while buffer:
+                    consumed, decoded = frame.decode_frame(buffer)
+                    if not consumed:
+                        break
+                    buffer = buffer[consumed:]
+                    channel = getattr(decoded, 'channel_number', 0)
+
+                    if isinstance(decoded, frame.ProtocolHeader):
+                        send(0, spec.Connection.Start(
+                            server_properties={
+                                'product': 'api_auth amqp_broker_stub',
+                                'capabilities': {'publisher_confirms': True, 'basic.nack': True},
+                            },
+                            mechanisms='PLAIN AMQPLAIN',
+                            locales='en_US',
+                        ))
+                    elif isinstance(decoded, frame.Method):
+                        method = decoded.method
+                        if isinstance(method, spec.Connection.StartOk):
+                            send(0, spec.Connection.Tune(channel_max=2047, frame_max=FRAME_MAX, heartbeat=0))
+                        elif isinstance(method, spec.Connection.Open):
+                            send(0, spec.Connection.OpenOk())
+                        elif isinstance(method, spec.Connection.Close):
+                            send(0, spec.Connection.CloseOk())
+                            await writer.drain()
+                            return
+                        elif isinstance(method, spec.Channel.Open):
+                            delivery_tags[channel] = None
+                            send(channel, spec.Channel.OpenOk())
+                        elif isinstance(method, spec.Channel.Close):
+                            delivery_tags.pop(channel, None)
+                            send(channel, spec.Channel.CloseOk())
+                        elif isinstance(method, spec.Queue.Declare):
+                            send(channel, spec.Queue.DeclareOk(queue=method.queue, message_count=0, consumer_count=0))
+                        elif isinstance(method, spec.Confirm.Select):
+                            delivery_tags[channel] = 0
+                            if not method.nowait:
+                                send(channel, spec.Confirm.SelectOk())
+                        elif isinstance(method, spec.Basic.Publish):
+                            publishing[channel] = None
+                    elif isinstance(decoded, frame.Header):
+                        publishing[channel] = decoded.body_size
+                        if decoded.body_size == 0:
+                            received += self.published(channel, delivery_tags, publishing, acks, send)
+                    elif isinstance(decoded, frame.Body) and publishing.get(channel) is not None:
+                        publishing[channel] -= len(decoded.fragment)
+                        if publishing[channel] <= 0:
+                            received += self.published(channel, delivery_tags, publishing, acks, send)
+
+                    if self.close_every and received >= self.close_every:
+                        # Corte abrupto, sin confirmar lo pendiente
+                        writer.transport.abort()
+                        return
+
+                # Como RabbitMQ, un solo ack múltiple por canal para lo recibido en esta lectura
+                for channel, tag in acks.items():
+                    send(channel, spec.Basic.Ack(delivery_tag=tag, multiple=True))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def published(self, channel, delivery_tags, publishing, acks, send):
+        del publishing[channel]
+        self.received += 1
+        if self.received % 10000 == 0:
+            self.stdout.write(f"{self.received} mensaje(s) recibido(s)")
+
+        if delivery_tags.get(channel) is not None:
+            delivery_tags[channel] += 1
+            tag = delivery_tags[channel]
+            if self.nack_rate and random.random() < self.nack_rate:
+                # Se confirma lo anterior antes del nack para mantener el orden
+                if channel in acks:
+                    send(channel, spec.Basic.Ack(delivery_tag=acks.pop(channel), multiple=True))
+                send(channel, spec.Basic.Nack(delivery_tag=tag, multiple=False, requeue=False))
+            else:
+                acks[channel] = tag
+        return 1
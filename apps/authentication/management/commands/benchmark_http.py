@@ -0,0 +1,168 @@
+"""
+Comando de Django para medir el rendimiento de un servidor en marcha (WSGI o ASGI).
+Uso: python manage.py benchmark_http --url http://127.0.0.1:8000 [--path /api/v1/auth/me/]
+     [--concurrency 100] [--requests 5000] [--idle-connections 500]
+
+Abre ``--idle-connections`` conexiones keep-alive que hacen una petición y se quedan
+ociosas (como las de un gateway) y después lanza ``--requests`` peticiones desde
+``--concurrency`` conexiones keep-alive. Autentica con la cookie JWT de un usuario
+existente. Ejecutarlo contra cada despliegue para compararlos, p. ej.:
+
+    gunicorn main.wsgi --workers 1 --threads 8
+    uvicorn main.asgi:application --workers 1
+"""
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.authentication.models import APIUser
+from apps.authentication.utils import generate_jwt_token
+
+
+class _Connection:
+    """Conexión HTTP/1.1 keep-alive mínima (sin dependencias externas)"""
+
+    def __init__(self, host, port, request):
+        self.host = host
+        self.port = port
+        self.request = request
+        self.reader = None
+        self.writer = None
+
+    async def send(self):
+        """Envía la petición y devuelve el código de estado"""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+        try:
+            self.writer.write(self.request)
+            await self.writer.drain()
+            status, keep_alive = await self._read_response()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            self.close()
+            raise
+
+        if not keep_alive:
+            self.close()
+        return status
+
+    async def _read_response(self):
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError("El servidor cerró la conexión")
+        status = int(status_line.split()[1])
+
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size = int((await self.reader.readline()).strip(), 16)
+                await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        else:
+            await self.reader.readexactly(int(headers.get("content-length", 0)))
+
+        return status, headers.get("connection", "").lower() != "close"
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+class Command(BaseCommand):
+    help = 'Mide peticiones por segundo y latencias de un endpoint autenticado con conexiones keep-alive'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='URL base del servidor')
+        parser.add_argument('--path', default='/api/v1/auth/me/', help='Endpoint (GET) a medir')
+        parser.add_argument('--concurrency', type=int, default=100, help='Conexiones activas simultáneas')
+        parser.add_argument('--requests', type=int, default=5000, help='Número total de peticiones')
+        parser.add_argument(
+            '--idle-connections',
+            type=int,
+            default=0,
+            help='Conexiones keep-alive ociosas que se mantienen abiertas durante la medición',
+        )
+        parser.add_argument('--email', default=None, help='Usuario del token JWT (por defecto el primero activo)')
+
+    def handle(self, *args, **options):
+        users = APIUser.objects.filter(is_active=True)
+        user = users.filter(email=options['email']).first() if options['email'] else users.order_by('id').first()
+        if user is None:
+            raise CommandError('No hay ningún usuario activo con el que generar el token')
+
+        url = urlsplit(options['url'])
+        token = generate_jwt_token(user)['access']
+        request = (
+            f"GET {options['path']} HTTP/1.1\r\n"
+            f"Host: {url.netloc}\r\n"
+            f"Cookie: access_token={token}\r\n"
+            "X-App-Name: benchmark\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        ).encode()
+
+        result = asyncio.run(self.run(url.hostname, url.port or 80, request, options))
+
+        latencies = sorted(result['latencies'])
+        if not latencies:
+            raise CommandError('Ninguna petición terminó correctamente')
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+        self.stdout.write(f"Conexiones ociosas:   {result['idle']}")
+        self.stdout.write(f"Peticiones:           {len(latencies)} correctas, {result['errors']} errores")
+        self.stdout.write(f"Códigos de estado:    {result['statuses']}")
+        self.stdout.write(
+            f"Latencia (ms):        media {statistics.mean(latencies) * 1000:.1f}, "
+            f"p50 {percentile(0.50):.1f}, p95 {percentile(0.95):.1f}, p99 {percentile(0.99):.1f}"
+        )
+        self.stdout.write(self.style.SUCCESS(f"✓ Rendimiento: {len(latencies) / result['elapsed']:.1f} peticiones/s"))
+
+    async def run(self, host, port, request, options):
+        idle = [_Connection(host, port, request) for _ in range(options['idle_connections'])]
+        opened = await asyncio.gather(*(conn.send() for conn in idle), return_exceptions=True)
+
+        remaining = options['requests']
+        latencies, statuses, errors = [], {}, 0
+
+        async def worker():
+            nonlocal remaining, errors
+            conn = _Connection(host, port, request)
+            while remaining > 0:
+                remaining -= 1
+                start = time.perf_counter()
+                try:
+                    status = await conn.send()
+                except (OSError, asyncio.IncompleteReadError, ValueError):
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+                statuses[status] = statuses.get(status, 0) + 1
+            conn.close()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(options['concurrency'])))
+        elapsed = time.perf_counter() - start
+
+        for conn in idle:
+            conn.close()
+
+        return {
+            'idle': sum(1 for status in opened if isinstance(status, int)),
+            'latencies': latencies,
+            'statuses': statuses,
+            'errors': errors,
+            'elapsed': elapsed,
+        }
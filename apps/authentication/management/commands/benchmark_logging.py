@@ -0,0 +1,140 @@
+"""
+Comando de Django para medir lo que cuesta el log de la API en cada petición.
+Uso: python manage.py benchmark_logging [--requests 20000] [--pause-ms 0.2] [--stall-every 500] [--stall-ms 50]
+
+Reproduce lo que hace ``log_api_call`` en una petición (dos ``APILogger.log_request``)
+contra un fichero temporal, primero escribiendo en el hilo de la petición (``FileHandler``,
+el comportamiento anterior) y después a través de ``QueueLogHandler``. ``--stall-every`` y
+``--stall-ms`` simulan un disco ocupado: una de cada N escrituras se queda bloqueada.
+``--pause-ms`` separa las peticiones como lo haría el resto de su trabajo (consultas, red),
+durante el que el hilo del listener puede escribir.
+"""
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from main.logging_config import APILogger, CompressedRotatingFileHandler, QueueLogHandler, logger
+
+SINK = 'benchmark_logging.output'
+
+
+class StallingFileHandler(CompressedRotatingFileHandler):
+    """Fichero de log en el que una de cada ``stall_every`` escrituras tarda ``stall_ms``"""
+
+    def __init__(self, *args, stall_every=0, stall_ms=0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stall_every = stall_every
+        self.stall_seconds = stall_ms / 1000
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+        if self.stall_every and self.count % self.stall_every == 0:
+            time.sleep(self.stall_seconds)
+        super().emit(record)
+
+
+class Command(BaseCommand):
+    help = 'Mide el coste por petición del log de la API, síncrono y a través de la cola'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000, help='Peticiones simuladas por escenario')
+        parser.add_argument('--pause-ms', type=float, default=0.2,
+                            help='Pausa entre peticiones, fuera de la medida (0 = bucle cerrado)')
+        parser.add_argument('--stall-every', type=int, default=500,
+                            help='Una de cada N escrituras se bloquea (0 = disco sin bloqueos)')
+        parser.add_argument('--stall-ms', type=float, default=50, help='Duración de cada bloqueo en ms')
+        parser.add_argument('--queue-size', type=int, default=settings.LOGGING['handlers']['queue']['maxsize'],
+                            help='Tamaño de la cola de QueueLogHandler')
+
+    def handle(self, *args, **options):
+        request = self.build_request()
+        saved = logger.handlers[:], logger.propagate
+        logger.propagate = False
+
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                filename = os.path.join(directory, 'api.log')
+
+                file_handler = self.file_handler(filename, options)
+                logger.handlers = [file_handler]
+                latencies = self.run(request, options['requests'], options['pause_ms'] / 1000)
+                file_handler.close()
+                self.report('Síncrono (FileHandler)', latencies)
+
+                file_handler = self.file_handler(filename, options)
+                sink = logging.getLogger(SINK)
+                sink.handlers, sink.propagate = [file_handler], False
+                queue_handler = QueueLogHandler(SINK, maxsize=options['queue_size'])
+                logger.handlers = [queue_handler]
+                latencies = self.run(request, options['requests'], options['pause_ms'] / 1000)
+                start = time.perf_counter()
+                stats = queue_handler.stats()
+                queue_handler.close()
+                drain = time.perf_counter() - start
+                file_handler.close()
+                self.report('Cola (QueueLogHandler)', latencies)
+                self.stdout.write(
+                    f"  {stats['dropped']} descartado(s), profundidad máx. {stats['max_depth']}/{stats['maxsize']}, "
+                    f"{drain * 1000:.0f} ms para vaciar la cola al cerrar"
+                )
+        finally:
+            logger.handlers, logger.propagate = saved
+
+        self.stdout.write(self.style.SUCCESS("✓ Benchmark completado"))
+
+    def build_request(self):
+        django_request = APIRequestFactory().post(
+            '/api/v1/auth/token/',
+            {'email': 'benchmark@example.com', 'password': 'Passw0rd!'},
+            format='json',
+            HTTP_X_APP_NAME='mi_app_web',
+            HTTP_USER_AGENT='benchmark_logging',
+        )
+        request = Request(django_request, parsers=[JSONParser()])
+        request.user = AnonymousUser()
+        request.data  # El body se parsea una vez, como en la vista
+        return request
+
+    def file_handler(self, filename, options):
+        handler = StallingFileHandler(
+            filename,
+            maxBytes=settings.LOGGING['handlers']['file']['maxBytes'],
+            backupCount=2,
+            stall_every=options['stall_every'],
+            stall_ms=options['stall_ms'],
+        )
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        return handler
+
+    def run(self, request, count, pause):
+        latencies = []
+        for _ in range(count):
+            if pause:
+                time.sleep(pause)
+            start = time.perf_counter()
+            # Lo mismo que log_api_call en una petición que termina bien
+            APILogger.log_request('info', 'API Call Started: Benchmark.post', request,
+                                  {'event_type': 'api_call_started'})
+            APILogger.log_request('info', 'API Call Finished: Benchmark.post', request,
+                                  {'event_type': 'request_completed', 'status_code': 200, 'response_data': '[FILTERED]'})
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    def report(self, label, latencies):
+        latencies = sorted(latencies)
+        self.stdout.write(
+            f"{label}: media {statistics.mean(latencies) * 1e6:.1f} µs, "
+            f"p50 {latencies[len(latencies) // 2] * 1e6:.1f} µs, "
+            f"p99 {latencies[int(len(latencies) * 0.99)] * 1e6:.1f} µs, "
+            f"máx. {latencies[-1] * 1000:.1f} ms por petición"
+        )
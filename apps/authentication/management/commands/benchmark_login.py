@@ -0,0 +1,87 @@
+"""
+Comando de Django para medir el coste de CPU de un login JWT.
+Uso: python manage.py benchmark_login [--iterations 20] [--app-name mi_app_web]
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from apps.authentication.models import APIUser
+from apps.authentication.throttling import login_throttle
+
+BENCHMARK_EMAIL = "benchmark-login@example.com"
+BENCHMARK_PASSWORD = "Benchmark-Passw0rd!"
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Mide el tiempo de CPU, las consultas y los hashes de contraseña por login JWT'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Número de logins a medir')
+        parser.add_argument(
+            '--app-name',
+            default=None,
+            help='Aplicación (cabecera X-App-Name) con autenticación JWT; por defecto la primera configurada',
+        )
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        app_name = options['app_name'] or next(
+            (app for app, method in settings.AUTH_METHODS.items() if method == 'jwt'), None
+        )
+        if app_name is None:
+            raise CommandError('No hay ninguna aplicación con autenticación JWT en AUTH_METHODS')
+
+        # Coste de referencia: una comprobación de contraseña con el hasher configurado
+        encoded = make_password(BENCHMARK_PASSWORD)
+        start = time.process_time()
+        for _ in range(iterations):
+            check_password(BENCHMARK_PASSWORD, encoded)
+        hash_cpu = (time.process_time() - start) / iterations
+
+        cpu_times, wall_times, query_counts = [], [], []
+        # Son logins repetidos del mismo usuario: el límite de intentos los rechazaría a partir del quinto
+        throttle_enabled, login_throttle.enabled = login_throttle.enabled, False
+        try:
+            # El usuario de prueba se crea y se descarta dentro de la misma transacción
+            with transaction.atomic():
+                APIUser.objects.filter(email=BENCHMARK_EMAIL).delete()
+                APIUser.objects.create_user(BENCHMARK_EMAIL, BENCHMARK_PASSWORD)
+
+                client = Client(HTTP_X_APP_NAME=app_name)
+                credentials = {'email': BENCHMARK_EMAIL, 'password': BENCHMARK_PASSWORD}
+                for _ in range(iterations):
+                    cpu, wall = time.process_time(), time.perf_counter()
+                    with CaptureQueriesContext(connection) as queries:
+                        response = client.post('/api/v1/auth/token/', credentials, content_type='application/json')
+                    cpu_times.append(time.process_time() - cpu)
+                    wall_times.append(time.perf_counter() - wall)
+                    query_counts.append(len(queries.captured_queries))
+
+                    if response.status_code != 200:
+                        raise CommandError(f'El login devolvió {response.status_code}: {response.content[:200]!r}')
+
+                raise _Rollback
+        except _Rollback:
+            pass
+        finally:
+            login_throttle.enabled = throttle_enabled
+
+        login_cpu = sum(cpu_times) / iterations
+        self.stdout.write(f"Hash de contraseña:   {hash_cpu * 1000:.1f} ms de CPU")
+        self.stdout.write(f"Login (CPU):          {login_cpu * 1000:.1f} ms por login")
+        self.stdout.write(f"Login (reloj):        {sum(wall_times) / iterations * 1000:.1f} ms por login")
+        self.stdout.write(f"Consultas:            {sum(query_counts) / iterations:.1f} por login")
+        self.stdout.write(f"Hashes (estimados):   {login_cpu / hash_cpu:.2f} por login")
+        self.stdout.write(
+            self.style.SUCCESS(f"✓ Capacidad: {1 / login_cpu:.1f} logins/s por núcleo de CPU")
+        )
@@ -0,0 +1,66 @@
+"""
+Comando de Django para medir la emisión de tokens OAuth2 (generate_oauth2_token).
+Uso: python manage.py benchmark_oauth2_tokens [--iterations 500]
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from oauth2_provider.models import Application
+
+from apps.authentication.models import APIUser
+from apps.authentication.utils import OAUTH2_APPLICATION_NAME, generate_oauth2_token
+
+BENCHMARK_EMAIL = "benchmark-oauth2@example.com"
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _is_savepoint(sql):
+    return sql.startswith(("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT"))
+
+
+class Command(BaseCommand):
+    help = 'Mide el rendimiento y las consultas por emisión de tokens OAuth2'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=500, help='Número de pares de tokens a emitir')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+
+        try:
+            # Usuario, aplicación y tokens de prueba se descartan al final
+            with transaction.atomic():
+                user = APIUser.objects.create_user(BENCHMARK_EMAIL, None)
+                if not Application.objects.filter(name=OAUTH2_APPLICATION_NAME).exists():
+                    Application.objects.create(
+                        name=OAUTH2_APPLICATION_NAME,
+                        client_type=Application.CLIENT_CONFIDENTIAL,
+                        authorization_grant_type=Application.GRANT_PASSWORD,
+                    )
+
+                # Calienta la caché de la aplicación
+                generate_oauth2_token(user)
+
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    for _ in range(iterations):
+                        tokens = generate_oauth2_token(user)
+                    elapsed = time.perf_counter() - start
+
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        # Dentro de la transacción del benchmark el atomic() de cada emisión es un savepoint;
+        # fuera de ella es BEGIN/COMMIT
+        statements = [q['sql'] for q in queries.captured_queries if not _is_savepoint(q['sql'])]
+
+        self.stdout.write(f"Consultas:            {len(statements) / iterations:.1f} por emisión (sin BEGIN/COMMIT)")
+        self.stdout.write(f"Latencia:             {elapsed / iterations * 1000:.2f} ms por emisión")
+        self.stdout.write(f"Longitud del token:   {len(tokens['access'])} caracteres")
+        self.stdout.write(self.style.SUCCESS(f"✓ Rendimiento: {iterations / elapsed:.1f} emisiones/s"))
@@ -1,6 +1,6 @@
 """
 Comando de Django para limpiar tokens expirados de la blacklist.
-Uso: python manage.py cleanup_expired_tokens
+Uso: python manage.py cleanup_expired_tokens [--batch-size 1000] [--max-seconds 300] [--sleep 0.05] [--dry-run]
 """
 from django.core.management.base import BaseCommand
 
@@ -10,20 +10,50 @@ from apps.authentication.models import TokenBlacklist
 class Command(BaseCommand):
     help = 'Limpia tokens expirados de la blacklist'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Filas por lote de borrado (por defecto TOKEN_BLACKLIST_CLEANUP["BATCH_SIZE"])',
+        )
+        parser.add_argument(
+            '--max-seconds',
+            type=float,
+            default=None,
+            help='Duración máxima; lo pendiente queda para la siguiente ejecución (0 = sin límite)',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=None,
+            help='Segundos de pausa entre lotes',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Muestra lo que se eliminaría sin borrar nada',
+        )
+
     def handle(self, *args, **options):
-        self.stdout.write('Limpiando tokens expirados...')
+        dry_run = options['dry_run']
+        self.stdout.write('Simulando limpieza de tokens expirados...' if dry_run else 'Limpiando tokens expirados...')
 
-        # Obtener cuenta antes de limpiar
-        from django.utils import timezone
-        expired_count = TokenBlacklist.objects.filter(
-            expires_at__lt=timezone.now()
-        ).count()
+        # Se eliminan buckets de expiración completos (particiones en PostgreSQL) y lotes de filas
+        result = TokenBlacklist.cleanup_expired_tokens(
+            batch_size=options['batch_size'],
+            max_seconds=options['max_seconds'],
+            sleep_seconds=options['sleep'],
+            dry_run=dry_run,
+            progress=self.report_progress,
+        )
 
-        # Limpiar tokens expirados
-        TokenBlacklist.cleanup_expired_tokens()
+        action = 'se eliminarían' if dry_run else 'eliminado(s)'
+        summary = f'{result["rows"]} token(s) expirado(s) {action} en {result["buckets"]} bucket(s)'
+        if result['complete']:
+            self.stdout.write(self.style.SUCCESS(f'✓ Limpieza completada: {summary}'))
+        else:
+            self.stdout.write(self.style.WARNING(f'Limpieza parcial (tiempo agotado o bloqueo): {summary}'))
 
-        self.stdout.write(
-            self.style.SUCCESS(
-                f'✓ Limpieza completada: {expired_count} token(s) expirado(s) eliminado(s)'
-            )
-        )
+    def report_progress(self, result):
+        self.stdout.write(f'  lote {result["batches"]}: {result["rows"]} token(s)')
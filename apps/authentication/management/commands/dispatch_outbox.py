@@ -0,0 +1,58 @@
+"""
+Comando de Django que entrega los eventos del outbox (avisos al servicio de dominio).
+Uso: python manage.py dispatch_outbox [--once] [--batch-size 100] [--poll-seconds 1] [--retry-abandoned]
+
+Sin ``--once`` se queda en ejecución como worker hasta recibir SIGINT/SIGTERM (termina
+el lote en curso). Se pueden lanzar varios en paralelo.
+"""
+import signal
+
+from django.core.management.base import BaseCommand
+
+from apps.authentication.models import OutboxMessage
+from apps.authentication.outbox import retry_abandoned, run_dispatcher
+
+
+class Command(BaseCommand):
+    help = 'Entrega los eventos pendientes del outbox con reintentos y backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Termina cuando no quedan mensajes listos')
+        parser.add_argument('--batch-size', type=int, default=None, help='Mensajes reclamados por lote')
+        parser.add_argument('--poll-seconds', type=float, default=None,
+                            help='Espera entre consultas cuando la cola está vacía')
+        parser.add_argument('--retry-abandoned', action='store_true',
+                            help='Vuelve a poner en cola los mensajes que agotaron los intentos')
+        parser.add_argument('--verbose', action='store_true', help='Muestra el resultado de cada lote')
+
+    def handle(self, *args, **options):
+        if options['retry_abandoned']:
+            self.stdout.write(f"{retry_abandoned()} mensaje(s) abandonado(s) vuelven a la cola")
+
+        self.stopping = False
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, self.request_stop)
+
+        totals = run_dispatcher(
+            batch_size=options['batch_size'],
+            poll_seconds=options['poll_seconds'],
+            once=options['once'],
+            progress=self.report_batch if options['verbose'] else None,
+            should_stop=lambda: self.stopping,
+        )
+
+        pending = OutboxMessage.objects.filter(available_at__isnull=False).count()
+        abandoned = OutboxMessage.objects.filter(available_at__isnull=True).count()
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Outbox: {totals['delivered']} entregado(s), {totals['failed']} reintento(s) programado(s), "
+            f"{totals['abandoned']} abandonado(s) - quedan {pending} pendiente(s) y {abandoned} abandonado(s)"
+        ))
+
+    def request_stop(self, signum, frame):
+        self.stopping = True
+
+    def report_batch(self, result):
+        self.stdout.write(
+            f"  Lote: {result['claimed']} reclamado(s), {result['delivered']} entregado(s), "
+            f"{result['failed']} fallido(s), {result['abandoned']} abandonado(s)"
+        )
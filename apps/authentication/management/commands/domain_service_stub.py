@@ -0,0 +1,80 @@
+"""
+Comando de Django que levanta un servicio de dominio de prueba para desarrollo local.
+Uso: python manage.py domain_service_stub [--port 8001] [--fail-rate 0.2] [--delay 0.5]
+
+Responde 201 a los avisos de usuario creado (``POST /auth/create-domain-user/``) y
+permite simular errores 503 y latencia para probar los reintentos del outbox. Muestra
+los avisos repetidos (misma ``Idempotency-Key``) que llegan por la entrega "al menos
+una vez".
+"""
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Levanta un servicio de dominio de prueba que recibe los avisos de usuario creado'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Dirección de escucha')
+        parser.add_argument('--port', type=int, default=8001, help='Puerto de escucha')
+        parser.add_argument('--fail-rate', type=float, default=0.0,
+                            help='Fracción de peticiones que responden 503 (0-1)')
+        parser.add_argument('--delay', type=float, default=0.0, help='Segundos de latencia por petición')
+
+    def handle(self, *args, **options):
+        fail_rate, delay = options['fail_rate'], options['delay']
+        stdout, style = self.stdout, self.style
+        seen = set()
+        lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    self.rfile.read(length)
+                if delay:
+                    time.sleep(delay)
+
+                if random.random() < fail_rate:
+                    self.respond(503, b'{"detail": "Servicio no disponible (simulado)"}')
+                    return
+
+                key = self.headers.get('Idempotency-Key')
+                with lock:
+                    repeated = key in seen
+                    seen.add(key)
+                    received = len(seen)
+                self.respond(201, b'{}')
+                if repeated:
+                    stdout.write(style.WARNING(f"Aviso repetido: {key}"))
+                elif received % 100 == 0:
+                    stdout.write(f"{received} aviso(s) recibido(s)")
+
+            def respond(self, status, body):
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((options['host'], options['port']), Handler)
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Servicio de dominio de prueba en http://{options['host']}:{options['port']}/ "
+            f"(errores {fail_rate:.0%}, latencia {delay}s)"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f"{len(seen)} aviso(s) distinto(s) recibido(s)")
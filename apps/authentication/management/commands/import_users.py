@@ -0,0 +1,70 @@
+"""
+Comando de Django para importar usuarios en bloque desde un fichero CSV o JSONL.
+Uso: python manage.py import_users usuarios.csv [--format csv|jsonl] [--batch-size 1000] [--workers 8]
+     [--origin-app pedidos] [--checkpoint usuarios.csv.checkpoint] [--restart]
+
+Columnas: ``email`` (obligatoria), ``password`` (en claro) o ``password_hash`` (formato
+de Django, p. ej. ``pbkdf2_sha256$...``), ``first_name``, ``last_name`` y ``origin_app``.
+Sin contraseña el usuario se crea con una contraseña inutilizable. Si se interrumpe,
+volver a ejecutar el mismo comando continúa desde el último lote guardado.
+"""
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.authentication.models import APIUser
+from apps.authentication.user_import import UserImporter, UserImportError
+
+
+class Command(BaseCommand):
+    help = 'Importa usuarios en bloque desde un fichero CSV o JSONL, con checkpoint para reanudar'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Fichero CSV (con cabecera) o JSONL')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], default=None,
+                            help='Formato del fichero (por defecto según la extensión)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Usuarios por lote de bulk_create')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Procesos para hashear contraseñas en claro (por defecto, uno por CPU)')
+        parser.add_argument('--origin-app', choices=[app for app, _label in APIUser.APP_CHOICES], default=None,
+                            help='Aplicación de origen de los registros que no traen origin_app')
+        parser.add_argument('--checkpoint', default=None, help='Fichero de checkpoint (por defecto <path>.checkpoint)')
+        parser.add_argument('--restart', action='store_true', help='Descarta el checkpoint y empieza desde el principio')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'No existe el fichero {path}')
+
+        checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+        if options['restart'] and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+        importer = UserImporter(
+            path,
+            file_format=options['format'],
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            default_origin_app=options['origin_app'],
+            checkpoint_path=checkpoint,
+            progress=self.report_progress,
+        )
+
+        try:
+            result = importer.run()
+        except UserImportError as e:
+            raise CommandError(f'{e} (usa --restart o --checkpoint)')
+
+        if result['resumed_from']:
+            self.stdout.write(f"Reanudado tras {result['resumed_from']} registro(s) ya importados")
+
+        processed = result['records'] - result['resumed_from']
+        rate = processed / result['seconds'] if result['seconds'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Importación completada: {result['created']} creado(s), {result['skipped']} omitido(s) "
+            f"(ya existían), {result['invalid']} inválido(s), {result['hashed']} contraseña(s) hasheada(s) "
+            f"- {processed} registro(s) en {result['seconds']:.1f}s ({rate:.0f} registros/s)"
+        ))
+
+    def report_progress(self, stats, rate):
+        self.stdout.write(f"  {stats['records']} registro(s), {stats['created']} creado(s) - {rate:.0f} registros/s")
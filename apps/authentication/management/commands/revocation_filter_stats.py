@@ -0,0 +1,52 @@
+"""
+Comando de Django para inspeccionar el filtro de Bloom de tokens revocados.
+Uso: python manage.py revocation_filter_stats [--probes 100000]
+"""
+import secrets
+
+from django.core.management.base import BaseCommand
+
+from apps.authentication.models import TokenBlacklist
+from apps.authentication.revocation import revocation_filter
+from apps.authentication.tokens import JTI_KEY_BYTES
+
+
+class Command(BaseCommand):
+    help = 'Construye el filtro de tokens revocados y muestra su tamaño y tasa de aciertos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--probes',
+            type=int,
+            default=100_000,
+            help='Número de identificadores aleatorios (no revocados) con los que medir el filtro',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Construyendo filtro de tokens revocados...')
+        revocation_filter.rebuild()
+        revocation_filter.reset_stats()
+
+        # Los identificadores aleatorios nunca están revocados: todo positivo es un falso positivo
+        for _ in range(options['probes']):
+            jti = secrets.token_bytes(JTI_KEY_BYTES)
+            if revocation_filter.might_contain(jti):
+                revocation_filter.record_result(TokenBlacklist.is_token_blacklisted(jti))
+
+        stats = revocation_filter.describe()
+        lookups = stats['lookups']
+        observed_fp = stats['false_positives'] / lookups if lookups else 0.0
+
+        self.stdout.write(f"Elementos:               {stats['items']} / {stats['capacity']}")
+        self.stdout.write(
+            f"Tamaño:                  {stats['size_bytes']} bytes "
+            f"({stats['num_bits']} bits, {stats['num_hashes']} hashes)"
+        )
+        self.stdout.write(f"Marca de agua:           {stats['high_water_mark']}")
+        self.stdout.write(f"Falsos positivos (est.): {stats['estimated_false_positive_rate']:.6f}")
+        self.stdout.write(f"Falsos positivos (obs.): {observed_fp:.6f} en {lookups} sondas")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✓ Tasa de aciertos: {stats['hit_rate']:.2%} de las consultas resueltas sin base de datos"
+            )
+        )
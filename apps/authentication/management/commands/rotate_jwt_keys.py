@@ -0,0 +1,73 @@
+"""
+Comando de Django para rotar las claves de firma de los tokens JWT.
+Uso: python manage.py rotate_jwt_keys [--algorithm RS256|EdDSA] [--list] [--prune]
+
+Crea una clave nueva en ``JWT_SIGNING_KEYS["KEYS_DIR"]``. Se publica en el JWKS al
+momento y empieza a firmar pasados ``ACTIVATION_DELAY_SECONDS``; la clave anterior
+se sigue aceptando hasta que expiran sus tokens. ``--prune`` borra las claves que
+ya no se publican.
+"""
+import os
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.authentication.signing import ALGORITHMS, generate_private_key, keyring, write_private_key
+
+
+def _format(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class Command(BaseCommand):
+    help = 'Crea una clave de firma JWT nueva y borra las que ya han expirado'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--algorithm',
+            choices=sorted(ALGORITHMS),
+            default='RS256',
+            help='Algoritmo de la clave nueva (' + ', '.join(f'{a}: {k}' for a, k in ALGORITHMS.items()) + ')',
+        )
+        parser.add_argument('--list', action='store_true', help='Solo muestra las claves y su estado')
+        parser.add_argument('--prune', action='store_true', help='Borra las claves que ya no se publican')
+
+    def handle(self, *args, **options):
+        keys_dir = settings.JWT_SIGNING_KEYS["KEYS_DIR"]
+        if not keys_dir:
+            raise CommandError('JWT_SIGNING_KEYS["KEYS_DIR"] (variable JWT_KEYS_DIR) no está configurado')
+
+        if not options['list']:
+            os.makedirs(keys_dir, mode=0o700, exist_ok=True)
+            try:
+                kid = write_private_key(keys_dir, generate_private_key(options['algorithm']))
+            except FileExistsError:
+                raise CommandError('Ya existe una clave creada en este mismo segundo')
+            self.stdout.write(self.style.SUCCESS(f"✓ Clave {kid} ({options['algorithm']}) creada"))
+
+        keyring.reload()
+        now = time.time()
+
+        if options['prune']:
+            for key in keyring.expired_keys(now):
+                os.remove(os.path.join(keys_dir, f"{key.kid}.pem"))
+                self.stdout.write(f"Clave {key.kid} eliminada")
+            keyring.reload()
+
+        active = keyring.schedule(now)[0]
+        for key, activates_at, retires_at in keyring.timeline(now):
+            if key is active:
+                state = "firmando"
+            elif activates_at > now:
+                state = f"publicada, firmará desde {_format(activates_at)}"
+            elif retires_at > now:
+                state = f"retirada, se acepta hasta {_format(retires_at)}"
+            else:
+                state = "expirada (--prune la borra)"
+
+            self.stdout.write(f"{key.kid}  {key.algorithm:<6} {state}")
+
+        if active is None:
+            self.stdout.write("Ninguna clave activa: los tokens se firman con HMAC (SIMPLE_JWT['SIGNING_KEY'])")
@@ -1,9 +1,34 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.conf import settings
 from django.http import JsonResponse
-from django.utils.deprecation import MiddlewareMixin
 
 
-class AppAuthenticationMiddleware(MiddlewareMixin):
+class AppAuthenticationMiddleware:
+    """
+    Middleware síncrono y asíncrono a la vez: bajo ASGI se ejecuta directamente en
+    el bucle de eventos, sin el salto a un hilo que ``MiddlewareMixin`` hace para
+    ``process_request``. Solo lee cabeceras y settings, por lo que el mismo código
+    sirve para los dos modos.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        response = self.process_request(request)
+        return response or self.get_response(request)
+
+    async def __acall__(self, request):
+        response = self.process_request(request)
+        return response or await self.get_response(request)
 
     def process_request(self, request):
         """
@@ -0,0 +1,152 @@
+# Generated by Django 5.1.5 on 2026-10-18 18:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="APIUser",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("password", models.CharField(max_length=128, verbose_name="password")),
+                (
+                    "last_login",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="last login"
+                    ),
+                ),
+                (
+                    "is_superuser",
+                    models.BooleanField(
+                        default=False,
+                        help_text="Designates that this user has all permissions without explicitly assigning them.",
+                        verbose_name="superuser status",
+                    ),
+                ),
+                ("email", models.EmailField(max_length=254, unique=True)),
+                (
+                    "username",
+                    models.CharField(
+                        blank=True, max_length=100, null=True, unique=True
+                    ),
+                ),
+                ("first_name", models.CharField(blank=True, max_length=30)),
+                ("last_name", models.CharField(blank=True, max_length=30)),
+                ("is_active", models.BooleanField(default=True)),
+                ("is_staff", models.BooleanField(default=False)),
+                (
+                    "origin_app",
+                    models.CharField(
+                        blank=True,
+                        choices=[
+                            ("pedidos", "PEDIDOS"),
+                            ("mi_app_web", "MI APP WEB"),
+                            ("api_blog", "API BLOG"),
+                            ("scootergy", "SCOOTERGY"),
+                        ],
+                        max_length=50,
+                        null=True,
+                    ),
+                ),
+                (
+                    "groups",
+                    models.ManyToManyField(
+                        blank=True,
+                        help_text="The groups this user belongs to. A user will get all permissions granted to each of their groups.",
+                        related_name="user_set",
+                        related_query_name="user",
+                        to="auth.group",
+                        verbose_name="groups",
+                    ),
+                ),
+                (
+                    "user_permissions",
+                    models.ManyToManyField(
+                        blank=True,
+                        help_text="Specific permissions for this user.",
+                        related_name="user_set",
+                        related_query_name="user",
+                        to="auth.permission",
+                        verbose_name="user permissions",
+                    ),
+                ),
+            ],
+            options={
+                "abstract": False,
+            },
+        ),
+        migrations.CreateModel(
+            name="TokenBlacklist",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "jti",
+                    models.CharField(
+                        help_text="Hash SHA256 del token (50 caracteres)",
+                        max_length=50,
+                        unique=True,
+                    ),
+                ),
+                ("token", models.TextField(help_text="Token completo")),
+                (
+                    "user_id",
+                    models.IntegerField(help_text="ID del usuario asociado al token"),
+                ),
+                (
+                    "token_type",
+                    models.CharField(
+                        choices=[("access", "Access"), ("refresh", "Refresh")],
+                        default="access",
+                        help_text="Tipo de token",
+                        max_length=20,
+                    ),
+                ),
+                ("revoked_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "expires_at",
+                    models.DateTimeField(
+                        help_text="Fecha de expiración original del token"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Token Revocado",
+                "verbose_name_plural": "Tokens Revocados",
+                "db_table": "token_blacklist",
+                "ordering": ["-revoked_at"],
+                "indexes": [
+                    models.Index(fields=["jti"], name="token_black_jti_d790b3_idx"),
+                    models.Index(
+                        fields=["user_id"], name="token_black_user_id_444aa4_idx"
+                    ),
+                    models.Index(
+                        fields=["expires_at"], name="token_black_expires_07a99b_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
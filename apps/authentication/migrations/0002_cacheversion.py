@@ -0,0 +1,39 @@
+# Generated by Django 5.1.5 on 2026-10-18 18:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authentication", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CacheVersion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "key",
+                    models.CharField(
+                        help_text="Nombre de la caché", max_length=50, unique=True
+                    ),
+                ),
+                ("version", models.BigIntegerField(default=0)),
+            ],
+            options={
+                "verbose_name": "Versión de caché",
+                "verbose_name_plural": "Versiones de caché",
+                "db_table": "cache_version",
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.5 on 2026-10-18 18:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authentication", "0002_cacheversion"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="tokenblacklist",
+            index=models.Index(
+                fields=["revoked_at"], name="token_black_revoked_c71b65_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,109 @@
+import base64
+import hashlib
+
+import jwt
+from django.db import migrations, models
+
+JTI_KEY_BYTES = 16
+
+
+def _jti_key(jti):
+    # Copia de apps.authentication.tokens.jti_key: las migraciones no deben depender
+    # de código de la aplicación que pueda cambiar más adelante.
+    key = None
+    try:
+        if len(jti) == 22:
+            key = base64.urlsafe_b64decode(jti + "==")
+        elif len(jti) == 32:
+            key = bytes.fromhex(jti)
+    except ValueError:
+        pass
+
+    if key is not None and len(key) == JTI_KEY_BYTES:
+        return key
+    return hashlib.sha256(jti.encode()).digest()[:JTI_KEY_BYTES]
+
+
+def populate_jti_key(apps, schema_editor):
+    """
+    Calcula la clave binaria de cada fila a partir del claim jti del token guardado.
+    """
+    TokenBlacklist = apps.get_model("authentication", "TokenBlacklist")
+
+    seen = set()
+    duplicates = []
+    batch = []
+    for row in TokenBlacklist.objects.only("id", "token").iterator(chunk_size=2000):
+        try:
+            # La firma ya se verificó al revocar el token; aquí solo se lee el claim
+            payload = jwt.decode(row.token, options={"verify_signature": False})
+            jti = payload.get("jti")
+        except jwt.PyJWTError:
+            jti = None
+
+        if jti:
+            key = _jti_key(jti)
+        else:
+            key = hashlib.sha256(row.token.encode()).digest()[:JTI_KEY_BYTES]
+
+        if key in seen:
+            duplicates.append(row.id)
+            continue
+        seen.add(key)
+
+        row.jti_key = key
+        batch.append(row)
+        if len(batch) >= 2000:
+            TokenBlacklist.objects.bulk_update(batch, ["jti_key"])
+            batch = []
+
+    if batch:
+        TokenBlacklist.objects.bulk_update(batch, ["jti_key"])
+    if duplicates:
+        TokenBlacklist.objects.filter(id__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authentication", "0003_tokenblacklist_revoked_at_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tokenblacklist",
+            name="jti_key",
+            field=models.BinaryField(max_length=16, null=True),
+        ),
+        # Irreversible: se elimina la columna token (NOT NULL) con el token completo, que no
+        # se puede reconstruir a partir de la clave binaria del jti. Sin reverse_code Django
+        # rechaza deshacer la migración antes de tocar el esquema, en lugar de recrear una
+        # columna obligatoria sin valores o perder las revocaciones.
+        migrations.RunPython(populate_jti_key),
+        migrations.RemoveIndex(
+            model_name="tokenblacklist",
+            name="token_black_jti_d790b3_idx",
+        ),
+        migrations.RemoveField(
+            model_name="tokenblacklist",
+            name="jti",
+        ),
+        migrations.RemoveField(
+            model_name="tokenblacklist",
+            name="token",
+        ),
+        migrations.RenameField(
+            model_name="tokenblacklist",
+            old_name="jti_key",
+            new_name="jti",
+        ),
+        migrations.AlterField(
+            model_name="tokenblacklist",
+            name="jti",
+            field=models.BinaryField(
+                help_text="Clave binaria del claim jti del token (16 bytes)",
+                max_length=16,
+                unique=True,
+            ),
+        ),
+    ]
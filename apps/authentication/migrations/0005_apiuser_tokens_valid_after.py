@@ -0,0 +1,22 @@
+# Generated by Django 5.1.5 on 2026-10-18 18:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authentication", "0004_tokenblacklist_binary_jti"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="apiuser",
+            name="tokens_valid_after",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="Fecha de la última revocación de todos los tokens del usuario",
+                null=True,
+            ),
+        ),
+    ]
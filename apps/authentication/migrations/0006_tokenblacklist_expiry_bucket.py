@@ -0,0 +1,160 @@
+from django.db import migrations, models
+
+EXPIRY_BUCKET_SECONDS = 86400
+# Buckets futuros que se crean junto con la tabla particionada (los siguientes los crea la purga)
+PRECREATE_BUCKETS = 10
+
+
+def populate_expiry_bucket(apps, schema_editor):
+    TokenBlacklist = apps.get_model("authentication", "TokenBlacklist")
+
+    batch = []
+    for row in TokenBlacklist.objects.only("id", "expires_at").iterator(chunk_size=2000):
+        row.expiry_bucket = int(row.expires_at.timestamp() // EXPIRY_BUCKET_SECONDS)
+        batch.append(row)
+        if len(batch) >= 2000:
+            TokenBlacklist.objects.bulk_update(batch, ["expiry_bucket"])
+            batch = []
+
+    if batch:
+        TokenBlacklist.objects.bulk_update(batch, ["expiry_bucket"])
+
+
+def table_definitions(cursor):
+    """
+    Restricciones (clave primaria y únicas) e índices actuales de ``token_blacklist``,
+    con sus nombres, para recrearlos en la tabla que la sustituye.
+    """
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid), contype FROM pg_constraint "
+        "WHERE conrelid = 'token_blacklist'::regclass AND contype IN ('p', 'u')"
+    )
+    constraints = cursor.fetchall()
+    cursor.execute("SELECT indexname, indexdef FROM pg_indexes WHERE tablename = 'token_blacklist'")
+    constraint_names = {name for name, _, _ in constraints}
+    indexes = [(name, sql) for name, sql in cursor.fetchall() if name not in constraint_names]
+    return constraints, indexes
+
+
+def recreate_definitions(cursor, constraints, indexes, primary_key):
+    for name, definition, kind in constraints:
+        if kind == "p":
+            definition = primary_key
+        cursor.execute(f'ALTER TABLE token_blacklist ADD CONSTRAINT "{name}" {definition}')
+    for _, sql in indexes:
+        # Los índices de una tabla particionada se definen ON ONLY sobre la tabla padre
+        cursor.execute(sql.replace(" ON ONLY ", " ON ", 1))
+
+    cursor.execute(
+        "SELECT setval(pg_get_serial_sequence('token_blacklist', 'id'), COALESCE(MAX(id), 0) + 1, false) "
+        "FROM token_blacklist"
+    )
+
+
+def partition_token_blacklist(apps, schema_editor):
+    """
+    En PostgreSQL convierte ``token_blacklist`` en una tabla particionada por
+    ``LIST (expiry_bucket)`` conservando sus filas, índices y restricciones.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+
+    with connection.cursor() as cursor:
+        constraints, indexes = table_definitions(cursor)
+
+        cursor.execute("SELECT DISTINCT expiry_bucket FROM token_blacklist")
+        buckets = {row[0] for row in cursor.fetchall()}
+        cursor.execute("SELECT floor(EXTRACT(EPOCH FROM now()) / %s)::int", [EXPIRY_BUCKET_SECONDS])
+        current = cursor.fetchone()[0]
+        buckets.update(range(current, current + PRECREATE_BUCKETS + 1))
+
+        cursor.execute("ALTER TABLE token_blacklist RENAME TO token_blacklist_legacy")
+        cursor.execute(
+            "CREATE TABLE token_blacklist (LIKE token_blacklist_legacy INCLUDING DEFAULTS INCLUDING IDENTITY) "
+            "PARTITION BY LIST (expiry_bucket)"
+        )
+        cursor.execute("CREATE TABLE token_blacklist_default PARTITION OF token_blacklist DEFAULT")
+        for bucket in sorted(buckets):
+            cursor.execute(
+                f"CREATE TABLE token_blacklist_b{int(bucket)} PARTITION OF token_blacklist "
+                f"FOR VALUES IN ({int(bucket)})"
+            )
+
+        cursor.execute("INSERT INTO token_blacklist SELECT * FROM token_blacklist_legacy")
+        cursor.execute("DROP TABLE token_blacklist_legacy")
+
+        # La clave primaria de una tabla particionada debe incluir la clave de partición
+        recreate_definitions(cursor, constraints, indexes, "PRIMARY KEY (id, expiry_bucket)")
+
+
+def unpartition_token_blacklist(apps, schema_editor):
+    """
+    Operación inversa: vuelve a convertir ``token_blacklist`` en una tabla normal con
+    las filas de todas sus particiones y la clave primaria sobre ``id``.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+
+    with connection.cursor() as cursor:
+        constraints, indexes = table_definitions(cursor)
+
+        cursor.execute("ALTER TABLE token_blacklist RENAME TO token_blacklist_partitioned")
+        cursor.execute(
+            "CREATE TABLE token_blacklist "
+            "(LIKE token_blacklist_partitioned INCLUDING DEFAULTS INCLUDING IDENTITY)"
+        )
+        cursor.execute("INSERT INTO token_blacklist SELECT * FROM token_blacklist_partitioned")
+        # Borra también todas las particiones
+        cursor.execute("DROP TABLE token_blacklist_partitioned")
+
+        recreate_definitions(cursor, constraints, indexes, "PRIMARY KEY (id)")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authentication", "0005_apiuser_tokens_valid_after"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="tokenblacklist",
+            name="token_black_expires_07a99b_idx",
+        ),
+        migrations.AddField(
+            model_name="tokenblacklist",
+            name="expiry_bucket",
+            field=models.IntegerField(
+                null=True,
+                help_text="Día de expiración (días desde 1970-01-01 UTC); clave de partición",
+            ),
+        ),
+        migrations.RunPython(populate_expiry_bucket, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="tokenblacklist",
+            name="expiry_bucket",
+            field=models.IntegerField(
+                help_text="Día de expiración (días desde 1970-01-01 UTC); clave de partición"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="tokenblacklist",
+            name="jti",
+            field=models.BinaryField(
+                help_text="Clave binaria del claim jti del token (16 bytes)", max_length=16
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="tokenblacklist",
+            index=models.Index(fields=["expiry_bucket"], name="token_black_expiry__b6e56e_idx"),
+        ),
+        migrations.AddConstraint(
+            model_name="tokenblacklist",
+            constraint=models.UniqueConstraint(
+                fields=("jti", "expiry_bucket"), name="token_blacklist_jti_bucket_uniq"
+            ),
+        ),
+        migrations.RunPython(partition_token_blacklist, unpartition_token_blacklist),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.1.5 on 2026-10-18 19:07
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authentication", "0006_tokenblacklist_expiry_bucket"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OutboxMessage",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "event",
+                    models.CharField(
+                        choices=[
+                            (
+                                "domain_user.created",
+                                "Usuario creado (servicio de dominio)",
+                            )
+                        ],
+                        help_text="Tipo de evento",
+                        max_length=50,
+                    ),
+                ),
+                (
+                    "payload",
+                    models.JSONField(default=dict, help_text="Datos del evento"),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "available_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now,
+                        help_text="Momento a partir del cual se puede (re)intentar la entrega; nulo si se ha abandonado",
+                        null=True,
+                    ),
+                ),
+                (
+                    "attempts",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Intentos de entrega fallidos"
+                    ),
+                ),
+                (
+                    "last_error",
+                    models.TextField(
+                        blank=True, default="", help_text="Error del último intento"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Mensaje pendiente",
+                "verbose_name_plural": "Mensajes pendientes",
+                "db_table": "outbox_message",
+                "indexes": [
+                    models.Index(
+                        fields=["available_at"], name="outbox_mess_availab_465274_idx"
+                    )
+                ],
+            },
+        ),
+    ]
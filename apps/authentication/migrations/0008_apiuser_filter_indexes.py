@@ -0,0 +1,46 @@
+# Generated by Django 5.1.5 on 2026-10-18 19:17
+
+from django.db import migrations, models
+
+INDEXES = [
+    models.Index(fields=["origin_app", "is_active", "id"], name="apiuser_origin_active_id_idx"),
+    models.Index(fields=["origin_app", "id"], name="apiuser_origin_id_idx"),
+    models.Index(fields=["email"], opclasses=["varchar_pattern_ops"], name="apiuser_email_prefix_idx"),
+]
+
+
+def create_indexes(apps, schema_editor):
+    """En PostgreSQL los índices se crean CONCURRENTLY para no bloquear altas y logins"""
+    APIUser = apps.get_model("authentication", "APIUser")
+    concurrently = schema_editor.connection.vendor == "postgresql"
+    for index in INDEXES:
+        if concurrently:
+            schema_editor.add_index(APIUser, index, concurrently=True)
+        else:
+            schema_editor.add_index(APIUser, index)
+
+
+def drop_indexes(apps, schema_editor):
+    APIUser = apps.get_model("authentication", "APIUser")
+    concurrently = schema_editor.connection.vendor == "postgresql"
+    for index in INDEXES:
+        if concurrently:
+            schema_editor.remove_index(APIUser, index, concurrently=True)
+        else:
+            schema_editor.remove_index(APIUser, index)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY no puede ejecutarse dentro de una transacción
+    atomic = False
+
+    dependencies = [
+        ("authentication", "0007_outboxmessage"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunPython(create_indexes, drop_indexes)],
+            state_operations=[migrations.AddIndex(model_name="apiuser", index=index) for index in INDEXES],
+        ),
+    ]
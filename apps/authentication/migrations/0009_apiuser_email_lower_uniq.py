@@ -0,0 +1,114 @@
+# Generated by Django 5.1.5 on 2026-10-18 19:20
+
+from django.db import migrations, models
+from django.db.models import Count, F, Q
+from django.db.models.functions import Lower
+
+CONSTRAINT = models.UniqueConstraint(Lower("email"), name="apiuser_email_lower_uniq")
+
+
+def find_collisions(APIUser):
+    """Emails que solo se distinguen por mayúsculas: {email en minúsculas: [usuarios]}"""
+    duplicated = (
+        APIUser.objects.annotate(email_lower=Lower("email"))
+        .values("email_lower")
+        .annotate(total=Count("id"))
+        .filter(total__gt=1)
+        .values_list("email_lower", flat=True)
+    )
+    collisions = {}
+    users = (
+        APIUser.objects.annotate(email_lower=Lower("email"))
+        .filter(email_lower__in=list(duplicated))
+        .order_by("email_lower", "id")
+    )
+    for user in users:
+        collisions.setdefault(user.email_lower, []).append(user)
+    return collisions
+
+
+def normalize_emails(apps, schema_editor):
+    """
+    Pasa los emails existentes a minúsculas. Si hay cuentas que solo se distinguen por
+    mayúsculas no se puede crear el índice único: se informa de ellas y se aborta la
+    migración para que se fusionen o se corrijan a mano antes de volver a ejecutarla.
+    """
+    APIUser = apps.get_model("authentication", "APIUser")
+    collisions = find_collisions(APIUser)
+
+    updated = (
+        APIUser.objects.annotate(email_lower=Lower("email"))
+        .filter(~Q(email=F("email_lower")))
+        .exclude(email_lower__in=list(collisions))
+        .update(email=Lower("email"))
+    )
+    if updated:
+        print(f"\n  {updated} email(s) pasados a minúsculas")
+
+    if collisions:
+        print(f"\n  {len(collisions)} email(s) repetidos sin distinguir mayúsculas:")
+        for email, users in collisions.items():
+            print(f"    {email}:")
+            for user in users:
+                print(
+                    f"      id={user.id} email={user.email} origin_app={user.origin_app} "
+                    f"is_active={user.is_active} last_login={user.last_login}"
+                )
+        raise RuntimeError(
+            "Hay cuentas cuyo email solo se distingue por mayúsculas. Fusiónalas o cambia "
+            "su email y vuelve a ejecutar la migración."
+        )
+
+
+def create_constraint(apps, schema_editor):
+    """
+    En PostgreSQL el índice único se crea CONCURRENTLY para no bloquear altas y logins.
+    Si un intento anterior falló (p. ej. por un duplicado insertado mientras se creaba),
+    queda un índice INVALID con el mismo nombre que IF NOT EXISTS daría por bueno: se
+    borra antes de volver a crearlo.
+    """
+    APIUser = apps.get_model("authentication", "APIUser")
+    if schema_editor.connection.vendor == "postgresql":
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT NOT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname = %s AND pg_catalog.pg_table_is_visible(c.oid)",
+                [CONSTRAINT.name],
+            )
+            row = cursor.fetchone()
+        if row and row[0]:
+            print(f"\n  Índice {CONSTRAINT.name} inválido de un intento anterior: se vuelve a crear")
+            schema_editor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {schema_editor.quote_name(CONSTRAINT.name)}")
+
+        table = schema_editor.quote_name(APIUser._meta.db_table)
+        schema_editor.execute(
+            f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {schema_editor.quote_name(CONSTRAINT.name)} "
+            f"ON {table} ((LOWER({schema_editor.quote_name('email')})))"
+        )
+    else:
+        schema_editor.add_constraint(APIUser, CONSTRAINT)
+
+
+def drop_constraint(apps, schema_editor):
+    APIUser = apps.get_model("authentication", "APIUser")
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {schema_editor.quote_name(CONSTRAINT.name)}")
+    else:
+        schema_editor.remove_constraint(APIUser, CONSTRAINT)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY no puede ejecutarse dentro de una transacción
+    atomic = False
+
+    dependencies = [
+        ("authentication", "0008_apiuser_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_emails, migrations.RunPython.noop),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunPython(create_constraint, drop_constraint)],
+            state_operations=[migrations.AddConstraint(model_name="apiuser", constraint=CONSTRAINT)],
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.1.5 on 2026-10-18 19:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authentication", "0009_apiuser_email_lower_uniq"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CacheInvalidation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "cache_key",
+                    models.CharField(
+                        help_text="Nombre de la caché (clave de CacheVersion)",
+                        max_length=50,
+                    ),
+                ),
+                (
+                    "item_key",
+                    models.CharField(help_text="Clave invalidada", max_length=64),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "Invalidación de caché",
+                "verbose_name_plural": "Invalidaciones de caché",
+                "db_table": "cache_invalidation",
+                "indexes": [
+                    models.Index(
+                        fields=["cache_key", "created_at"],
+                        name="cache_inval_cache_k_5853cb_idx",
+                    )
+                ],
+            },
+        ),
+    ]
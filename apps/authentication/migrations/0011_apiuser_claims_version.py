@@ -0,0 +1,21 @@
+# Generated by Django 5.1.5 on 2026-10-18 20:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authentication", "0010_cacheinvalidation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="apiuser",
+            name="claims_version",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Versión de los datos del usuario embebidos en sus tokens (claim claims_v)",
+            ),
+        ),
+    ]
@@ -1,18 +1,51 @@
+import hashlib
+
 from django.contrib.auth.base_user import AbstractBaseUser, BaseUserManager
 from django.contrib.auth.models import PermissionsMixin
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.db.models.functions import Lower
+from django.utils import timezone
 
 
 # Create your models here.
 
 
 class APIUserManager(BaseUserManager):
-    def create_user(self, email, password=None, **extra_fields):
+    @classmethod
+    def normalize_email(cls, email):
+        """
+        Forma canónica del email: sin espacios y en minúsculas (también la parte local,
+        que en la práctica ningún proveedor distingue), para que ``Ana@X.com`` y
+        ``ana@x.com`` sean la misma cuenta.
+        """
+        return super().normalize_email((email or "").strip()).lower()
+
+    def by_email(self, email):
+        """
+        Usuarios con ese email sin distinguir mayúsculas. Filtra por ``LOWER(email)``,
+        de modo que la consulta es una sola búsqueda en el índice único
+        ``apiuser_email_lower_uniq`` (``iexact`` usaría ``UPPER`` y recorrería la tabla).
+        """
+        return self.alias(email_lower=Lower("email")).filter(email_lower=self.normalize_email(email))
+
+    def get_by_natural_key(self, username):
+        # Login por BasicAuthentication, grant password de OAuth2 y createsuperuser
+        return self.by_email(username).get()
+
+    def create_user(self, email, password=None, encoded_password=None, **extra_fields):
+        """
+        Crea un usuario. Con ``encoded_password`` (p. ej. calculado en el pool de hashing)
+        se guarda ese hash tal cual y no se vuelve a calcular.
+        """
         if not email:
             raise ValueError("El email es obligatorio")
         email = self.normalize_email(email)
         user = self.model(email=email, **extra_fields)
-        user.set_password(password)
+        if encoded_password is not None:
+            user.password = encoded_password
+        else:
+            user.set_password(password)
         user.save(using=self._db)
 
         return user
@@ -43,34 +76,137 @@ class APIUser(AbstractBaseUser, PermissionsMixin):
     origin_app = models.CharField(
         max_length=50, choices=APP_CHOICES, blank=True, null=True
     )
+    # Los tokens emitidos antes de esta fecha se consideran revocados
+    tokens_valid_after = models.DateTimeField(
+        blank=True, null=True, help_text="Fecha de la última revocación de todos los tokens del usuario"
+    )
+    # Se incrementa al cambiar alguno de CLAIM_FIELDS: los tokens con otro claims_v no se usan
+    claims_version = models.PositiveIntegerField(
+        default=0, help_text="Versión de los datos del usuario embebidos en sus tokens (claim claims_v)"
+    )
 
     objects = APIUserManager()
 
+    # Campos que se embeben en los tokens JWT cuando JWT_USER_CLAIMS está activo
+    CLAIM_FIELDS = ("username", "email", "origin_app", "is_staff")
+
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = []
 
+    class Meta:
+        # Email único sin distinguir mayúsculas; es también el índice de las búsquedas de login
+        constraints = [
+            models.UniqueConstraint(Lower("email"), name="apiuser_email_lower_uniq"),
+        ]
+        # Índices de los filtros de UserViewSet (apps.authentication.filters); terminan en id
+        # para que la paginación por cursor (ORDER BY id) no necesite ordenar
+        indexes = [
+            # Usuarios de una aplicación, activos o no
+            models.Index(fields=["origin_app", "is_active", "id"], name="apiuser_origin_active_id_idx"),
+            # Usuarios de una aplicación sin filtrar por is_active
+            models.Index(fields=["origin_app", "id"], name="apiuser_origin_id_idx"),
+            # Búsqueda por prefijo de email (LIKE 'prefijo%'): el índice UNIQUE usa la
+            # collation de la base de datos y PostgreSQL no lo aprovecha para LIKE
+            models.Index(fields=["email"], opclasses=["varchar_pattern_ops"], name="apiuser_email_prefix_idx"),
+        ]
+
     def __str__(self):
         return self.email
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Valores cargados de los claims, para saber al guardar si han cambiado
+        instance._loaded_claims = {field: instance.__dict__[field] for field in cls.CLAIM_FIELDS
+                                   if field in instance.__dict__}
+        return instance
+
     def save(self, *args, **kwargs):
-        """Genera un username si no se proporciona"""
+        """
+        Guarda el email en su forma canónica y genera un username si no se proporciona.
+        Si cambia alguno de ``CLAIM_FIELDS`` incrementa ``claims_version`` en la base de
+        datos, de forma que los tokens con los datos anteriores dejan de usarse.
+        """
+        self.email = APIUser.objects.normalize_email(self.email)
         if not self.username:
-            # Usa la parte antes del @ como base
-            base_username = self.email.split("@")[0]
-            self.username = f"user_{self.id}" if self.id else base_username
+            self.username = f"user_{self.id}" if self.id else self.default_username(self.email)
+
+        update_fields = kwargs.get("update_fields")
+        claims_changed = self._claims_changed(update_fields)
+        if claims_changed:
+            self.claims_version = F("claims_version") + 1
+            if update_fields is not None:
+                kwargs["update_fields"] = [*update_fields, "claims_version"]
         super().save(*args, **kwargs)
 
+        if claims_changed:
+            self.refresh_from_db(fields=["claims_version"])
+        self._loaded_claims = {field: self.__dict__[field] for field in self.CLAIM_FIELDS if field in self.__dict__}
+
+    def _claims_changed(self, update_fields=None):
+        loaded = getattr(self, "_loaded_claims", None)
+        if self._state.adding or loaded is None:
+            return False
+
+        fields = self.CLAIM_FIELDS if update_fields is None else set(self.CLAIM_FIELDS) & set(update_fields)
+        return any(
+            field in self.__dict__ and (field not in loaded or self.__dict__[field] != loaded[field])
+            for field in fields
+        )
+
+    @staticmethod
+    def default_username(email):
+        """
+        Username de un usuario nuevo sin consultar la base de datos: la parte antes
+        de la @ más un sufijo derivado del email completo, que ya es único.
+        """
+        suffix = hashlib.sha256(email.encode()).hexdigest()[:12]
+        return f"{email.split('@')[0][:80]}_{suffix}"
+
+    @classmethod
+    def origin_app_for(cls, app_name):
+        """Valor de ``origin_app`` para la aplicación de la cabecera X-App-Name (``None`` si no es una opción)"""
+        return app_name if app_name in dict(cls.APP_CHOICES) else None
+
+    def set_password(self, raw_password):
+        """Un cambio de contraseña invalida todos los tokens emitidos hasta ahora"""
+        super().set_password(raw_password)
+        if self.pk:
+            self.tokens_valid_after = self._token_epoch_now()
+
+    def revoke_all_tokens(self):
+        """Revoca todos los tokens del usuario con una única escritura"""
+        self.tokens_valid_after = self._token_epoch_now()
+        self.save(update_fields=["tokens_valid_after"])
+
+    def token_issued_before_revocation(self, issued_at):
+        """Indica si un token con el claim iat dado es anterior a la última revocación masiva"""
+        if self.tokens_valid_after is None:
+            return False
+        return issued_at is None or issued_at < self.tokens_valid_after.timestamp()
+
+    @staticmethod
+    def _token_epoch_now():
+        # El claim iat tiene resolución de segundos: se trunca para no invalidar los
+        # tokens emitidos inmediatamente después (p. ej. el login tras cambiar la contraseña)
+        return timezone.now().replace(microsecond=0)
+
 
 class TokenBlacklist(models.Model):
     """
     Modelo para almacenar tokens revocados (logout, cambio de contraseña, etc.)
+
+    Las filas se agrupan en buckets diarios según su expiración (``expiry_bucket``).
+    En PostgreSQL cada bucket es una partición de la tabla y la purga elimina
+    particiones completas (ver ``apps.authentication.partitions``).
     """
-    jti = models.CharField(
-        max_length=50,
-        unique=True,
-        help_text="Hash SHA256 del token (50 caracteres)"
+    # Tamaño de cada bucket de expiración (un día)
+    EXPIRY_BUCKET_SECONDS = 86400
+
+    jti = models.BinaryField(
+        max_length=16,
+        help_text="Clave binaria del claim jti del token (16 bytes)"
     )
-    token = models.TextField(help_text="Token completo")
     user_id = models.IntegerField(help_text="ID del usuario asociado al token")
     token_type = models.CharField(
         max_length=20,
@@ -80,74 +216,186 @@ class TokenBlacklist(models.Model):
     )
     revoked_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField(help_text="Fecha de expiración original del token")
+    expiry_bucket = models.IntegerField(
+        help_text="Día de expiración (días desde 1970-01-01 UTC); clave de partición"
+    )
 
     class Meta:
         db_table = "token_blacklist"
         verbose_name = "Token Revocado"
         verbose_name_plural = "Tokens Revocados"
         ordering = ["-revoked_at"]  # Más recientes primero
+        # El bucket se deriva del exp del token, por lo que (jti, bucket) es tan único como
+        # jti y permite que la restricción incluya la clave de partición
+        constraints = [
+            models.UniqueConstraint(fields=["jti", "expiry_bucket"], name="token_blacklist_jti_bucket_uniq"),
+        ]
         indexes = [
-            models.Index(fields=["jti"]),
             models.Index(fields=["user_id"]),
-            models.Index(fields=["expires_at"]),
+            models.Index(fields=["expiry_bucket"]),
+            models.Index(fields=["revoked_at"]),
         ]
 
     def __str__(self):
         return f"Token {self.token_type} - Usuario {self.user_id} - {self.revoked_at}"
 
+    def save(self, *args, **kwargs):
+        if self.expiry_bucket is None:
+            self.expiry_bucket = self.bucket_for(self.expires_at)
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def bucket_for(cls, expires_at):
+        """Bucket de expiración de un datetime o timestamp UNIX"""
+        if hasattr(expires_at, "timestamp"):
+            expires_at = expires_at.timestamp()
+        return int(expires_at // cls.EXPIRY_BUCKET_SECONDS)
+
+    @classmethod
+    def current_bucket(cls):
+        return cls.bucket_for(timezone.now())
+
+    @classmethod
+    def is_token_blacklisted(cls, jti, expires_at=None):
+        """
+        Verifica si un token con la clave de jti dada está en la lista negra.
+        Con la expiración del token se consulta un único bucket; sin ella, solo los vigentes.
+        """
+        if expires_at is not None:
+            return cls.objects.filter(jti=jti, expiry_bucket=cls.bucket_for(expires_at)).exists()
+        return cls.objects.filter(jti=jti, expiry_bucket__gte=cls.current_bucket()).exists()
+
     @classmethod
-    def is_token_blacklisted(cls, jti):
-        """Verifica si un token con el JWT ID dado está en la lista negra"""
-        return cls.objects.filter(jti=jti).exists()
+    async def ais_token_blacklisted(cls, jti, expires_at=None):
+        """Variante asíncrona de ``is_token_blacklisted``"""
+        if expires_at is not None:
+            return await cls.objects.filter(jti=jti, expiry_bucket=cls.bucket_for(expires_at)).aexists()
+        return await cls.objects.filter(jti=jti, expiry_bucket__gte=cls.current_bucket()).aexists()
 
     @classmethod
     def revoke_token(cls, token, user_id, token_type="access"):
-        """Agrega un token a la lista negra"""
-
-        import jwt
-        import hashlib
-        from datetime import datetime
-        from django.utils import timezone
-        from main.config.base import SECRET_KEY
-        from main.config.authentication import SIMPLE_JWT
-
-        try:
-            # Usar hash del token como identificador único consistente
-            jti = hashlib.sha256(token.encode()).hexdigest()[:50]
-
-            # Decodificar para obtener la fecha de expiración
-            decoded = jwt.decode(
-                token,
-                SECRET_KEY,
-                algorithms=[SIMPLE_JWT["ALGORITHM"]]
-            )
-
-            # Convertir timestamp a datetime timezone-aware
-            exp_timestamp = decoded.get("exp")
-            expires_at = timezone.make_aware(datetime.fromtimestamp(exp_timestamp))
-
-            obj, created = cls.objects.get_or_create(
-                jti=jti,
-                defaults={
-                    "token": token,
-                    "user_id": user_id,
-                    "token_type": token_type,
-                    "expires_at": expires_at,
-                }
-            )
-
-            if not created:
-                print(f"Token ya estaba en blacklist: {jti}")
-
-            return True
-        except Exception as e:
-            print(f"Error revocando token: {e}")
-            import traceback
-            traceback.print_exc()
-            return False
+        """Agrega un token a la lista negra (ver revocation.revoke_tokens para lotes)"""
+        from apps.authentication.revocation import ALREADY_REVOKED, REVOKED, revoke_tokens
+
+        result = revoke_tokens([token], user_id=user_id, token_type=token_type)[0]
+        if result["status"] == ALREADY_REVOKED:
+            print(f"Token ya estaba en blacklist: {result['jti']}")
+        elif result["status"] != REVOKED:
+            print(f"Error revocando token: {result['status']}")
+
+        return result["status"] in (REVOKED, ALREADY_REVOKED)
+
+    @classmethod
+    def cleanup_expired_tokens(cls, **options):
+        """
+        Elimina los buckets de tokens revocados ya expirados para mantener la base de datos
+        limpia. Acepta las opciones de ``partitions.purge_expired_buckets`` (lotes, tiempo
+        máximo, pausa, simulación) y devuelve sus contadores.
+        """
+        from apps.authentication.partitions import purge_expired_buckets
+        return purge_expired_buckets(**options)
+
+
+class CacheVersion(models.Model):
+    """
+    Contador de versión compartido entre workers para invalidar cachés en memoria.
+    """
+    key = models.CharField(max_length=50, unique=True, help_text="Nombre de la caché")
+    version = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = "cache_version"
+        verbose_name = "Versión de caché"
+        verbose_name_plural = "Versiones de caché"
+
+    def __str__(self):
+        return f"{self.key} - v{self.version}"
+
+    @classmethod
+    def current(cls, key):
+        """Devuelve la versión actual de la caché indicada (0 si no existe)"""
+        return cls.objects.filter(key=key).values_list("version", flat=True).first() or 0
+
+    @classmethod
+    async def acurrent(cls, key):
+        """Variante asíncrona de ``current``"""
+        return await cls.objects.filter(key=key).values_list("version", flat=True).afirst() or 0
+
+    @classmethod
+    def bump(cls, key):
+        """Incrementa la versión de la caché indicada y devuelve el nuevo valor"""
+        if not cls.objects.filter(key=key).update(version=F("version") + 1):
+            try:
+                with transaction.atomic():
+                    cls.objects.create(key=key, version=1)
+            except IntegrityError:
+                cls.objects.filter(key=key).update(version=F("version") + 1)
+        return cls.current(key)
+
+
+class CacheInvalidation(models.Model):
+    """
+    Claves invalidadas de una caché en memoria (p. ej. el checksum de un token revocado).
+
+    Cuando cambia la ``CacheVersion`` de la caché, cada worker borra solo las claves
+    anotadas desde su última lectura en lugar de vaciarla entera. Las filas dejan de
+    servir cuando supera el TTL de la caché y se purgan al escribir nuevas.
+    """
+    cache_key = models.CharField(max_length=50, help_text="Nombre de la caché (clave de CacheVersion)")
+    item_key = models.CharField(max_length=64, help_text="Clave invalidada")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "cache_invalidation"
+        verbose_name = "Invalidación de caché"
+        verbose_name_plural = "Invalidaciones de caché"
+        indexes = [
+            models.Index(fields=["cache_key", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.cache_key} - {self.item_key}"
+
+
+class OutboxMessage(models.Model):
+    """
+    Evento pendiente de entregar a otro servicio (patrón transactional outbox).
+
+    Se escribe en la misma transacción que el cambio que lo origina, de forma que el
+    evento existe si y solo si el cambio se ha confirmado. El dispatcher
+    (``apps.authentication.outbox``) lo borra tras entregarlo; si falla, programa un
+    nuevo intento con backoff y, agotados los intentos, lo deja abandonado
+    (``available_at`` nulo) para revisarlo a mano.
+    """
+    DOMAIN_USER_CREATED = "domain_user.created"
+
+    EVENT_CHOICES = [
+        (DOMAIN_USER_CREATED, "Usuario creado (servicio de dominio)"),
+    ]
+
+    event = models.CharField(max_length=50, choices=EVENT_CHOICES, help_text="Tipo de evento")
+    payload = models.JSONField(default=dict, help_text="Datos del evento")
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(
+        null=True,
+        default=timezone.now,
+        help_text="Momento a partir del cual se puede (re)intentar la entrega; nulo si se ha abandonado",
+    )
+    attempts = models.PositiveIntegerField(default=0, help_text="Intentos de entrega fallidos")
+    last_error = models.TextField(blank=True, default="", help_text="Error del último intento")
+
+    class Meta:
+        db_table = "outbox_message"
+        verbose_name = "Mensaje pendiente"
+        verbose_name_plural = "Mensajes pendientes"
+        indexes = [
+            models.Index(fields=["available_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.event} #{self.pk} - {self.attempts} intento(s)"
 
     @classmethod
-    def cleanup_expired_tokens(cls):
-        """Elimina tokens revocados que ya han expirado para mantener la base de datos limpia"""
-        from django.utils import timezone
-        cls.objects.filter(expires_at__lt=timezone.now()).delete()
+    def enqueue(cls, event, payload):
+        """Encola un evento; debe llamarse dentro de la transacción del cambio que lo origina"""
+        return cls.objects.create(event=event, payload=payload)
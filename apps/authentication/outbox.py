@@ -0,0 +1,152 @@
+"""
+Entrega de los eventos del outbox (``OutboxMessage``) a otros servicios.
+
+Los eventos se escriben en la misma transacción que el cambio que los origina (p. ej.
+el alta de un usuario), así que el registro no espera al servicio de dominio ni falla
+si está caído. Un dispatcher (comando ``dispatch_outbox``) los drena por lotes:
+
+- Reclama un lote con ``SELECT ... FOR UPDATE SKIP LOCKED`` y lo reserva durante
+  ``LEASE_SECONDS`` adelantando ``available_at``; varios dispatchers pueden trabajar
+  en paralelo sin repartirse los mismos mensajes.
+- Entrega el lote (con ``CONCURRENCY`` peticiones simultáneas) sobre una sesión HTTP
+  con conexiones persistentes y timeouts.
+- Borra los entregados en un solo DELETE y reprograma los fallidos con backoff
+  exponencial con jitter; tras ``MAX_ATTEMPTS`` intentos quedan abandonados.
+
+La entrega es "al menos una vez": si el dispatcher muere tras enviar un mensaje y antes
+de borrarlo, se reenvía al vencer la reserva. Cada envío lleva el id del mensaje como
+clave de idempotencia para que el receptor pueda descartar los repetidos.
+"""
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from apps.authentication.models import OutboxMessage
+
+
+def _deliver_domain_user_created(message):
+    from apps.services.domain_user import notify_domain_user
+    notify_domain_user(message.payload["user_id"], idempotency_key=f"outbox-{message.pk}")
+
+
+HANDLERS = {
+    OutboxMessage.DOMAIN_USER_CREATED: _deliver_domain_user_created,
+}
+
+
+def backoff_delay(attempts):
+    """Segundos hasta el siguiente intento tras ``attempts`` fallos (exponencial con jitter)"""
+    config = settings.OUTBOX
+    delay = min(config["BACKOFF_BASE_SECONDS"] * 2 ** (attempts - 1), config["BACKOFF_MAX_SECONDS"])
+    # Jitter: los mensajes que fallaron juntos (servicio caído) no se reintentan a la vez
+    return delay * random.uniform(0.5, 1)
+
+
+def claim_batch(batch_size):
+    """Reserva y devuelve hasta ``batch_size`` mensajes listos para entregar"""
+    now = timezone.now()
+    with transaction.atomic():
+        messages = list(
+            OutboxMessage.objects
+            .select_for_update(skip_locked=True)
+            .filter(available_at__lte=now)
+            .order_by("available_at", "id")[:batch_size]
+        )
+        if messages:
+            lease_until = now + timedelta(seconds=settings.OUTBOX["LEASE_SECONDS"])
+            OutboxMessage.objects.filter(pk__in=[m.pk for m in messages]).update(available_at=lease_until)
+    return messages
+
+
+def _deliver(message):
+    """Entrega un mensaje; devuelve el error como texto o None si se ha entregado"""
+    handler = HANDLERS.get(message.event)
+    if handler is None:
+        return f"Evento desconocido: {message.event}"
+    try:
+        handler(message)
+    except Exception as e:
+        return str(e) or e.__class__.__name__
+    return None
+
+
+def dispatch_batch(batch_size=None):
+    """
+    Reclama y entrega un lote. Devuelve los contadores ``claimed``, ``delivered``,
+    ``failed`` (se reintentarán) y ``abandoned`` (han agotado los intentos).
+    """
+    config = settings.OUTBOX
+    messages = claim_batch(batch_size or config["BATCH_SIZE"])
+    result = {"claimed": len(messages), "delivered": 0, "failed": 0, "abandoned": 0}
+    if not messages:
+        return result
+
+    concurrency = min(config["CONCURRENCY"], len(messages))
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            errors = list(executor.map(_deliver, messages))
+    else:
+        errors = [_deliver(message) for message in messages]
+
+    delivered, failed = [], []
+    now = timezone.now()
+    for message, error in zip(messages, errors):
+        if error is None:
+            delivered.append(message.pk)
+            continue
+
+        message.attempts += 1
+        message.last_error = error[:2000]
+        if message.attempts >= config["MAX_ATTEMPTS"]:
+            message.available_at = None
+            result["abandoned"] += 1
+            print(f"Mensaje del outbox abandonado tras {message.attempts} intentos: {message} ({error})")
+        else:
+            message.available_at = now + timedelta(seconds=backoff_delay(message.attempts))
+            result["failed"] += 1
+        failed.append(message)
+
+    if delivered:
+        OutboxMessage.objects.filter(pk__in=delivered).delete()
+    if failed:
+        OutboxMessage.objects.bulk_update(failed, ["attempts", "available_at", "last_error"])
+
+    result["delivered"] = len(delivered)
+    return result
+
+
+def run_dispatcher(batch_size=None, poll_seconds=None, once=False, progress=None, should_stop=None):
+    """
+    Drena el outbox en bucle. Tras un lote completo pide el siguiente sin esperar; si la
+    cola está vacía (o solo quedan reintentos futuros) espera ``poll_seconds``. Con
+    ``once`` termina cuando no quedan mensajes listos. Devuelve los contadores acumulados.
+    """
+    batch_size = batch_size or settings.OUTBOX["BATCH_SIZE"]
+    poll_seconds = settings.OUTBOX["POLL_SECONDS"] if poll_seconds is None else poll_seconds
+    totals = {"claimed": 0, "delivered": 0, "failed": 0, "abandoned": 0}
+
+    while not (should_stop and should_stop()):
+        result = dispatch_batch(batch_size)
+        for key in totals:
+            totals[key] += result[key]
+        if result["claimed"] and progress:
+            progress(result)
+
+        if result["claimed"] < batch_size:
+            if once:
+                break
+            time.sleep(poll_seconds)
+
+    return totals
+
+
+def retry_abandoned():
+    """Vuelve a poner en cola los mensajes abandonados. Devuelve cuántos"""
+    return OutboxMessage.objects.filter(available_at__isnull=True).update(
+        available_at=timezone.now(), attempts=0
+    )
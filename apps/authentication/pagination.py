@@ -0,0 +1,18 @@
+"""
+Paginación por cursor (keyset) de los listados de usuarios.
+
+Cada página es ``WHERE id > <último id> ORDER BY id LIMIT n + 1`` sobre la clave
+primaria: el coste no crece con la profundidad de la página (a diferencia de
+``OFFSET``) y nunca se ejecuta ``COUNT(*)``, así que recorrer cientos de miles de
+usuarios cuesta lo mismo en la primera página que en la última. A cambio no hay
+total ni saltos a una página concreta, solo enlaces ``next``/``previous``.
+"""
+from rest_framework.pagination import CursorPagination
+
+
+class UserCursorPagination(CursorPagination):
+    # id es único, así que el cursor es solo la posición (sin desplazamiento por empates)
+    ordering = "id"
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
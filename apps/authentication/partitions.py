@@ -0,0 +1,223 @@
+"""
+Gestión de los buckets de expiración de la blacklist de tokens.
+
+En PostgreSQL la tabla ``token_blacklist`` está particionada por
+``LIST (expiry_bucket)``: cada día de expiración es una partición y la purga
+consiste en un ``DROP TABLE`` por bucket vencido, con coste constante sin
+importar cuántos tokens se revocaron ese día. Una partición ``DEFAULT`` recoge
+las filas de buckets que no se crearon a tiempo.
+
+En el resto de motores (SQLite en desarrollo) la tabla no está particionada y
+los buckets vencidos se eliminan con ``DELETE`` por lotes.
+
+La purga está pensada para ejecutarse con tráfico: cada lote o partición se
+confirma por separado, se puede limitar la duración total y esperar entre pasos,
+y el ``DROP TABLE`` usa un ``lock_timeout`` corto para no bloquear las consultas
+de la blacklist; lo que quede pendiente se elimina en la siguiente ejecución.
+"""
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+
+from apps.authentication.models import TokenBlacklist
+
+PARTITION_PREFIX = f"{TokenBlacklist._meta.db_table}_b"
+DEFAULT_PARTITION = f"{TokenBlacklist._meta.db_table}_default"
+
+
+def precreate_buckets():
+    """Buckets futuros que deben existir: la vida máxima de un token más un margen"""
+    lifetime = settings.SIMPLE_JWT["REFRESH_TOKEN_LIFETIME"].total_seconds()
+    return int(lifetime // TokenBlacklist.EXPIRY_BUCKET_SECONDS) + 2
+
+
+def is_partitioned():
+    if connection.vendor != "postgresql":
+        return False
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT relkind FROM pg_class WHERE relname = %s",
+            [TokenBlacklist._meta.db_table],
+        )
+        row = cursor.fetchone()
+    return row is not None and row[0] == "p"
+
+
+def list_partitions():
+    """Devuelve ``{bucket: nombre_de_tabla}`` con las particiones por bucket existentes"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass",
+            [TokenBlacklist._meta.db_table],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    return {
+        int(name[len(PARTITION_PREFIX):]): name
+        for name in names
+        if name.startswith(PARTITION_PREFIX) and name[len(PARTITION_PREFIX):].isdigit()
+    }
+
+
+def ensure_partitions(ahead=None):
+    """
+    Crea las particiones del bucket actual y de los ``ahead`` siguientes. Devuelve
+    el número de particiones creadas. No hace nada si la tabla no está particionada.
+    """
+    if not is_partitioned():
+        return 0
+
+    ahead = precreate_buckets() if ahead is None else ahead
+    existing = list_partitions()
+    current = TokenBlacklist.current_bucket()
+    table = connection.ops.quote_name(TokenBlacklist._meta.db_table)
+
+    created = 0
+    for bucket in range(current, current + ahead + 1):
+        if bucket in existing:
+            continue
+        try:
+            # Falla si la partición DEFAULT ya tiene filas de ese bucket: se quedan allí
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    f"CREATE TABLE {connection.ops.quote_name(PARTITION_PREFIX + str(bucket))} "
+                    f"PARTITION OF {table} FOR VALUES IN ({int(bucket)})"
+                )
+            created += 1
+        except DatabaseError as e:
+            print(f"No se pudo crear la partición del bucket {bucket}: {e}")
+
+    return created
+
+
+class _Purge:
+    """Estado de una ejecución de la purga: límites, contadores y progreso"""
+
+    def __init__(self, batch_size, max_seconds, sleep_seconds, dry_run, progress):
+        self.batch_size = batch_size
+        self.sleep_seconds = sleep_seconds
+        self.dry_run = dry_run
+        self.progress = progress
+        self.deadline = time.monotonic() + max_seconds if max_seconds else None
+        self.result = {"buckets": 0, "rows": 0, "batches": 0, "complete": True}
+
+    def out_of_time(self):
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.result["complete"] = False
+            return True
+        return False
+
+    def step_done(self):
+        self.result["batches"] += 1
+        if self.progress is not None:
+            self.progress(dict(self.result))
+        if self.sleep_seconds:
+            time.sleep(self.sleep_seconds)
+
+
+def _drop_partition(name):
+    """Devuelve la estimación de filas de la partición eliminada o ``None`` si no se pudo"""
+    lock_timeout = int(settings.TOKEN_BLACKLIST_CLEANUP["LOCK_TIMEOUT_MS"])
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"SET LOCAL lock_timeout = {lock_timeout}")
+            cursor.execute("SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE relname = %s", [name])
+            rows = cursor.fetchone()[0]
+            cursor.execute(f"DROP TABLE {connection.ops.quote_name(name)}")
+    except DatabaseError as e:
+        print(f"No se pudo eliminar la partición {name}: {e}")
+        return None
+    return rows
+
+
+def _purge_partitions(purge, current):
+    """Devuelve los buckets cuyas particiones se eliminaron (o se eliminarían)"""
+    dropped = set()
+    with connection.cursor() as cursor:
+        for bucket, name in sorted(list_partitions().items()):
+            if bucket >= current or purge.out_of_time():
+                break
+
+            if purge.dry_run:
+                cursor.execute("SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE relname = %s", [name])
+                rows = cursor.fetchone()[0]
+            else:
+                rows = _drop_partition(name)
+                if rows is None:
+                    purge.result["complete"] = False
+                    continue
+
+            dropped.add(bucket)
+            purge.result["buckets"] += 1
+            purge.result["rows"] += rows
+            purge.step_done()
+
+    return dropped
+
+
+def _purge_rows(purge, current, skip_buckets=()):
+    """Borra por lotes ordenados por id (keyset) las filas de buckets vencidos"""
+    expired = TokenBlacklist.objects.filter(expiry_bucket__lt=current).order_by("id")
+    if skip_buckets:
+        expired = expired.exclude(expiry_bucket__in=skip_buckets)
+    buckets = set()
+    last_id = 0
+
+    while not purge.out_of_time():
+        batch = list(expired.filter(id__gt=last_id).values_list("id", "expiry_bucket")[:purge.batch_size])
+        if not batch:
+            break
+
+        ids = [row_id for row_id, _ in batch]
+        last_id = ids[-1]
+        buckets.update(bucket for _, bucket in batch)
+
+        if purge.dry_run:
+            purge.result["rows"] += len(ids)
+        else:
+            deleted, _ = TokenBlacklist.objects.filter(id__in=ids).delete()
+            purge.result["rows"] += deleted
+        purge.step_done()
+
+    return buckets
+
+
+def purge_expired_buckets(batch_size=None, max_seconds=None, sleep_seconds=None, dry_run=False, progress=None):
+    """
+    Elimina los buckets anteriores al actual en pasos cortos: un ``DROP TABLE`` por
+    partición en PostgreSQL y ``DELETE`` de ``batch_size`` filas en el resto de casos.
+
+    Los parámetros omitidos se toman de ``settings.TOKEN_BLACKLIST_CLEANUP``; con
+    ``max_seconds`` a 0 no hay límite de tiempo. ``progress`` recibe los contadores
+    tras cada paso. Con ``dry_run`` no se elimina nada.
+
+    Devuelve ``{"buckets", "rows", "batches", "complete"}``; ``complete`` es ``False``
+    si quedó trabajo pendiente. En PostgreSQL el número de filas de las particiones
+    eliminadas es la estimación del planificador, para no tener que recorrerlas.
+
+    Fuera de una transacción cada paso se confirma por separado, de forma que los
+    bloqueos duran lo que un lote.
+    """
+    options = settings.TOKEN_BLACKLIST_CLEANUP
+    purge = _Purge(
+        batch_size=batch_size or options["BATCH_SIZE"],
+        max_seconds=options["MAX_SECONDS"] if max_seconds is None else max_seconds,
+        sleep_seconds=options["SLEEP_SECONDS"] if sleep_seconds is None else sleep_seconds,
+        dry_run=dry_run,
+        progress=progress,
+    )
+    current = TokenBlacklist.current_bucket()
+
+    partitioned = is_partitioned()
+    dropped = _purge_partitions(purge, current) if partitioned else set()
+
+    # Sin particiones, o filas que cayeron en la partición DEFAULT por no existir su bucket a tiempo
+    buckets = _purge_rows(purge, current, skip_buckets=dropped)
+    purge.result["buckets"] = len(dropped | buckets)
+
+    if partitioned and not dry_run:
+        ensure_partitions()
+    return purge.result
@@ -0,0 +1,387 @@
+"""
+Comprobación de tokens revocados con caché en memoria por proceso.
+
+El orden de consulta es: caché LRU/TTL -> filtro de Bloom -> base de datos. Solo
+se llega a la base de datos cuando el filtro indica un posible positivo.
+
+También contiene el servicio de revocación en bloque (``revoke_tokens`` y
+``revoke_user_tokens``), que escribe con operaciones de conjunto en una sola
+transacción.
+"""
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import TokenBackendError
+from rest_framework_simplejwt.settings import api_settings
+
+from apps.authentication.bloom import BloomFilter
+from apps.authentication.cache import VersionedTTLCache
+from apps.authentication.models import APIUser, TokenBlacklist
+from apps.authentication.signing import token_backend
+from apps.authentication.tokens import token_key
+
+BLACKLIST_VERSION_KEY = "token_blacklist"
+
+# Resultados por token / usuario de la revocación en bloque
+REVOKED = "revoked"
+ALREADY_REVOKED = "already_revoked"
+DUPLICATE = "duplicate"
+EXPIRED = "expired"
+INVALID = "invalid"
+NOT_FOUND = "not_found"
+
+# Tamaño de los lotes de consultas IN e inserciones (límite de parámetros de SQLite)
+BULK_BATCH_SIZE = 500
+
+
+class RevocationFilter:
+    """
+    Filtro de Bloom con los identificadores de los tokens revocados y no expirados.
+
+    Se construye desde ``TokenBlacklist`` y se actualiza de forma incremental con
+    las filas cuyo ``revoked_at`` supera la marca de agua. Como el filtro no admite
+    borrados, se reconstruye completo cada ``rebuild_interval`` segundos para
+    descartar los tokens expirados, o antes si se supera su capacidad.
+
+    La reconstrucción la hace un único hilo a la vez (``_rebuild_lock``); el resto
+    sigue consultando el filtro anterior sin esperar, y mientras no hay ningún filtro
+    construido responde "posible positivo" para que se consulte la base de datos.
+    """
+
+    def __init__(self, error_rate=0.001, max_bytes=8 * 1024 * 1024, min_capacity=10_000,
+                 rebuild_interval=3600, overlap=5):
+        self.error_rate = error_rate
+        self.max_bytes = max_bytes
+        self.min_capacity = min_capacity
+        self.rebuild_interval = rebuild_interval
+        # Margen para no perder filas confirmadas tarde con un revoked_at anterior a la marca
+        self.overlap = timedelta(seconds=overlap)
+
+        self._filter = None
+        self._high_water_mark = None
+        self._built_at = 0.0
+        # _lock protege el filtro y la marca de agua; _rebuild_lock, que solo haya una reconstrucción
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {
+            "lookups": 0,
+            "negatives": 0,
+            "possible_hits": 0,
+            "confirmed_hits": 0,
+            "false_positives": 0,
+        }
+
+    def rebuild(self):
+        """
+        Construye el filtro desde cero con los tokens revocados que aún no han expirado.
+        """
+        live = self._live_rows()
+        capacity = max(self.min_capacity, live.count() * 2)
+        bloom = BloomFilter(capacity, self.error_rate, self.max_bytes)
+
+        high_water_mark = None
+        for jti, revoked_at in live.values_list("jti", "revoked_at").iterator(chunk_size=5000):
+            bloom.add(bytes(jti))
+            if high_water_mark is None or revoked_at > high_water_mark:
+                high_water_mark = revoked_at
+
+        with self._lock:
+            self._filter = bloom
+            self._high_water_mark = high_water_mark
+            self._built_at = time.monotonic()
+
+        # Revocaciones confirmadas mientras se leía la tabla: un refresco concurrente
+        # puede haberlas añadido al filtro anterior, que se acaba de descartar
+        self._add_new_rows()
+
+    def rebuild_if_needed(self):
+        """
+        Reconstruye el filtro si le toca, sin bloquear: si otro hilo ya lo está
+        reconstruyendo, se sigue usando el filtro actual. Devuelve ``False`` si aún
+        no hay ningún filtro que consultar.
+        """
+        if self._needs_rebuild() and self._rebuild_lock.acquire(blocking=False):
+            try:
+                # Otro hilo puede haber terminado la reconstrucción antes de tomar el lock
+                if self._needs_rebuild():
+                    self.rebuild()
+            finally:
+                self._rebuild_lock.release()
+        return self._filter is not None
+
+    def refresh(self):
+        """
+        Añade al filtro las revocaciones registradas desde la última marca de agua.
+        """
+        if not self.rebuild_if_needed():
+            # Sin filtro todavía: la reconstrucción en curso ya leerá estas filas
+            return
+
+        self._add_new_rows()
+        # Si se ha superado la capacidad toca reconstruir
+        self.rebuild_if_needed()
+
+    @staticmethod
+    def _live_rows():
+        return TokenBlacklist.objects.filter(expiry_bucket__gte=TokenBlacklist.current_bucket())
+
+    def _add_new_rows(self):
+        rows = self._live_rows()
+        if self._high_water_mark is not None:
+            rows = rows.filter(revoked_at__gte=self._high_water_mark - self.overlap)
+
+        with self._lock:
+            for jti, revoked_at in rows.values_list("jti", "revoked_at").iterator(chunk_size=5000):
+                # El solapamiento vuelve a leer filas ya añadidas: no deben contar dos veces
+                jti = bytes(jti)
+                if jti not in self._filter:
+                    self._filter.add(jti)
+                if self._high_water_mark is None or revoked_at > self._high_water_mark:
+                    self._high_water_mark = revoked_at
+
+    def _needs_rebuild(self):
+        bloom = self._filter
+        return (
+            bloom is None
+            or bloom.count > bloom.capacity
+            or time.monotonic() - self._built_at >= self.rebuild_interval
+        )
+
+    def add(self, jti):
+        """Añade un identificador revocado en este proceso sin esperar al refresco"""
+        if self._filter is not None:
+            with self._lock:
+                if jti not in self._filter:
+                    self._filter.add(jti)
+
+    def might_contain(self, jti):
+        """
+        ``False`` garantiza que el token no está revocado; ``True`` obliga a consultar
+        la base de datos.
+        """
+        self.rebuild_if_needed()
+        return self._lookup(jti)
+
+    async def amight_contain(self, jti):
+        """Variante asíncrona de ``might_contain``: la reconstrucción periódica se hace en un hilo"""
+        if self._needs_rebuild():
+            await sync_to_async(self.rebuild_if_needed)()
+        return self._lookup(jti)
+
+    def _lookup(self, jti):
+        bloom = self._filter
+        self.stats["lookups"] += 1
+        if bloom is None or jti in bloom:
+            self.stats["possible_hits"] += 1
+            return True
+
+        self.stats["negatives"] += 1
+        return False
+
+    def record_result(self, revoked):
+        """Anota si un posible positivo del filtro se confirmó en la base de datos"""
+        self.stats["confirmed_hits" if revoked else "false_positives"] += 1
+
+    def describe(self):
+        """Resumen del tamaño del filtro y de su tasa de aciertos en este proceso"""
+        bloom = self._filter
+        lookups = self.stats["lookups"]
+        return {
+            "items": bloom.count if bloom else 0,
+            "capacity": bloom.capacity if bloom else 0,
+            "size_bytes": bloom.size_bytes if bloom else 0,
+            "num_bits": bloom.num_bits if bloom else 0,
+            "num_hashes": bloom.num_hashes if bloom else 0,
+            "estimated_false_positive_rate": bloom.estimated_false_positive_rate if bloom else 0.0,
+            "high_water_mark": self._high_water_mark,
+            # Proporción de consultas resueltas sin tocar la base de datos
+            "hit_rate": self.stats["negatives"] / lookups if lookups else 0.0,
+            **self.stats,
+        }
+
+
+_cache_settings = settings.AUTH_CACHES["BLACKLIST"]
+_filter_settings = settings.AUTH_CACHES["REVOCATION_FILTER"]
+
+blacklist_cache = VersionedTTLCache(
+    BLACKLIST_VERSION_KEY,
+    maxsize=_cache_settings["MAX_SIZE"],
+    ttl=_cache_settings["TTL_SECONDS"],
+    poll_interval=settings.AUTH_CACHES["VERSION_POLL_SECONDS"],
+)
+
+revocation_filter = RevocationFilter(
+    error_rate=_filter_settings["FALSE_POSITIVE_RATE"],
+    max_bytes=_filter_settings["MAX_BYTES"],
+    min_capacity=_filter_settings["MIN_CAPACITY"],
+    rebuild_interval=_filter_settings["REBUILD_SECONDS"],
+    overlap=_filter_settings["OVERLAP_SECONDS"],
+)
+
+
+def is_token_revoked(jti, expires_at=None):
+    """
+    Indica si el token está en la blacklist consultando primero la caché local.
+
+    Se cachean tanto los positivos como los negativos; ninguna entrada vive más
+    allá de ``expires_at`` (claim ``exp`` del token).
+    """
+    # Un cambio de versión significa que otro worker ha revocado tokens: el filtro
+    # debe incorporarlos antes de volver a responder negativos desde memoria.
+    if blacklist_cache.sync() and _filter_settings["ENABLED"]:
+        revocation_filter.refresh()
+
+    generation = blacklist_cache.generation
+    revoked = blacklist_cache.get(jti)
+    if revoked is None:
+        if _filter_settings["ENABLED"] and not revocation_filter.might_contain(jti):
+            revoked = False
+        else:
+            revoked = TokenBlacklist.is_token_blacklisted(jti, expires_at)
+            if _filter_settings["ENABLED"]:
+                revocation_filter.record_result(revoked)
+        # Si una revocación ha vaciado la caché durante la lectura, el resultado
+        # puede ser anterior a ella: no se guarda
+        blacklist_cache.set(jti, revoked, expires_at=expires_at, generation=generation)
+
+    return revoked
+
+
+async def ais_token_revoked(jti, expires_at=None):
+    """Variante asíncrona de ``is_token_revoked``"""
+    if await blacklist_cache.apoll() and _filter_settings["ENABLED"]:
+        await sync_to_async(revocation_filter.refresh)()
+
+    generation = blacklist_cache.generation
+    revoked = blacklist_cache.get(jti)
+    if revoked is None:
+        if _filter_settings["ENABLED"] and not await revocation_filter.amight_contain(jti):
+            revoked = False
+        else:
+            revoked = await TokenBlacklist.ais_token_blacklisted(jti, expires_at)
+            if _filter_settings["ENABLED"]:
+                revocation_filter.record_result(revoked)
+        blacklist_cache.set(jti, revoked, expires_at=expires_at, generation=generation)
+
+    return revoked
+
+
+def _decode_for_revocation(token):
+    """
+    Verifica la firma del token (con la clave de su ``kid``) y devuelve su payload.
+    La expiración se comprueba aparte para poder informar de los tokens ya expirados
+    sin tratarlos como error.
+    """
+    return token_backend.decode(token, verify_exp=False)
+
+
+def revoke_tokens(tokens, user_id=None, token_type="access"):
+    """
+    Revoca una lista de tokens JWT con una única transacción.
+
+    Cada token se decodifica una sola vez; los ya revocados se detectan con consultas
+    ``IN`` por lotes y el resto se inserta con ``bulk_create(ignore_conflicts=True)``.
+    ``user_id`` y ``token_type`` solo se usan si el token no trae esos claims.
+
+    Devuelve una lista con el resultado de cada token, en el mismo orden:
+    ``{"index": i, "jti": "<hex>", "status": "revoked" | "already_revoked" | ...}``.
+    """
+    now = timezone.now().timestamp()
+    results = []
+    pending = {}
+
+    for index, token in enumerate(tokens):
+        result = {"index": index, "jti": None, "status": INVALID}
+        results.append(result)
+
+        try:
+            payload = _decode_for_revocation(token)
+        except (TokenBackendError, TypeError, AttributeError):
+            continue
+
+        key = token_key(payload, token)
+        result["jti"] = key.hex()
+
+        exp = payload.get("exp")
+        if exp is None:
+            continue
+        if exp <= now:
+            # Un token expirado ya no se acepta: no hace falta guardarlo
+            result["status"] = EXPIRED
+            continue
+        if key in pending:
+            result["status"] = DUPLICATE
+            continue
+
+        pending[key] = (result, TokenBlacklist(
+            jti=key,
+            user_id=payload.get(api_settings.USER_ID_CLAIM, user_id),
+            token_type=payload.get(api_settings.TOKEN_TYPE_CLAIM, token_type),
+            expires_at=datetime.fromtimestamp(exp, tz=dt_timezone.utc),
+            expiry_bucket=TokenBlacklist.bucket_for(exp),
+        ))
+
+    if not pending:
+        return results
+
+    keys = list(pending)
+    with transaction.atomic():
+        existing = set()
+        for start in range(0, len(keys), BULK_BATCH_SIZE):
+            batch = keys[start:start + BULK_BATCH_SIZE]
+            existing.update(
+                bytes(jti) for jti in TokenBlacklist.objects.filter(jti__in=batch).values_list("jti", flat=True)
+            )
+
+        new_rows = []
+        for key, (result, row) in pending.items():
+            if key in existing:
+                result["status"] = ALREADY_REVOKED
+            else:
+                result["status"] = REVOKED
+                new_rows.append(row)
+
+        TokenBlacklist.objects.bulk_create(new_rows, batch_size=BULK_BATCH_SIZE, ignore_conflicts=True)
+        transaction.on_commit(blacklist_cache.bump)
+
+    for key, (result, row) in pending.items():
+        revocation_filter.add(key)
+        blacklist_cache.set(key, True, expires_at=row.expires_at.timestamp())
+
+    return results
+
+
+def revoke_user_tokens(user_ids):
+    """
+    Revoca todos los tokens de los usuarios indicados moviendo su ``tokens_valid_after``
+    con un único ``UPDATE``.
+
+    Devuelve ``[{"user_id": id, "status": "revoked" | "not_found"}, ...]``.
+    """
+    from apps.authentication.user_cache import invalidate_user_snapshots
+
+    user_ids = list(dict.fromkeys(user_ids))
+    epoch = APIUser._token_epoch_now()
+
+    with transaction.atomic():
+        found = set()
+        for start in range(0, len(user_ids), BULK_BATCH_SIZE):
+            batch = user_ids[start:start + BULK_BATCH_SIZE]
+            found.update(APIUser.objects.filter(id__in=batch).values_list("id", flat=True))
+            APIUser.objects.filter(id__in=batch).update(tokens_valid_after=epoch)
+
+        # update() no lanza las señales de APIUser
+        transaction.on_commit(lambda: invalidate_user_snapshots(found))
+
+    return [
+        {"user_id": user_id, "status": REVOKED if user_id in found else NOT_FOUND}
+        for user_id in user_ids
+    ]
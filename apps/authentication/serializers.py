@@ -1,14 +1,30 @@
 import re
 
 from django.contrib.auth.hashers import check_password
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
-from rest_framework.validators import UniqueValidator
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 
-from apps.authentication.models import APIUser
+from apps.authentication.models import APIUser, OutboxMessage
+from apps.authentication.tokens import APIRefreshToken, add_user_claims, token_key
 
 
-class APIUserSerializer(serializers.ModelSerializer):
+class SparseFieldsetMixin:
+    """
+    Permite limitar los campos serializados con ``fields=[...]`` (p. ej. a partir del
+    parámetro ``?fields=`` de la petición). Sin ``fields`` se serializan todos.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class APIUserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializador para el modelo de usuario API.
     """
@@ -24,6 +40,17 @@ class APIUserSerializer(serializers.ModelSerializer):
             "username",
             "origin_app",
         ]
+        # La unicidad del email se comprueba sin distinguir mayúsculas en validate_email
+        extra_kwargs = {"email": {"validators": []}}
+
+    def validate_email(self, value):
+        email = APIUser.objects.normalize_email(value)
+        users = APIUser.objects.by_email(email)
+        if self.instance is not None:
+            users = users.exclude(pk=self.instance.pk)
+        if users.exists():
+            raise serializers.ValidationError("El email ya está en uso")
+        return email
 
 
 class APIUserRegistrationSerializer(serializers.ModelSerializer):
@@ -32,14 +59,8 @@ class APIUserRegistrationSerializer(serializers.ModelSerializer):
     Maneja la validación y creación de nuevos usuarios.
     """
 
-    email = serializers.EmailField(
-        required=True,
-        validators=[
-            UniqueValidator(
-                queryset=APIUser.objects.all(), message="El email ya está en uso"
-            )
-        ],
-    )
+    # La unicidad del email la garantiza la restricción UNIQUE de la tabla (ver create)
+    email = serializers.EmailField(required=True)
 
     password1 = serializers.CharField(
         write_only=True,
@@ -91,16 +112,31 @@ class APIUserRegistrationSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         """
-        Crea un nuevo usuario API con los datos validados.
+        Crea un nuevo usuario API con los datos validados en un único INSERT
+        (``origin_app`` y ``encoded_password`` llegan como argumentos de ``save``).
+        En la misma transacción se encola el aviso al servicio de dominio, que entrega
+        el dispatcher del outbox sin bloquear el registro.
         """
-        try:
-            validated_data.pop("password2")
-            password = validated_data["password1"]
+        validated_data.pop("password2")
+        password = validated_data["password1"]
 
-            user = APIUser.objects.create_user(
-                email=validated_data["email"], password=password
-            )
-            return user
+        try:
+            # Savepoint: un email duplicado no invalida la transacción de quien llama
+            with transaction.atomic():
+                user = APIUser.objects.create_user(
+                    email=validated_data["email"],
+                    password=password,
+                    encoded_password=validated_data.get("encoded_password"),
+                    origin_app=validated_data.get("origin_app"),
+                )
+                OutboxMessage.enqueue(OutboxMessage.DOMAIN_USER_CREATED, {"user_id": user.id})
+                return user
+        except IntegrityError as e:
+            # El username se deriva solo del email: si choca es porque el email está repetido
+            # (según la base de datos se informa antes de una u otra restricción UNIQUE)
+            if "email" in str(e) or "username" in str(e):
+                raise serializers.ValidationError({"email": ["El email ya está en uso"]}) from e
+            raise serializers.ValidationError(f"Error al crear el usuario: {e}") from e
         except Exception as e:
             raise serializers.ValidationError(f"Error al crear el usuario: {e}") from e
 
@@ -156,27 +192,53 @@ class OAuthRevokeSerializer(serializers.Serializer):
 
 class APITokenObtainPairSerializer(serializers.Serializer):
     """
-    Serializador para la obtención de pares de tokens JWT.
+    Serializador para la obtención de pares de tokens JWT. Tras validar deja el
+    usuario autenticado en ``self.user`` para que la vista no tenga que volver a
+    consultarlo ni a comprobar la contraseña.
     """
 
     email = serializers.EmailField(required=True)
     password = serializers.CharField(required=True, write_only=True)
 
-    def validate(self, attrs):
-        email = attrs.get("email")
-        password = attrs.get("password")
+    default_error_messages = {
+        "invalid_user": "Usuario no válido o inactivo",
+        "invalid_password": "Contraseña incorrecta",
+    }
 
+    user = None
+
+    def validate(self, attrs):
         # Validamos que el usuario exista y esté activo
-        user = APIUser.objects.filter(email=email).first()
+        user = APIUser.objects.by_email(attrs.get("email")).first()
         if not user or not user.is_active:
-            raise serializers.ValidationError("Usuario no válido o inactivo")
+            self.fail("invalid_user")
 
         # Validamos que la contraseña sea correcta
-        if not check_password(password, user.password):
-            raise serializers.ValidationError("Contraseña incorrecta")
+        if not check_password(attrs.get("password"), user.password):
+            self.fail("invalid_password")
+
+        return self.issue_tokens(user)
+
+    async def avalidate(self, attrs, hashing_pool):
+        """
+        Variante asíncrona de ``validate`` para las vistas ASGI: consulta el usuario con
+        el ORM asíncrono y calcula el hash en ``hashing_pool`` (ver ``hashing.py``).
+        ``attrs`` son los datos ya validados por los campos (``to_internal_value``).
+        """
+        user = await APIUser.objects.by_email(attrs.get("email")).afirst()
+        if not user or not user.is_active:
+            self.fail("invalid_user")
+
+        if not await hashing_pool.check_password(attrs.get("password"), user.password):
+            self.fail("invalid_password")
+
+        return self.issue_tokens(user)
+
+    def issue_tokens(self, user):
+        self.user = user
 
         # Generamos los tokens JWT
-        refresh = RefreshToken.for_user(user)
+        refresh = APIRefreshToken.for_user(user)
 
         # Información adicional al token
         # if hasattr(user, 'profile'):
@@ -191,6 +253,90 @@ class APITokenObtainPairSerializer(serializers.Serializer):
         return data
 
 
+class APITokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Serializador para la renovación de tokens JWT con los tokens propios (jti corto).
+    Rechaza los tokens de refresco revocados individualmente o por una revocación
+    masiva del usuario.
+    """
+
+    token_class = APIRefreshToken
+
+    def validate(self, attrs):
+        from apps.authentication.revocation import is_token_revoked
+        from apps.authentication.user_cache import get_user_snapshot
+
+        refresh = self.token_class(attrs["refresh"])
+
+        user = get_user_snapshot(refresh.get(api_settings.USER_ID_CLAIM))
+        self.check_user(user, refresh)
+
+        if is_token_revoked(token_key(refresh.payload, attrs["refresh"]), refresh.get("exp")):
+            raise AuthenticationFailed("Este token ha sido revocado.")
+
+        return {"access": str(self.access_token(refresh, user))}
+
+    async def avalidate(self, attrs):
+        """
+        Variante asíncrona de ``validate`` para las vistas ASGI. ``attrs`` son los datos
+        ya validados por los campos (``to_internal_value``).
+        """
+        from apps.authentication.revocation import ais_token_revoked
+        from apps.authentication.user_cache import aget_user_snapshot
+
+        refresh = self.token_class(attrs["refresh"])
+
+        user = await aget_user_snapshot(refresh.get(api_settings.USER_ID_CLAIM))
+        self.check_user(user, refresh)
+
+        if await ais_token_revoked(token_key(refresh.payload, attrs["refresh"]), refresh.get("exp")):
+            raise AuthenticationFailed("Este token ha sido revocado.")
+
+        return {"access": str(self.access_token(refresh, user))}
+
+    @staticmethod
+    def access_token(refresh, user):
+        """Token de acceso derivado, con los claims del usuario al día si están activos"""
+        access = refresh.access_token
+        add_user_claims(access, user)
+        return access
+
+    def check_user(self, user, refresh):
+        if user is None or not user.is_active:
+            raise AuthenticationFailed(
+                self.error_messages["no_active_account"], "no_active_account"
+            )
+
+        if user.token_issued_before_revocation(refresh.get("iat")):
+            raise AuthenticationFailed("Este token ha sido revocado.")
+
+
+class BulkRevokeSerializer(serializers.Serializer):
+    """
+    Serializador para la revocación en bloque de tokens JWT (solo administradores).
+    """
+
+    MAX_ITEMS = 50_000
+
+    tokens = serializers.ListField(
+        child=serializers.CharField(),
+        required=False,
+        max_length=MAX_ITEMS,
+        help_text="Tokens JWT (access o refresh) a revocar",
+    )
+    user_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        max_length=MAX_ITEMS,
+        help_text="IDs de usuarios cuyos tokens se revocarán todos",
+    )
+
+    def validate(self, attrs):
+        if not attrs.get("tokens") and not attrs.get("user_ids"):
+            raise serializers.ValidationError("Debe indicar tokens o user_ids.")
+        return attrs
+
+
 class LogoutResponseSerializer(serializers.Serializer):
     """
     Serializador para la respuesta de logout.
@@ -0,0 +1,61 @@
+"""
+Señales de la aplicación de autenticación.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from oauth2_provider.models import get_access_token_model, get_application_model
+
+from apps.authentication.models import APIUser
+
+
+@receiver(post_save, sender=APIUser)
+def invalidate_user_on_save(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Invalida la copia cacheada del usuario cuando cambia un usuario existente. Se
+    espera al commit para que ningún worker vuelva a cachear los datos antiguos.
+    """
+    if created or (update_fields is not None and set(update_fields) <= {"last_login"}):
+        return
+
+    from apps.authentication.introspection import invalidate_user_introspection
+    from apps.authentication.user_cache import invalidate_user_snapshots
+
+    transaction.on_commit(lambda: invalidate_user_snapshots([instance.pk]))
+    # La introspección OAuth2 devuelve el email del usuario: solo se invalidan sus tokens
+    transaction.on_commit(lambda: invalidate_user_introspection(instance.pk))
+
+
+@receiver(post_delete, sender=APIUser)
+def invalidate_user_on_delete(sender, instance, **kwargs):
+    from apps.authentication.user_cache import invalidate_user_snapshots
+
+    # Tras el borrado instance.pk pasa a ser None
+    user_id = instance.pk
+    transaction.on_commit(lambda: invalidate_user_snapshots([user_id]))
+
+
+@receiver(post_save, sender=get_access_token_model())
+@receiver(post_delete, sender=get_access_token_model())
+def invalidate_introspection_on_token_change(sender, instance, created=False, **kwargs):
+    """
+    Revocar un token OAuth2 lo borra: se invalida su entrada en la caché de
+    introspección. Los tokens nuevos no pueden estar cacheados y los expirados
+    (p. ej. cleartokens) ya han salido de la caché.
+    """
+    if created or instance.expires <= timezone.now():
+        return
+
+    from apps.authentication.introspection import invalidate_introspection
+
+    checksum = instance.token_checksum
+    transaction.on_commit(lambda: invalidate_introspection([checksum]))
+
+
+@receiver(post_save, sender=get_application_model())
+@receiver(post_delete, sender=get_application_model())
+def invalidate_clients_on_application_change(sender, instance, **kwargs):
+    from apps.authentication.introspection import invalidate_clients
+
+    transaction.on_commit(invalidate_clients)
@@ -0,0 +1,313 @@
+"""
+Firma asimétrica de los tokens JWT con rotación de claves y JWKS.
+
+Las claves privadas viven en ``JWT_SIGNING_KEYS["KEYS_DIR"]``, una por fichero
+``<kid>.pem``. El ``kid`` es la fecha de creación (``20261018T120000Z``), de modo
+que todos los workers y servidores que comparten el directorio deducen el mismo
+calendario sin más estado:
+
+- Una clave nueva se publica en el JWKS en cuanto aparece, pero solo empieza a
+  firmar pasados ``ACTIVATION_DELAY_SECONDS`` (al menos el ``max-age`` del JWKS),
+  cuando las cachés de los servicios que verifican ya la conocen.
+- La clave anterior deja de firmar en ese momento y se sigue publicando y
+  aceptando hasta que expiran los tokens que firmó (la vida máxima de un token).
+
+Sin claves (o antes de que se active la primera) se firma como hasta ahora, con
+HMAC y ``SIMPLE_JWT["SIGNING_KEY"]``. Esos tokens no llevan ``kid`` y, con
+``ACCEPT_LEGACY_HMAC`` activo, se aceptan solo hasta que expiran los emitidos antes
+de activarse la primera clave: a partir de entonces ``SIGNING_KEY`` ya no firma
+tokens válidos.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from jwt import InvalidAlgorithmError, InvalidTokenError
+from rest_framework_simplejwt.backends import TokenBackend
+from rest_framework_simplejwt.exceptions import TokenBackendError
+from rest_framework_simplejwt.settings import api_settings
+
+KID_FORMAT = "%Y%m%dT%H%M%SZ"
+
+ALGORITHMS = {"RS256": "RSA 3072", "EdDSA": "Ed25519"}
+
+
+def generate_private_key(algorithm):
+    if algorithm == "EdDSA":
+        return ed25519.Ed25519PrivateKey.generate()
+    if algorithm == "RS256":
+        return rsa.generate_private_key(public_exponent=65537, key_size=3072)
+    raise ValueError(f"Algoritmo no soportado: {algorithm}")
+
+
+def write_private_key(keys_dir, private_key, now=None):
+    """Guarda la clave como ``<kid>.pem`` (PKCS#8, permisos 0600) y devuelve su ``kid``"""
+    now = time.time() if now is None else now
+    kid = datetime.fromtimestamp(now, tz=dt_timezone.utc).strftime(KID_FORMAT)
+    path = os.path.join(keys_dir, f"{kid}.pem")
+
+    pem = private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    # O_EXCL: dos rotaciones en el mismo segundo no se pisan
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(pem)
+    return kid
+
+
+class SigningKey:
+    def __init__(self, kid, private_key):
+        self.kid = kid
+        self.private_key = private_key
+        self.public_key = private_key.public_key()
+        self.created_at = datetime.strptime(kid, KID_FORMAT).replace(tzinfo=dt_timezone.utc).timestamp()
+
+        if isinstance(private_key, ed25519.Ed25519PrivateKey):
+            self.algorithm = "EdDSA"
+            jwk = jwt.algorithms.OKPAlgorithm.to_jwk(self.public_key, as_dict=True)
+        elif isinstance(private_key, rsa.RSAPrivateKey):
+            self.algorithm = "RS256"
+            jwk = jwt.algorithms.RSAAlgorithm.to_jwk(self.public_key, as_dict=True)
+        else:
+            raise ValueError(f"Tipo de clave no soportado: {type(private_key).__name__}")
+
+        self.jwk = {**jwk, "kid": kid, "alg": self.algorithm, "use": "sig"}
+
+    @classmethod
+    def load(cls, path):
+        kid = os.path.basename(path)[: -len(".pem")]
+        with open(path, "rb") as f:
+            return cls(kid, serialization.load_pem_private_key(f.read(), password=None))
+
+
+class Keyring:
+    """
+    Claves de firma del directorio configurado. El directorio se vuelve a leer como
+    mucho cada ``reload_seconds`` y solo si ha cambiado.
+    """
+
+    def __init__(self, keys_dir, activation_delay, retention, reload_seconds):
+        self.keys_dir = keys_dir
+        self.activation_delay = activation_delay
+        self.retention = retention
+        self.reload_seconds = reload_seconds
+        self._keys = []
+        self._signature = None
+        self._next_check = 0
+        self._jwks = None
+        self._lock = threading.Lock()
+
+    def reload(self):
+        """Fuerza la relectura del directorio en la siguiente consulta"""
+        self._next_check = 0
+
+    def _reload(self, now):
+        if not self.keys_dir or now < self._next_check:
+            return
+
+        with self._lock:
+            if now < self._next_check:
+                return
+            self._next_check = now + self.reload_seconds
+
+            try:
+                entries = sorted(
+                    (entry.name, entry.stat().st_mtime_ns)
+                    for entry in os.scandir(self.keys_dir)
+                    if entry.name.endswith(".pem")
+                )
+            except OSError as e:
+                print(f"No se pudo leer el directorio de claves JWT {self.keys_dir}: {e}")
+                return
+
+            if entries == self._signature:
+                return
+
+            keys = []
+            for name, _mtime in entries:
+                try:
+                    keys.append(SigningKey.load(os.path.join(self.keys_dir, name)))
+                except (OSError, ValueError, TypeError) as e:
+                    print(f"Clave JWT ignorada ({name}): {e}")
+
+            self._keys = keys
+            self._signature = entries
+            self._jwks = None
+
+    def timeline(self, now=None):
+        """
+        Devuelve ``[(clave, firma_desde, publicada_hasta)]`` ordenado por ``kid``.
+        ``publicada_hasta`` es ``None`` para la última clave.
+        """
+        now = time.time() if now is None else now
+        self._reload(now)
+
+        keys = self._keys
+        timeline = []
+        for index, key in enumerate(keys):
+            activates_at = key.created_at + self.activation_delay
+            # Una clave se retira cuando expiran los tokens firmados antes de activarse la siguiente
+            successor = keys[index + 1] if index + 1 < len(keys) else None
+            retires_at = successor.created_at + self.activation_delay + self.retention if successor else None
+            timeline.append((key, activates_at, retires_at))
+        return timeline
+
+    def schedule(self, now=None):
+        """
+        Devuelve ``(clave_activa, claves_publicadas)``. ``clave_activa`` es ``None``
+        mientras no haya ninguna clave con el periodo de publicación cumplido.
+        """
+        now = time.time() if now is None else now
+        active, published = None, []
+        for key, activates_at, retires_at in self.timeline(now):
+            if activates_at <= now:
+                active = key
+            if retires_at is None or now < retires_at:
+                published.append(key)
+        return active, published
+
+    def signing_key(self):
+        return self.schedule()[0]
+
+    def legacy_hmac_until(self, now=None):
+        """
+        Hasta cuándo se aceptan tokens HMAC sin ``kid``: los emitidos antes de que firmara
+        la primera clave expiran, como tarde, ``retention`` segundos después de activarse.
+        ``None`` mientras no haya claves (se sigue firmando con HMAC).
+        """
+        timeline = self.timeline(now)
+        if not timeline:
+            return None
+        return timeline[0][1] + self.retention
+
+    def verifying_key(self, kid):
+        return next((key for key in self.schedule()[1] if key.kid == kid), None)
+
+    def jwks(self):
+        """Documento JWKS serializado y su ``ETag`` (se recalcula solo cuando cambian las claves)"""
+        published = self.schedule()[1]
+        kids = tuple(key.kid for key in published)
+
+        cached = self._jwks
+        if cached is None or cached[0] != kids:
+            body = json.dumps({"keys": [key.jwk for key in published]}, separators=(",", ":")).encode()
+            etag = '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+            cached = self._jwks = (kids, body, etag)
+
+        return cached[1], cached[2]
+
+    def expired_keys(self, now=None):
+        """Claves que ya no se publican: sus ficheros se pueden borrar"""
+        now = time.time() if now is None else now
+        return [key for key, _activates_at, retires_at in self.timeline(now) if retires_at and retires_at <= now]
+
+
+class KeyringTokenBackend(TokenBackend):
+    """
+    ``TokenBackend`` de Simple JWT que firma con la clave activa del ``Keyring``
+    (cabecera ``kid``) y verifica con la clave indicada por el ``kid`` del token.
+    """
+
+    def __init__(self, keyring, accept_legacy_hmac, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.keyring = keyring
+        self.accept_legacy_hmac = accept_legacy_hmac
+
+    def encode(self, payload):
+        key = self.keyring.signing_key()
+        if key is None:
+            return super().encode(payload)
+
+        jwt_payload = payload.copy()
+        if self.audience is not None:
+            jwt_payload["aud"] = self.audience
+        if self.issuer is not None:
+            jwt_payload["iss"] = self.issuer
+
+        return jwt.encode(
+            jwt_payload,
+            key.private_key,
+            algorithm=key.algorithm,
+            headers={"kid": key.kid},
+            json_encoder=self.json_encoder,
+        )
+
+    def _verification(self, token):
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+        except InvalidTokenError as ex:
+            raise TokenBackendError(_("Token is invalid or expired")) from ex
+
+        if kid is None:
+            # Tokens HMAC emitidos antes de activar las claves asimétricas
+            if self.accept_legacy_hmac and self.algorithm.startswith("HS"):
+                until = self.keyring.legacy_hmac_until()
+                if until is None or time.time() < until:
+                    return self.signing_key, self.algorithm
+            raise TokenBackendError(_("Token is invalid or expired"))
+
+        key = self.keyring.verifying_key(kid)
+        if key is None:
+            raise TokenBackendError(_("Token is invalid or expired"))
+        # El algoritmo lo fija la clave, nunca la cabecera del token
+        return key.public_key, key.algorithm
+
+    def decode(self, token, verify=True, verify_exp=True):
+        key, algorithm = self._verification(token)
+        try:
+            return jwt.decode(
+                token,
+                key,
+                algorithms=[algorithm],
+                audience=self.audience,
+                issuer=self.issuer,
+                leeway=self.get_leeway(),
+                options={
+                    "verify_aud": self.audience is not None,
+                    "verify_signature": verify,
+                    "verify_exp": verify_exp,
+                },
+            )
+        except InvalidAlgorithmError as ex:
+            raise TokenBackendError(_("Invalid algorithm specified")) from ex
+        except InvalidTokenError as ex:
+            raise TokenBackendError(_("Token is invalid or expired")) from ex
+
+
+_signing_settings = settings.JWT_SIGNING_KEYS
+
+keyring = Keyring(
+    keys_dir=_signing_settings["KEYS_DIR"],
+    activation_delay=_signing_settings["ACTIVATION_DELAY_SECONDS"],
+    retention=0,
+    reload_seconds=_signing_settings["RELOAD_SECONDS"],
+)
+
+token_backend = KeyringTokenBackend(
+    keyring,
+    _signing_settings["ACCEPT_LEGACY_HMAC"],
+    api_settings.ALGORITHM,
+    api_settings.SIGNING_KEY,
+    api_settings.VERIFYING_KEY,
+    api_settings.AUDIENCE,
+    api_settings.ISSUER,
+    api_settings.JWK_URL,
+    api_settings.LEEWAY,
+    api_settings.JSON_ENCODER,
+)
+
+# Una clave retirada se conserva mientras pueda quedar algún token firmado con ella
+keyring.retention = (
+    max(api_settings.ACCESS_TOKEN_LIFETIME, api_settings.REFRESH_TOKEN_LIFETIME) + token_backend.get_leeway()
+).total_seconds()
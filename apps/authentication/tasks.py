@@ -1,8 +1,25 @@
-import json
-
-import pika
 from celery import shared_task
-from apps.authentication.models import APIUser
+from celery.signals import worker_process_shutdown
+
+from apps.authentication.models import APIUser, TokenBlacklist
+from apps.services.user_queue import (
+    UserQueuePublishError,
+    close_user_queue_publisher,
+    get_user_queue_publisher,
+)
+
+
+def user_queue_message(user, auth_type):
+    """Mensaje de ``user_queue`` para un usuario (instancia o diccionario de ``values()``)"""
+    get = user.get if isinstance(user, dict) else lambda field: getattr(user, field)
+    return {
+        'user_id': get('id'),
+        'username': get('username'),
+        'email': get('email'),
+        'is_active': get('is_active'),
+        'auth_type': auth_type,
+    }
+
 
 # TODO: Logging or email notification logic for queued events
 
@@ -15,10 +32,11 @@ from apps.authentication.models import APIUser
 """
 
 
-@shared_task
+@shared_task(autoretry_for=(UserQueuePublishError,), retry_backoff=True, max_retries=5)
 def send_user_to_queue(user_id, auth_type):
     """
     Celery task to prepare user data and send it directly to user_queue as JSON.
+    Uses the worker's persistent publisher (publisher confirms, reconnection).
     """
     # Fetch user details from the database
     try:
@@ -27,39 +45,43 @@ def send_user_to_queue(user_id, auth_type):
         print(f"User with id {user_id} not found.")
         return None
 
-    # Prepare user data dictionary
-    user_data = {
-        'user_id': user.id,
-        'username': user.username,
-        'email': user.email,
-        'is_active': user.is_active,
-        'auth_type': auth_type,
-    }
+    user_data = user_queue_message(user, auth_type)
+    get_user_queue_publisher().publish(user_data)
 
-    print(f"User {user_data['username']} has been prepared.")
+    print(f" [x] Sent user {user_id} to user_queue")
 
-    # Conectar a RabbitMQ y enviar user_data a user_queue
-    connection = pika.BlockingConnection(pika.ConnectionParameters('localhost'))
-    channel = connection.channel()
+    return user_data
 
-    # Declarar la cola
-    channel.queue_declare(queue='user_queue', durable=True)
 
-    # Serializar user_data a JSON
-    message = json.dumps(user_data)
+@shared_task(autoretry_for=(UserQueuePublishError,), retry_backoff=True, max_retries=5)
+def send_users_to_queue(user_ids, auth_type=None):
+    """
+    Publishes several users to user_queue in one batch (one query, one confirm round).
+    Intended for backfills and bulk re-syncs.
+    """
+    users = APIUser.objects.filter(id__in=user_ids).values('id', 'username', 'email', 'is_active')
+    messages = [user_queue_message(user, auth_type) for user in users]
+    get_user_queue_publisher().publish_many(messages)
 
-    # Publicar el mensaje en user_queue
-    channel.basic_publish(
-        exchange='',
-        routing_key='user_queue',
-        body=message.encode('utf-8'),
-        properties=pika.BasicProperties(delivery_mode=2)  # Mensaje persistente
-    )
+    print(f" [x] Sent {len(messages)} user(s) to user_queue")
+
+    return len(messages)
 
-    print(f" [x] Sent user data to user_queue: '{message}'")
 
-    # Cerrar la conexión
-    channel.close()
-    connection.close()
+@worker_process_shutdown.connect
+def close_publisher(**kwargs):
+    close_user_queue_publisher()
 
-    return user_data
\ No newline at end of file
+
+@shared_task(ignore_result=True)
+def cleanup_expired_tokens():
+    """
+    Tarea periódica (CELERY_BEAT_SCHEDULE) que purga la blacklist de tokens en lotes
+    limitados por TOKEN_BLACKLIST_CLEANUP, para poder programarla en horas valle.
+    """
+    result = TokenBlacklist.cleanup_expired_tokens()
+    print(
+        f"Token blacklist cleanup: {result['rows']} row(s) in {result['buckets']} bucket(s), "
+        f"{result['batches']} batch(es), complete={result['complete']}"
+    )
+    return result
@@ -1,3 +1,2160 @@
-from django.test import TestCase
+import base64
+import gzip
+import hashlib
+import hmac
+import importlib.util
+import io
+import itertools
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+import uuid
+from datetime import timedelta
+from unittest import mock, skipIf, skipUnless
+from urllib.parse import urlencode
 
-# Create your tests here.
+import jwt
+from asgiref.sync import async_to_sync
+from cryptography.hazmat.primitives import serialization
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, resolve
+from django.utils import timezone
+from oauth2_provider.models import AccessToken, Application, RefreshToken
+from rest_framework import exceptions
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenBackendError
+
+from apps.authentication.async_views import (
+    AsyncJWTObtainPairView,
+    AsyncJWTRefreshView,
+    AsyncJWTRevokeView,
+    AsyncMeView,
+    AsyncSignUpView,
+)
+from apps.authentication.authentication import CookieJWTAuthentication, ThrottledBasicAuthentication
+from apps.authentication.bloom import BloomFilter
+from apps.authentication.cache import KeyInvalidatedTTLCache, TTLCache, VersionedTTLCache
+from apps.authentication.filters import UserFilter
+from apps.authentication.hashing import HashingPool, HashingPoolBroken, HashingPoolFull, password_hashing_pool
+from apps.authentication.introspection import (
+    CLIENT_VERSION_KEY,
+    INTROSPECTION_VERSION_KEY,
+    client_cache,
+    introspect_token,
+    introspect_tokens,
+    introspection_cache,
+)
+from apps.authentication.middlewares import AppAuthenticationMiddleware
+from apps.authentication.models import APIUser, CacheInvalidation, CacheVersion, OutboxMessage, TokenBlacklist
+from apps.authentication.outbox import dispatch_batch
+from apps.authentication.partitions import (
+    DEFAULT_PARTITION,
+    PARTITION_PREFIX,
+    ensure_partitions,
+    is_partitioned,
+    list_partitions,
+    precreate_buckets,
+    purge_expired_buckets,
+)
+from apps.authentication.revocation import (
+    BLACKLIST_VERSION_KEY,
+    RevocationFilter,
+    ais_token_revoked,
+    blacklist_cache,
+    is_token_revoked,
+    revoke_tokens,
+    revoke_user_tokens,
+    revocation_filter,
+)
+from apps.authentication.serializers import (
+    APITokenObtainPairSerializer,
+    APITokenRefreshSerializer,
+    APIUserRegistrationSerializer,
+)
+from apps.authentication.signing import Keyring, KeyringTokenBackend, generate_private_key, write_private_key
+from apps.authentication.signing import keyring as signing_keyring
+from apps.authentication.throttling import CacheCounterStore, LocalCounterStore, LoginThrottle, login_throttle
+from apps.authentication.tokens import (
+    CLAIMS_VERSION_CLAIM,
+    JTI_KEY_BYTES,
+    APIAccessToken,
+    APIRefreshToken,
+    get_user_claims,
+    jti_key,
+    new_jti,
+    token_key,
+)
+from apps.authentication.user_cache import (
+    UserSnapshot,
+    aget_user_snapshot,
+    get_user_snapshot,
+    invalidate_user_snapshots,
+    user_cache,
+)
+from apps.authentication.user_import import UserImporter
+from apps.authentication.utils import (
+    OAUTH2_APPLICATION_NAME,
+    OAUTH2_TOKEN_BYTES,
+    _application_cache,
+    generate_oauth2_token,
+    get_oauth2_application,
+    new_oauth2_token,
+)
+from apps.services.user_queue import UserQueuePublishError, UserQueuePublisher
+from main.logging_config import APILogger, CompressedRotatingFileHandler, JSONLogMessage, QueueLogHandler, log_api_call
+
+SIGNUP_URL = "/api/v1/auth/signup/"
+PASSWORD = "Passw0rd!"
+
+
+def _statements(queries):
+    """Consultas capturadas sin los savepoints (dentro de TestCase todo atomic() es un savepoint)"""
+    return [
+        q["sql"] for q in queries.captured_queries
+        if not q["sql"].startswith(("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT"))
+    ]
+
+
+class SignUpQueryCountTests(TestCase):
+    def signup(self, email, app_name="mi_app_web"):
+        return self.client.post(
+            SIGNUP_URL,
+            {"email": email, "password1": PASSWORD, "password2": PASSWORD},
+            content_type="application/json",
+            HTTP_X_APP_NAME=app_name,
+        )
+
+    def test_signup_inserts_user_and_outbox_message(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.signup("nuevo@example.com")
+
+        self.assertEqual(response.status_code, 200, response.content)
+        statements = _statements(queries)
+        self.assertEqual(len(statements), 2, statements)
+        self.assertTrue(all(sql.startswith("INSERT") for sql in statements), statements)
+
+        user = APIUser.objects.get(email="nuevo@example.com")
+        self.assertEqual(user.origin_app, "mi_app_web")
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.event, OutboxMessage.DOMAIN_USER_CREATED)
+        self.assertEqual(message.payload, {"user_id": user.id})
+
+    def test_duplicate_email_is_mapped_from_the_constraint(self):
+        self.assertEqual(self.signup("repetido@example.com").status_code, 200)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.signup("repetido@example.com")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"email": ["El email ya está en uso"]})
+        self.assertEqual(len(_statements(queries)), 1)
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+
+    def test_email_is_case_insensitive(self):
+        self.assertEqual(self.signup(" Ana.Perez@Example.COM").status_code, 200)
+        self.assertEqual(APIUser.objects.get().email, "ana.perez@example.com")
+
+        response = self.signup("ANA.PEREZ@example.com")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"email": ["El email ya está en uso"]})
+
+    def test_same_local_part_does_not_collide(self):
+        self.assertEqual(self.signup("ana@example.com").status_code, 200)
+        self.assertEqual(self.signup("ana@example.org").status_code, 200)
+
+        usernames = set(APIUser.objects.filter(email__startswith="ana@").values_list("username", flat=True))
+        self.assertEqual(len(usernames), 2)
+        self.assertTrue(all(username.startswith("ana_") for username in usernames))
+
+    def test_unknown_app_leaves_origin_app_empty(self):
+        self.assertEqual(self.signup("otra@example.com", app_name="app_blog").status_code, 200)
+        self.assertIsNone(APIUser.objects.get(email="otra@example.com").origin_app)
+
+
+class RegistrationSerializerQueryCountTests(TestCase):
+    def test_validation_does_not_query(self):
+        serializer = APIUserRegistrationSerializer(
+            data={"email": "valida@example.com", "password1": PASSWORD, "password2": PASSWORD}
+        )
+        with self.assertNumQueries(0):
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+
+    def test_save_inserts_user_and_outbox_message(self):
+        serializer = APIUserRegistrationSerializer(
+            data={"email": "guardar@example.com", "password1": PASSWORD, "password2": PASSWORD}
+        )
+        serializer.is_valid(raise_exception=True)
+
+        with CaptureQueriesContext(connection) as queries:
+            user = serializer.save(origin_app="scootergy")
+
+        statements = _statements(queries)
+        self.assertEqual(len(statements), 2, statements)
+        self.assertEqual(user.origin_app, "scootergy")
+        self.assertEqual(user.username, APIUser.default_username("guardar@example.com"))
+        self.assertTrue(OutboxMessage.objects.filter(payload__user_id=user.id).exists())
+
+
+class EmailLoginTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = APIUser.objects.create_user(email="Login@Example.com", password=PASSWORD)
+
+    def test_login_ignores_email_case(self):
+        serializer = APITokenObtainPairSerializer(data={"email": "LOGIN@example.COM", "password": PASSWORD})
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(serializer.user, self.user)
+        self.assertIn('LOWER("authentication_apiuser"."email")', queries.captured_queries[0]["sql"])
+
+    def test_natural_key_ignores_email_case(self):
+        # BasicAuthentication, grant password de OAuth2 y createsuperuser
+        self.assertEqual(APIUser.objects.get_by_natural_key("login@EXAMPLE.com"), self.user)
+
+
+class LoginPipelineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = APIUser.objects.create_user(email="pipeline@example.com", username="pipeline", password=PASSWORD)
+
+    def login(self, password):
+        with mock.patch("apps.authentication.serializers.check_password", wraps=check_password) as checks:
+            response = self.client.post("/api/v1/auth/token/", {"email": "pipeline@example.com", "password": password},
+                                        content_type="application/json", HTTP_X_APP_NAME="mi_app_web")
+        return response, checks.call_count
+
+    def test_login_queries_the_user_and_hashes_the_password_once(self):
+        with self.assertNumQueries(1):
+            response, checks = self.login(PASSWORD)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(checks, 1)
+        # Las cookies salen de los mismos tokens que la respuesta
+        self.assertEqual(response.cookies["access_token"].value, response.json()["access"])
+        self.assertEqual(response.cookies["refresh_token"].value, response.json()["refresh"])
+
+    def test_wrong_password_is_checked_once(self):
+        with self.assertNumQueries(1):
+            response, checks = self.login("incorrecta")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(checks, 1)
+
+
+class TTLCacheTests(TestCase):
+    def at(self, now):
+        return mock.patch("apps.authentication.cache.time.time", return_value=now)
+
+    def test_entries_expire_after_the_ttl(self):
+        cache = TTLCache(ttl=60)
+        with self.at(1000):
+            cache.set("a", 1)
+        with self.at(1059):
+            self.assertEqual(cache.get("a"), 1)
+        with self.at(1060):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
+    def test_expires_at_caps_the_ttl(self):
+        cache = TTLCache(ttl=60)
+        with self.at(1000):
+            cache.set("a", 1, expires_at=1010)
+            # Ya expirado: no se guarda
+            cache.set("b", 1, expires_at=999)
+        with self.at(1009):
+            self.assertEqual(cache.get("a"), 1)
+            self.assertIsNone(cache.get("b"))
+        with self.at(1010):
+            self.assertIsNone(cache.get("a"))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = TTLCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual((cache.get("a"), cache.get("b"), cache.get("c")), (1, None, 3))
+
+    def test_bump_in_one_worker_clears_the_others(self):
+        first, second = (VersionedTTLCache("tests", poll_interval=0) for _ in range(2))
+        first.sync(), second.sync()
+        second.set("a", 1)
+
+        first.bump()
+        self.assertTrue(second.sync())
+        self.assertIsNone(second.get("a"))
+        self.assertFalse(second.sync())
+
+    def test_key_invalidation_only_drops_those_keys(self):
+        first, second = (KeyInvalidatedTTLCache("tests", poll_interval=0) for _ in range(2))
+        first.sync(), second.sync()
+        second.set("a", 1)
+        second.set("b", 2)
+
+        first.invalidate(["a"])
+        self.assertTrue(second.sync())
+        self.assertEqual((second.get("a"), second.get("b")), (None, 2))
+
+    def test_set_is_skipped_after_an_invalidation(self):
+        cache = TTLCache()
+        generation = cache.generation
+        cache.clear()
+        cache.set("a", 1, generation=generation)
+        self.assertIsNone(cache.get("a"))
+
+        cache.set("a", 1, generation=cache.generation)
+        self.assertEqual(cache.get("a"), 1)
+
+    def test_version_is_polled_at_most_once_per_interval(self):
+        cache = VersionedTTLCache("tests", poll_interval=60)
+        cache.sync()
+        with self.assertNumQueries(0):
+            self.assertFalse(cache.sync())
+
+    def test_revocation_in_another_worker_is_seen_after_the_poll(self):
+        jti = os.urandom(16)
+        expires_at = timezone.now() + timedelta(hours=1)
+        with mock.patch.object(blacklist_cache, "poll_interval", 0):
+            self.assertFalse(is_token_revoked(jti, expires_at.timestamp()))
+            # El negativo queda en caché: solo se consulta la versión
+            with self.assertNumQueries(1):
+                self.assertFalse(is_token_revoked(jti, expires_at.timestamp()))
+
+            # Otro worker revoca el token y, tras el commit, incrementa la versión
+            TokenBlacklist.objects.create(jti=jti, user_id=1, expires_at=expires_at)
+            CacheVersion.bump(BLACKLIST_VERSION_KEY)
+            self.assertTrue(is_token_revoked(jti, expires_at.timestamp()))
+
+    def test_result_read_before_a_concurrent_revocation_is_not_cached(self):
+        jti = os.urandom(16)
+        exp = time.time() + 3600
+
+        def read_then_revoke(*args):
+            # La revocación se confirma e invalida la caché mientras este hilo lee
+            blacklist_cache.bump()
+            return False
+
+        with mock.patch.object(revocation_filter, "might_contain", return_value=True), \
+                mock.patch.object(TokenBlacklist, "is_token_blacklisted", side_effect=read_then_revoke):
+            self.assertFalse(is_token_revoked(jti, exp))
+        self.assertIsNone(blacklist_cache.get(jti))
+
+    def test_async_result_read_before_a_concurrent_revocation_is_not_cached(self):
+        jti = os.urandom(16)
+        exp = time.time() + 3600
+
+        async def read_then_clear(*args):
+            blacklist_cache.clear()
+            return False
+
+        with mock.patch.object(revocation_filter, "amight_contain", mock.AsyncMock(return_value=True)), \
+                mock.patch.object(TokenBlacklist, "ais_token_blacklisted", side_effect=read_then_clear):
+            self.assertFalse(async_to_sync(ais_token_revoked)(jti, exp))
+        self.assertIsNone(blacklist_cache.get(jti))
+
+
+class JTIKeyTests(SimpleTestCase):
+    def test_own_jti_is_short_and_decodes_to_its_bytes(self):
+        jti = new_jti()
+        self.assertEqual(len(jti), 22)
+        self.assertEqual(jti_key(jti), base64.urlsafe_b64decode(jti + "=="))
+        self.assertEqual(len(jti_key(jti)), JTI_KEY_BYTES)
+
+    def test_simplejwt_uuid_jti_uses_its_bytes(self):
+        jti = uuid.uuid4()
+        self.assertEqual(jti_key(jti.hex), jti.bytes)
+
+    def test_other_formats_fall_back_to_the_hash(self):
+        for jti in ("abc", "!" * 22, "z" * 32):
+            self.assertEqual(jti_key(jti), hashlib.sha256(jti.encode()).digest()[:JTI_KEY_BYTES])
+
+    def test_token_without_jti_is_keyed_by_its_hash(self):
+        self.assertEqual(token_key({}, "a.b.c"), hashlib.sha256(b"a.b.c").digest()[:JTI_KEY_BYTES])
+        self.assertEqual(token_key({"jti": "abc"}, "a.b.c"), jti_key("abc"))
+
+
+class RevokeTokensTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = APIUser.objects.create_user(email="revoke@example.com", username="revoke", password=PASSWORD)
+
+    def token(self, **claims):
+        token = APIRefreshToken.for_user(self.user).access_token
+        for claim, value in claims.items():
+            token[claim] = value
+        return str(token)
+
+    def statuses(self, results):
+        return [result["status"] for result in results]
+
+    def test_statuses_and_idempotency(self):
+        first, second = self.token(), self.token()
+        expired = self.token(exp=int(time.time()) - 10)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            results = revoke_tokens([first, first, expired, "no-es-un-token", second])
+        self.assertEqual(self.statuses(results), ["revoked", "duplicate", "expired", "invalid", "revoked"])
+        self.assertEqual([result["index"] for result in results], [0, 1, 2, 3, 4])
+        self.assertIsNone(results[3]["jti"])
+        self.assertEqual(TokenBlacklist.objects.count(), 2)
+
+        # Repetir la petición no crea filas nuevas
+        with self.captureOnCommitCallbacks(execute=True):
+            results = revoke_tokens([first, second])
+        self.assertEqual(self.statuses(results), ["already_revoked", "already_revoked"])
+        self.assertEqual(TokenBlacklist.objects.count(), 2)
+
+        row = TokenBlacklist.objects.get(jti=bytes.fromhex(results[0]["jti"]))
+        self.assertEqual((row.user_id, row.token_type), (self.user.pk, "access"))
+        self.assertTrue(is_token_revoked(row.jti, row.expires_at.timestamp()))
+
+    def test_token_without_jti_is_keyed_by_its_hash(self):
+        token = APIRefreshToken.for_user(self.user).access_token
+        del token["jti"]
+        results = revoke_tokens([str(token)])
+        self.assertEqual(self.statuses(results), ["revoked"])
+        self.assertEqual(results[0]["jti"], token_key({}, str(token)).hex())
+
+    def test_revoke_user_tokens(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            results = revoke_user_tokens([self.user.pk, self.user.pk, 0])
+        self.assertEqual(results, [
+            {"user_id": self.user.pk, "status": "revoked"},
+            {"user_id": 0, "status": "not_found"},
+        ])
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.tokens_valid_after)
+
+
+class TokenBlacklistBucketTests(TestCase):
+    def revoke(self, expires_at):
+        return TokenBlacklist.objects.create(jti=os.urandom(16), user_id=1, expires_at=expires_at)
+
+    def test_lookup_with_the_expiry_reads_a_single_bucket(self):
+        expires_at = timezone.now() + timedelta(hours=1)
+        row = self.revoke(expires_at)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(TokenBlacklist.is_token_blacklisted(row.jti, expires_at.timestamp()))
+        self.assertIn(f"= {TokenBlacklist.bucket_for(expires_at)}", queries.captured_queries[0]["sql"])
+        # Con la expiración de otro día se consulta otro bucket
+        self.assertFalse(TokenBlacklist.is_token_blacklisted(row.jti, (expires_at + timedelta(days=1)).timestamp()))
+        self.assertTrue(async_to_sync(TokenBlacklist.ais_token_blacklisted)(row.jti, expires_at.timestamp()))
+
+    def test_lookup_without_the_expiry_only_reads_live_buckets(self):
+        live = self.revoke(timezone.now() + timedelta(days=1))
+        expired = self.revoke(timezone.now() - timedelta(days=2))
+        self.assertTrue(TokenBlacklist.is_token_blacklisted(live.jti))
+        self.assertFalse(TokenBlacklist.is_token_blacklisted(expired.jti))
+
+    @skipIf(connection.vendor == "postgresql", "En PostgreSQL la tabla está particionada")
+    def test_table_without_partitions(self):
+        self.assertFalse(is_partitioned())
+        self.assertEqual(ensure_partitions(), 0)
+
+
+@skipUnless(connection.vendor == "postgresql", "Las particiones solo existen en PostgreSQL")
+class TokenBlacklistPartitionTests(TestCase):
+    def partition_of(self, row):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT tableoid::regclass::text FROM token_blacklist WHERE id = %s", [row.id])
+            return cursor.fetchone()[0]
+
+    def test_rows_land_in_the_partition_of_their_bucket(self):
+        self.assertTrue(is_partitioned())
+        expires_at = timezone.now() + timedelta(days=1)
+        row = TokenBlacklist.objects.create(jti=os.urandom(16), user_id=1, expires_at=expires_at)
+        self.assertEqual(self.partition_of(row), f"{PARTITION_PREFIX}{TokenBlacklist.bucket_for(expires_at)}")
+
+    def test_lookup_with_the_expiry_is_pruned_to_one_partition(self):
+        bucket = TokenBlacklist.current_bucket() + 1
+        plan = TokenBlacklist.objects.filter(jti=os.urandom(16), expiry_bucket=bucket).explain()
+        self.assertIn(f"{PARTITION_PREFIX}{bucket}", plan)
+        self.assertNotIn(DEFAULT_PARTITION, plan)
+
+    def test_ensure_partitions_creates_the_missing_buckets(self):
+        ensure_partitions()
+        current = TokenBlacklist.current_bucket()
+        self.assertLessEqual(set(range(current, current + precreate_buckets() + 1)), set(list_partitions()))
+
+        missing = current + 1
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE {PARTITION_PREFIX}{missing}")
+        self.assertEqual(ensure_partitions(), 1)
+        self.assertIn(missing, list_partitions())
+        self.assertEqual(ensure_partitions(), 0)
+
+    def test_purge_drops_expired_partitions(self):
+        expired = TokenBlacklist.current_bucket() - 2
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE TABLE {PARTITION_PREFIX}{expired} PARTITION OF token_blacklist "
+                           f"FOR VALUES IN ({expired})")
+        row = TokenBlacklist.objects.create(
+            jti=os.urandom(16), user_id=1, expires_at=timezone.now() - timedelta(days=2), expiry_bucket=expired,
+        )
+        self.assertEqual(self.partition_of(row), f"{PARTITION_PREFIX}{expired}")
+
+        result = purge_expired_buckets(max_seconds=0, sleep_seconds=0)
+        self.assertEqual((result["buckets"], result["complete"]), (1, True))
+        self.assertNotIn(expired, list_partitions())
+        self.assertFalse(TokenBlacklist.objects.filter(id=row.id).exists())
+
+
+class PurgeExpiredBucketsTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        # Cinco filas en dos buckets vencidos y una que sigue vigente
+        for days in (3, 3, 3, 1, 1, -1):
+            TokenBlacklist.objects.create(jti=os.urandom(16), user_id=1, expires_at=now - timedelta(days=days))
+
+    def purge(self, **options):
+        return purge_expired_buckets(**{"batch_size": 2, "max_seconds": 0, "sleep_seconds": 0, **options})
+
+    def test_dry_run_counts_without_deleting(self):
+        progress = []
+        result = self.purge(dry_run=True, progress=progress.append)
+        self.assertEqual(result, {"buckets": 2, "rows": 5, "batches": 3, "complete": True})
+        self.assertEqual([step["rows"] for step in progress], [2, 4, 5])
+        self.assertEqual(TokenBlacklist.objects.count(), 6)
+
+    def test_expired_rows_are_deleted_in_batches(self):
+        # En SQLite no hay particiones y en PostgreSQL estas filas caen en la partición DEFAULT:
+        # en ambos casos se borran por lotes
+        result = self.purge()
+        self.assertEqual(result, {"buckets": 2, "rows": 5, "batches": 3, "complete": True})
+        self.assertEqual(list(TokenBlacklist.objects.values_list("expiry_bucket", flat=True)),
+                         [TokenBlacklist.current_bucket() + 1])
+
+    def test_time_limit_leaves_the_rest_for_the_next_run(self):
+        with mock.patch("apps.authentication.partitions.time.monotonic", side_effect=itertools.count()):
+            result = self.purge(max_seconds=1.5)
+        self.assertEqual((result["rows"], result["complete"]), (2, False))
+        self.assertEqual(TokenBlacklist.objects.count(), 4)
+
+        self.assertTrue(self.purge()["complete"])
+        self.assertEqual(TokenBlacklist.objects.count(), 1)
+
+    def test_command_dry_run(self):
+        output = io.StringIO()
+        call_command("cleanup_expired_tokens", "--dry-run", "--batch-size", "2", "--sleep", "0", stdout=output)
+        self.assertIn("5 token(s) expirado(s) se eliminarían en 2 bucket(s)", output.getvalue())
+        self.assertEqual(TokenBlacklist.objects.count(), 6)
+
+
+class BloomFilterTests(SimpleTestCase):
+    def test_sizing_follows_capacity_and_error_rate(self):
+        bloom = BloomFilter(10_000, 0.001)
+        # m = -n·ln(p) / ln(2)² y k = m/n·ln(2)
+        self.assertEqual(bloom.num_bits, 143_776)
+        self.assertEqual(bloom.num_hashes, 10)
+        self.assertEqual(bloom.size_bytes, 17_972)
+
+    def test_max_bytes_caps_the_filter(self):
+        bloom = BloomFilter(1_000_000, 0.001, max_bytes=1024)
+        self.assertEqual(bloom.size_bytes, 1024)
+        for i in range(5000):
+            bloom.add(i.to_bytes(16, "little"))
+        self.assertGreater(bloom.estimated_false_positive_rate, 0.001)
+
+    def test_no_false_negatives_and_observed_rate_close_to_target(self):
+        bloom = BloomFilter(10_000, 0.01)
+        keys = [os.urandom(16) for _ in range(10_000)]
+        for key in keys:
+            bloom.add(key)
+
+        self.assertTrue(all(key in bloom for key in keys))
+        self.assertAlmostEqual(bloom.estimated_false_positive_rate, 0.01, delta=0.002)
+        false_positives = sum(os.urandom(16) in bloom for _ in range(50_000))
+        self.assertLess(false_positives / 50_000, 0.015)
+
+
+class RevocationFilterTests(TestCase):
+    def revoke(self, jti, expires_in=3600):
+        expires_at = timezone.now() + timedelta(seconds=expires_in)
+        return TokenBlacklist.objects.create(jti=jti, user_id=1, expires_at=expires_at)
+
+    def test_rebuild_loads_live_tokens_only(self):
+        self.revoke(b"v" * 16)
+        self.revoke(b"e" * 16, expires_in=-3 * TokenBlacklist.EXPIRY_BUCKET_SECONDS)
+        revocation = RevocationFilter(min_capacity=100)
+
+        self.assertTrue(revocation.might_contain(b"v" * 16))
+        self.assertFalse(revocation.might_contain(b"e" * 16))
+        self.assertEqual(revocation.describe()["items"], 1)
+
+    def test_refresh_adds_new_revocations_without_rebuilding(self):
+        revocation = RevocationFilter(min_capacity=100)
+        revocation.rebuild()
+        bloom = revocation._filter
+        self.revoke(b"n" * 16)
+
+        self.assertFalse(revocation.might_contain(b"n" * 16))
+        revocation.refresh()
+        self.assertTrue(revocation.might_contain(b"n" * 16))
+        self.assertIs(revocation._filter, bloom)
+
+    def test_rebuilds_when_the_interval_expires(self):
+        revocation = RevocationFilter(min_capacity=100, rebuild_interval=3600)
+        revocation.rebuild()
+        bloom = revocation._filter
+
+        revocation.might_contain(b"x" * 16)
+        self.assertIs(revocation._filter, bloom)
+        revocation._built_at -= 3600
+        revocation.might_contain(b"x" * 16)
+        self.assertIsNot(revocation._filter, bloom)
+
+    def test_rebuilds_when_capacity_is_exceeded(self):
+        self.revoke(b"a" * 16)
+        revocation = RevocationFilter(min_capacity=1)
+        revocation.rebuild()
+        self.assertEqual(revocation._filter.capacity, 2)
+
+        for key in (b"b", b"c", b"d"):
+            self.revoke(key * 16)
+        revocation.refresh()
+        self.assertEqual(revocation._filter.capacity, 8)
+        self.assertTrue(all(revocation.might_contain(key * 16) for key in (b"a", b"b", b"c", b"d")))
+
+    def test_only_one_thread_rebuilds_and_the_rest_keep_serving(self):
+        revocation = RevocationFilter(min_capacity=100)
+        started, release = threading.Event(), threading.Event()
+
+        def slow_rebuild():
+            # Sin base de datos: el hilo no comparte la transacción del test
+            started.set()
+            release.wait(5)
+            revocation._filter = BloomFilter(100)
+            revocation._built_at = time.monotonic()
+
+        with mock.patch.object(revocation, "rebuild", side_effect=slow_rebuild) as patched:
+            worker = threading.Thread(target=revocation.might_contain, args=(b"x" * 16,))
+            worker.start()
+            self.assertTrue(started.wait(5))
+
+            # Sin filtro todavía: no se espera, se manda a la base de datos
+            self.assertTrue(revocation.might_contain(b"x" * 16))
+            release.set()
+            worker.join(5)
+
+            revocation._built_at -= revocation.rebuild_interval
+            started.clear(), release.clear()
+            worker = threading.Thread(target=revocation.might_contain, args=(b"x" * 16,))
+            worker.start()
+            self.assertTrue(started.wait(5))
+
+            # Con un filtro anterior se sigue usando mientras otro hilo reconstruye
+            self.assertFalse(revocation.might_contain(b"x" * 16))
+            release.set()
+            worker.join(5)
+
+        self.assertEqual(patched.call_count, 2)
+
+
+class IntrospectionTests(TestCase):
+    SECRET = "secreto-del-servidor-de-recursos"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = APIUser.objects.create_user(email="oauth@example.com", password=PASSWORD)
+        cls.other_user = APIUser.objects.create_user(email="otro@example.com", password=PASSWORD)
+        cls.application = Application.objects.create(
+            name="recursos", client_type=Application.CLIENT_CONFIDENTIAL,
+            authorization_grant_type=Application.GRANT_PASSWORD, client_secret=cls.SECRET,
+        )
+        cls.token = cls.access_token("token-ana", cls.user)
+        cls.other_token = cls.access_token("token-otro", cls.other_user)
+
+    @classmethod
+    def access_token(cls, token, user, expires_in=3600, scope="read"):
+        return AccessToken.objects.create(
+            user=user, application=cls.application, token=token, scope=scope,
+            expires=timezone.now() + timedelta(seconds=expires_in),
+        )
+
+    def setUp(self):
+        introspection_cache.clear()
+        client_cache.clear()
+        # Otro worker con su propia copia de la caché
+        self.worker = KeyInvalidatedTTLCache(INTROSPECTION_VERSION_KEY, ttl=300, poll_interval=0)
+        self.worker.sync()
+
+    def basic(self, client_id=None, secret=SECRET):
+        credentials = f"{client_id or self.application.client_id}:{secret}"
+        return {"HTTP_AUTHORIZATION": f"Basic {base64.b64encode(credentials.encode()).decode()}"}
+
+    def test_result_is_cached_until_the_token_expires(self):
+        token = self.access_token("token-corto", self.user, expires_in=10)
+        with mock.patch.object(introspection_cache, "poll_interval", 3600):
+            data = introspect_token("token-corto")
+            with self.assertNumQueries(0):
+                self.assertEqual(introspect_token("token-corto"), data)
+
+        self.assertEqual(data["exp"], int(token.expires.timestamp()))
+        # Con un TTL de 300 s la entrada se descarta igualmente al llegar el exp del token
+        with mock.patch("apps.authentication.cache.time.time", return_value=token.expires.timestamp() + 1):
+            self.assertIsNone(introspection_cache.get(token.token_checksum))
+
+    def test_revocation_invalidates_only_that_token_in_every_worker(self):
+        for access_token in (self.token, self.other_token):
+            self.worker.set(access_token.token_checksum, {"active": True})
+        introspect_token("token-ana")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+
+        self.assertEqual(introspect_token("token-ana"), {"active": False})
+        self.worker.sync()
+        self.assertIsNone(self.worker.get(self.token.token_checksum))
+        self.assertIsNotNone(self.worker.get(self.other_token.token_checksum))
+
+    def test_user_change_invalidates_only_their_tokens(self):
+        for access_token in (self.token, self.other_token):
+            self.worker.set(access_token.token_checksum, {"active": True})
+
+        self.user.email = "oauth.nuevo@example.com"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+
+        self.worker.sync()
+        self.assertIsNone(self.worker.get(self.token.token_checksum))
+        self.assertIsNotNone(self.worker.get(self.other_token.token_checksum))
+
+    def test_old_invalidations_are_purged(self):
+        self.worker.invalidate(["a" * 64])
+        CacheInvalidation.objects.update(created_at=timezone.now() - timedelta(seconds=400))
+        self.worker.invalidate(["b" * 64])
+        self.assertEqual(list(CacheInvalidation.objects.values_list("item_key", flat=True)), ["b" * 64])
+
+    def test_batch_keeps_order(self):
+        results = introspect_tokens(["token-otro", "no-existe", "token-ana", "token-otro", "", None])
+        self.assertEqual(
+            [result.get("username") for result in results],
+            ["otro@example.com", None, "oauth@example.com", "otro@example.com", None, None],
+        )
+        self.assertEqual([result["active"] for result in results], [True, False, True, True, False, False])
+
+    def test_batch_endpoint(self):
+        response = self.client.post("/api/v1/auth/o/introspect/batch/", {"tokens": ["token-ana", "x"]},
+                                    content_type="application/json", **self.basic())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result["active"] for result in response.json()["results"]], [True, False])
+
+    def test_batch_endpoint_enforces_max_batch(self):
+        max_batch = settings.AUTH_CACHES["INTROSPECTION"]["MAX_BATCH"]
+        response = self.client.post("/api/v1/auth/o/introspect/batch/", {"tokens": ["x"] * (max_batch + 1)},
+                                    content_type="application/json", **self.basic())
+        self.assertEqual(response.status_code, 400)
+
+    def test_client_credentials(self):
+        client_id = self.application.client_id
+        requests = {
+            "basic": ({"token": "token-ana"}, "application/json", self.basic()),
+            "json": ({"token": "token-ana", "client_id": client_id, "client_secret": self.SECRET},
+                     "application/json", {}),
+            "form": (urlencode({"token": "token-ana", "client_id": client_id, "client_secret": self.SECRET}),
+                     "application/x-www-form-urlencoded", {}),
+        }
+        for name, (data, content_type, headers) in requests.items():
+            with self.subTest(name):
+                client_cache.clear()
+                response = self.client.post("/api/v1/auth/o/introspect/", data, content_type=content_type, **headers)
+                self.assertEqual(response.status_code, 200, response.content)
+                self.assertTrue(response.json()["active"])
+
+    def test_bearer_token_needs_the_introspection_scope(self):
+        self.access_token("token-lector", self.user, scope="read")
+        self.access_token("token-introspeccion", self.user, scope="introspection")
+        for token, status in (("token-lector", 403), ("token-introspeccion", 200)):
+            with self.subTest(token):
+                response = self.client.post("/api/v1/auth/o/introspect/", {"token": "token-ana"},
+                                            content_type="application/json", HTTP_AUTHORIZATION=f"Bearer {token}")
+                self.assertEqual(response.status_code, status)
+
+    def test_failed_client_authentication_is_forbidden(self):
+        for name, headers, data in (
+            ("sin credenciales", {}, {"token": "token-ana"}),
+            ("secreto incorrecto", self.basic(secret="incorrecto"), {"token": "token-ana"}),
+            ("cliente inexistente", self.basic(client_id="no-existe"), {"token": "token-ana"}),
+            ("secreto incorrecto en el cuerpo",
+             {}, {"token": "token-ana", "client_id": self.application.client_id, "client_secret": "incorrecto"}),
+        ):
+            with self.subTest(name):
+                response = self.client.post("/api/v1/auth/o/introspect/", data,
+                                            content_type="application/json", **headers)
+                self.assertEqual(response.status_code, 403)
+                self.assertEqual(response.json(), {"error": "invalid_client"})
+
+        response = self.client.post("/api/v1/auth/o/introspect/batch/", {"tokens": ["token-ana"]},
+                                    content_type="application/json", **self.basic(secret="incorrecto"))
+        self.assertEqual(response.status_code, 403)
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+class OAuth2TokenTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = APIUser.objects.create_user(email="oauth2@example.com", password=PASSWORD)
+        cls.application = Application.objects.create(
+            name=OAUTH2_APPLICATION_NAME, client_type=Application.CLIENT_CONFIDENTIAL,
+            authorization_grant_type=Application.GRANT_PASSWORD,
+        )
+
+    def setUp(self):
+        _application_cache.clear()
+        patcher = mock.patch.object(_application_cache, "poll_interval", 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_application_is_cached(self):
+        self.assertEqual(get_oauth2_application().pk, self.application.pk)
+        with mock.patch.object(_application_cache, "poll_interval", 3600), self.assertNumQueries(0):
+            self.assertEqual(get_oauth2_application().pk, self.application.pk)
+
+    def test_application_change_invalidates_every_worker(self):
+        # Otro worker con su propia copia de la caché
+        worker = VersionedTTLCache(CLIENT_VERSION_KEY, ttl=3600, poll_interval=0)
+        worker.sync()
+        worker.set(OAUTH2_APPLICATION_NAME, self.application)
+        get_oauth2_application()
+
+        self.application.redirect_uris = "https://example.com/callback"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.application.save()
+
+        self.assertEqual(get_oauth2_application().redirect_uris, "https://example.com/callback")
+        worker.sync()
+        self.assertIsNone(worker.get(OAUTH2_APPLICATION_NAME))
+
+    def test_application_delete_invalidates_the_cache(self):
+        get_oauth2_application()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.application.delete()
+
+        with self.assertRaises(Application.DoesNotExist):
+            get_oauth2_application()
+
+    def test_token_format(self):
+        tokens = {new_oauth2_token() for _ in range(100)}
+
+        self.assertEqual(len(tokens), 100)
+        for token in tokens:
+            self.assertEqual(len(token), 32)
+            self.assertRegex(token, r"^[A-Za-z0-9_-]{32}$")
+            self.assertEqual(len(base64.urlsafe_b64decode(token)), OAUTH2_TOKEN_BYTES)
+
+    def test_access_and_refresh_tokens_are_created_together(self):
+        data = generate_oauth2_token(self.user)
+
+        access = AccessToken.objects.get(token=data["access"])
+        self.assertEqual(access.user, self.user)
+        self.assertEqual(access.application, self.application)
+        self.assertEqual(access.refresh_token.token, data["refresh"])
+        self.assertEqual(data["expires"], access.expires.timestamp())
+        self.assertNotEqual(data["access"], data["refresh"])
+
+    def test_failed_refresh_token_rolls_back_the_access_token(self):
+        with mock.patch.object(RefreshToken.objects, "create", side_effect=DatabaseError("fallo")), \
+                self.assertRaises(DatabaseError):
+            generate_oauth2_token(self.user)
+
+        self.assertFalse(AccessToken.objects.filter(user=self.user).exists())
+        self.assertFalse(RefreshToken.objects.filter(user=self.user).exists())
+
+
+class JWTKeyringTests(SimpleTestCase):
+    T0 = 1_800_000_000
+    LEGACY_SECRET = "secreto-hmac-anterior-a-las-claves"
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.keys_dir = directory.name
+        self.keyring = Keyring(self.keys_dir, activation_delay=100, retention=1000, reload_seconds=0)
+        self.backend = KeyringTokenBackend(self.keyring, True, "HS256", self.LEGACY_SECRET)
+        self.payload = {"user_id": 1, "exp": int(time.time()) + 3600}
+
+    def add_key(self, at, algorithm="EdDSA"):
+        return write_private_key(self.keys_dir, generate_private_key(algorithm), now=at)
+
+    def at(self, now):
+        return mock.patch("apps.authentication.signing.time.time", return_value=now)
+
+    def test_timeline(self):
+        k0, k1 = self.add_key(self.T0), self.add_key(self.T0 + 500)
+        for offset, active, published in (
+            (50, None, [k0, k1]),
+            (100, k0, [k0, k1]),
+            (599, k0, [k0, k1]),
+            # La siguiente firma al cumplir su propio retardo de activación
+            (600, k1, [k0, k1]),
+            # k0 se acepta hasta que expiran los tokens que firmó
+            (1599, k1, [k0, k1]),
+            (1600, k1, [k1]),
+        ):
+            with self.subTest(offset=offset):
+                key, keys = self.keyring.schedule(self.T0 + offset)
+                self.assertEqual(key and key.kid, active)
+                self.assertEqual([key.kid for key in keys], published)
+
+        self.assertEqual([key.kid for key in self.keyring.expired_keys(self.T0 + 1599)], [])
+        self.assertEqual([key.kid for key in self.keyring.expired_keys(self.T0 + 1600)], [k0])
+
+    def test_signs_with_the_active_key(self):
+        with self.at(self.T0):
+            self.assertNotIn("kid", jwt.get_unverified_header(self.backend.encode(self.payload)))
+
+        kid = self.add_key(self.T0, "RS256")
+        with self.at(self.T0 + 100):
+            token = self.backend.encode(self.payload)
+            self.assertEqual(jwt.get_unverified_header(token), {"alg": "RS256", "kid": kid, "typ": "JWT"})
+            self.assertEqual(self.backend.decode(token)["user_id"], 1)
+
+    def test_legacy_hmac_tokens_are_accepted_until_they_expire(self):
+        legacy = jwt.encode(self.payload, self.LEGACY_SECRET, algorithm="HS256")
+        self.assertEqual(self.backend.decode(legacy)["user_id"], 1)
+        self.assertIsNone(self.keyring.legacy_hmac_until(self.T0))
+
+        self.add_key(self.T0)
+        self.assertEqual(self.keyring.legacy_hmac_until(self.T0), self.T0 + 100 + 1000)
+        with self.at(self.T0 + 1099):
+            self.assertEqual(self.backend.decode(legacy)["user_id"], 1)
+        with self.at(self.T0 + 1100), self.assertRaises(TokenBackendError):
+            self.backend.decode(legacy)
+
+        self.backend.accept_legacy_hmac = False
+        with self.at(self.T0 + 100), self.assertRaises(TokenBackendError):
+            self.backend.decode(legacy)
+
+    def test_algorithm_is_pinned_by_kid(self):
+        kid = self.add_key(self.T0, "RS256")
+        public_pem = self.keyring.timeline(self.T0)[0][0].public_key.public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+
+        # HS256 firmado con la clave pública como secreto (confusión de algoritmos)
+        signing_input = f'{_b64(json.dumps({"alg": "HS256", "kid": kid}).encode())}.' \
+                        f'{_b64(json.dumps(self.payload).encode())}'
+        forged = f"{signing_input}.{_b64(hmac.new(public_pem, signing_input.encode(), hashlib.sha256).digest())}"
+        # Otra clave que declara el algoritmo de la cabecera
+        other = jwt.encode(self.payload, generate_private_key("EdDSA"), algorithm="EdDSA", headers={"kid": kid})
+        unknown = jwt.encode(self.payload, generate_private_key("EdDSA"), algorithm="EdDSA", headers={"kid": "x"})
+
+        with self.at(self.T0 + 100):
+            for name, token in (("hmac", forged), ("otra clave", other), ("kid desconocido", unknown)):
+                with self.subTest(name), self.assertRaises(TokenBackendError):
+                    self.backend.decode(token)
+
+    def test_rotate_jwt_keys_prune(self):
+        now = time.time()
+        delay, retention = signing_keyring.activation_delay, signing_keyring.retention
+        expired = self.add_key(now - retention - 3 * delay)
+        previous = self.add_key(now - retention - 2 * delay)
+
+        out = io.StringIO()
+        with override_settings(JWT_SIGNING_KEYS={**settings.JWT_SIGNING_KEYS, "KEYS_DIR": self.keys_dir}), \
+                mock.patch.multiple(signing_keyring, keys_dir=self.keys_dir, _keys=[], _signature=None,
+                                    _jwks=None, _next_check=0):
+            call_command("rotate_jwt_keys", "--algorithm", "EdDSA", "--prune", stdout=out)
+
+        created = sorted(name[:-len(".pem")] for name in os.listdir(self.keys_dir))
+        self.assertEqual(len(created), 2)
+        self.assertEqual(created[0], previous)
+        self.assertNotIn(expired, created)
+        self.assertIn(f"Clave {expired} eliminada", out.getvalue())
+        self.assertIn(f"{previous}  EdDSA  firmando", out.getvalue())
+
+    def test_activation_delay_must_cover_the_jwks_max_age(self):
+        with override_settings(JWT_SIGNING_KEYS={**settings.JWT_SIGNING_KEYS, "ACTIVATION_DELAY_SECONDS": 60,
+                                                 "JWKS_MAX_AGE_SECONDS": 3600}):
+            with self.assertRaises(ImproperlyConfigured):
+                django_apps.get_app_config("authentication").ready()
+
+
+class HashingPoolTests(TestCase):
+    def test_dead_worker_raises_broken_and_the_pool_is_recreated(self):
+        pool = HashingPool(workers=1, max_pending=4)
+        self.addCleanup(pool.shutdown)
+
+        # El proceso del pool muere con el trabajo en curso
+        with self.assertRaises(HashingPoolBroken):
+            async_to_sync(pool.run)(os._exit, 1)
+        self.assertEqual(async_to_sync(pool.run)(abs, -3), 3)
+        self.assertEqual(pool.stats()["pending"], 0)
+
+    def test_full_pool_rejects_without_queueing(self):
+        pool = HashingPool(workers=1, max_pending=0)
+        with self.assertRaises(HashingPoolFull):
+            async_to_sync(pool.run)(abs, -3)
+        self.assertEqual(pool.stats()["rejected"], 1)
+
+    def test_login_returns_503_when_the_pool_is_unavailable(self):
+        APIUser.objects.create_user(email="pool@example.com", password=PASSWORD)
+        view = AsyncJWTObtainPairView.as_view()
+        for error in (HashingPoolFull("lleno"), HashingPoolBroken("proceso muerto")):
+            with self.subTest(type(error).__name__), \
+                    mock.patch.object(login_throttle, "enabled", False), \
+                    mock.patch.object(password_hashing_pool, "check_password", side_effect=error):
+                request = RequestFactory().post("/api/v1/auth/token/", {"email": "pool@example.com", "password": PASSWORD},
+                                                content_type="application/json")
+                request.user = AnonymousUser()
+                response = async_to_sync(view)(request)
+                self.assertEqual(response.status_code, 503)
+                self.assertEqual(response["Retry-After"], str(settings.PASSWORD_HASHING_POOL["RETRY_AFTER_SECONDS"]))
+
+
+def _async_auth_urlconf():
+    """URLconf con ``apps.authentication.urls`` cargado como bajo ASGI (``AUTH_ASYNC_VIEWS``)"""
+    spec = importlib.util.find_spec("apps.authentication.urls")
+    module = importlib.util.module_from_spec(spec)
+    with override_settings(AUTH_ASYNC_VIEWS=True):
+        spec.loader.exec_module(module)
+    return type("AsyncAuthURLConf", (), {"urlpatterns": [path("api/v1/auth/", include(module))]})
+
+
+class AsyncViewsTests(TestCase):
+    """Vistas de ``async_views.py`` a través de la pila ASGI completa (middlewares incluidos)"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.enterClassContext(override_settings(ROOT_URLCONF=_async_auth_urlconf()))
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = APIUser.objects.create_user(email="async@example.com", username="asincrono", password=PASSWORD)
+
+    def setUp(self):
+        user_cache.clear()
+        blacklist_cache.clear()
+        patcher = mock.patch.object(login_throttle, "store", LocalCounterStore(100))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, url, data, app_name="mi_app_web"):
+        headers = {"X-App-Name": app_name} if app_name else {}
+        return async_to_sync(self.async_client.post)(url, data, content_type="application/json", headers=headers)
+
+    def get(self, url, **extra):
+        return async_to_sync(self.async_client.get)(url, **extra)
+
+    def login(self):
+        return self.post("/api/v1/auth/token/", {"email": "async@example.com", "password": PASSWORD})
+
+    def test_urls_use_the_async_views(self):
+        for url, view in (("/api/v1/auth/token/", AsyncJWTObtainPairView),
+                          ("/api/v1/auth/token/refresh/", AsyncJWTRefreshView),
+                          ("/api/v1/auth/token/revoke/", AsyncJWTRevokeView),
+                          ("/api/v1/auth/me/", AsyncMeView),
+                          ("/api/v1/auth/signup/", AsyncSignUpView)):
+            with self.subTest(url):
+                self.assertIs(resolve(url).func.view_class, view)
+
+    def test_login_sets_the_session_cookies(self):
+        response = self.login()
+
+        self.assertEqual(response.status_code, 200, response.content)
+        data = response.json()
+        self.assertEqual(data["username"], "asincrono")
+        self.assertEqual(response.cookies["access_token"].value, data["access"])
+        self.assertEqual(response.cookies["refresh_token"].value, data["refresh"])
+        self.assertEqual(response.cookies["app_name"].value, "mi_app_web")
+        self.assertTrue(response.cookies["access_token"]["httponly"])
+
+    def test_login_with_bad_credentials(self):
+        response = self.post("/api/v1/auth/token/", {"email": "async@example.com", "password": "incorrecta"})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn("access_token", response.cookies)
+
+    def test_middleware_runs_its_async_branch(self):
+        original = AppAuthenticationMiddleware.__acall__
+        with mock.patch.object(AppAuthenticationMiddleware, "__acall__", autospec=True,
+                               side_effect=original) as acall:
+            response = self.post("/api/v1/auth/token/", {"email": "async@example.com", "password": PASSWORD},
+                                 app_name=None)
+
+        self.assertTrue(acall.called)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"error": "No se ha proporcionado el nombre de la aplicación"})
+
+        response = self.post("/api/v1/auth/token/", {"email": "async@example.com", "password": PASSWORD},
+                             app_name="app_desconocida")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"error": "La aplicación no está registrada"})
+
+    def test_signup(self):
+        data = {"email": "nuevo.async@example.com", "password1": PASSWORD, "password2": PASSWORD}
+        response = self.post("/api/v1/auth/signup/", data)
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()["app"], "mi_app_web")
+        user = APIUser.objects.get(email="nuevo.async@example.com")
+        self.assertEqual(user.origin_app, "mi_app_web")
+        self.assertTrue(user.check_password(PASSWORD))
+
+        response = self.post("/api/v1/auth/signup/", data)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"email": ["El email ya está en uso"]})
+
+    def test_me_with_the_access_cookie(self):
+        self.async_client.cookies["access_token"] = self.login().json()["access"]
+
+        response = self.get("/api/v1/auth/me/")
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()["username"], "asincrono")
+
+    def test_me_rejects_an_invalid_or_revoked_cookie(self):
+        self.async_client.cookies["access_token"] = "no-es-un-token"
+        response = self.get("/api/v1/auth/me/")
+        self.assertEqual(response.status_code, 401)
+        self.assertIn("WWW-Authenticate", response)
+
+        access = self.login().json()["access"]
+        with self.captureOnCommitCallbacks(execute=True):
+            revoke_tokens([access], user_id=self.user.id)
+        self.async_client.cookies["access_token"] = access
+
+        response = self.get("/api/v1/auth/me/")
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()["detail"], "Este token ha sido revocado.")
+
+    def test_me_without_cookie_falls_back_to_the_drf_view(self):
+        response = self.get("/api/v1/auth/me/")
+        self.assertIn(response.status_code, (401, 403))
+
+        # Basic sigue disponible a través de la vista DRF
+        credentials = base64.b64encode(f"async@example.com:{PASSWORD}".encode()).decode()
+        response = self.get("/api/v1/auth/me/", headers={"Authorization": f"Basic {credentials}"})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()["username"], "asincrono")
+
+    def test_refresh(self):
+        refresh = self.login().json()["refresh"]
+
+        response = self.post("/api/v1/auth/token/refresh/", {"refresh": refresh})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertIn("access", response.json())
+
+        response = self.post("/api/v1/auth/token/refresh/", {"refresh": "no-es-un-token"})
+        self.assertEqual(response.status_code, 401)
+
+    def test_refresh_rejects_a_revoked_token(self):
+        refresh = self.login().json()["refresh"]
+        with self.captureOnCommitCallbacks(execute=True):
+            revoke_tokens([refresh], user_id=self.user.id)
+
+        response = self.post("/api/v1/auth/token/refresh/", {"refresh": refresh})
+        self.assertEqual(response.status_code, 401)
+
+    def test_revoke_uses_the_session_cookies(self):
+        # Las cookies del login quedan en el cliente
+        self.assertEqual(self.login().status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post("/api/v1/auth/token/revoke/", {})
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(TokenBlacklist.objects.filter(user_id=self.user.id).count(), 2)
+        # El access revocado ya no autentica
+        self.assertEqual(self.get("/api/v1/auth/me/").status_code, 401)
+
+    def test_revoke_without_cookie_falls_back_to_the_drf_view(self):
+        response = self.post("/api/v1/auth/token/revoke/", {})
+        self.assertIn(response.status_code, (401, 403))
+
+
+class TokenEpochTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = APIUser.objects.create_user(email="epoch@example.com", username="epoch", password=PASSWORD)
+
+    def setUp(self):
+        # La caché de usuarios es del proceso y sobrevive al rollback de cada test
+        user_cache.clear()
+
+    def authenticate(self, issued_at=None):
+        token = APIRefreshToken.for_user(self.user).access_token
+        if issued_at is not None:
+            token.set_iat(at_time=issued_at)
+        request = RequestFactory().get("/")
+        request.COOKIES["access_token"] = str(token)
+        return CookieJWTAuthentication().authenticate(request)
+
+    def test_revoke_all_tokens_rejects_older_tokens(self):
+        earlier = timezone.now() - timedelta(minutes=1)
+        self.assertIsNotNone(self.authenticate(issued_at=earlier))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.revoke_all_tokens()
+
+        with self.assertRaisesMessage(AuthenticationFailed, "Este token ha sido revocado."):
+            self.authenticate(issued_at=earlier)
+        # Los emitidos después (incluso en el mismo segundo) siguen siendo válidos
+        self.assertEqual(self.authenticate()[0].pk, self.user.pk)
+
+    def test_password_change_rejects_older_tokens(self):
+        earlier = timezone.now() - timedelta(minutes=1)
+        self.user.set_password("OtraPassw0rd!")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+
+        with self.assertRaisesMessage(AuthenticationFailed, "Este token ha sido revocado."):
+            self.authenticate(issued_at=earlier)
+        self.assertIsNotNone(self.authenticate())
+
+    def test_token_without_iat_is_rejected_after_a_revocation(self):
+        self.assertFalse(self.user.token_issued_before_revocation(None))
+        self.user.revoke_all_tokens()
+        self.assertTrue(self.user.token_issued_before_revocation(None))
+
+
+class UserSnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = APIUser.objects.create_user(email="snapshot@example.com", username="antes", password=PASSWORD)
+
+    def setUp(self):
+        user_cache.clear()
+
+    def test_snapshot_is_cached(self):
+        snapshot = get_user_snapshot(self.user.pk)
+        self.assertEqual((snapshot.pk, snapshot.email, snapshot.username), (self.user.pk, self.user.email, "antes"))
+        with self.assertNumQueries(0):
+            self.assertIs(get_user_snapshot(self.user.pk), snapshot)
+        self.assertEqual(snapshot.get_user(), self.user)
+
+    def test_save_invalidates_the_snapshot(self):
+        get_user_snapshot(self.user.pk)
+        self.user.username = "despues"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(get_user_snapshot(self.user.pk).username, "despues")
+
+    def test_queryset_update_needs_an_explicit_invalidation(self):
+        get_user_snapshot(self.user.pk)
+        APIUser.objects.filter(pk=self.user.pk).update(username="despues")
+        self.assertEqual(get_user_snapshot(self.user.pk).username, "antes")
+
+        invalidate_user_snapshots([self.user.pk])
+        self.assertEqual(get_user_snapshot(self.user.pk).username, "despues")
+
+    def test_saving_a_user_keeps_the_other_snapshots(self):
+        other = APIUser.objects.create_user(email="otro@example.com", username="otro", password=PASSWORD)
+        snapshot = get_user_snapshot(self.user.pk)
+        get_user_snapshot(other.pk)
+
+        other.username = "otro2"
+        with mock.patch.object(user_cache, "poll_interval", 0):
+            with self.captureOnCommitCallbacks(execute=True):
+                other.save()
+            # Cualquier worker, al ver la versión nueva, borra solo la entrada de ese usuario
+            self.assertIs(get_user_snapshot(self.user.pk), snapshot)
+            self.assertEqual(get_user_snapshot(other.pk).username, "otro2")
+
+    def test_snapshot_read_before_a_concurrent_invalidation_is_not_cached(self):
+        def read_then_deactivate(user):
+            # El usuario se desactiva y se invalida mientras este hilo lo lee
+            invalidate_user_snapshots([user.pk])
+            return UserSnapshot(**{field: getattr(user, field) for field in UserSnapshot.FIELDS})
+
+        with mock.patch.object(UserSnapshot, "from_user", side_effect=read_then_deactivate):
+            self.assertEqual(get_user_snapshot(self.user.pk).pk, self.user.pk)
+        self.assertIsNone(user_cache.get(str(self.user.pk)))
+
+    def test_missing_user(self):
+        self.assertIsNone(get_user_snapshot(0))
+        self.assertIsNone(async_to_sync(aget_user_snapshot)(0))
+
+    def test_inactive_user_is_rejected(self):
+        token = str(APIRefreshToken.for_user(self.user).access_token)
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+
+        request = RequestFactory().get("/")
+        request.COOKIES["access_token"] = token
+        with self.assertRaisesMessage(AuthenticationFailed, "Token inválido o usuario inactivo"):
+            CookieJWTAuthentication().authenticate(request)
+
+
+class MeViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = APIUser.objects.create_user(email="me@example.com", username="antes", password=PASSWORD)
+
+    def setUp(self):
+        self.client.cookies["access_token"] = str(APIRefreshToken.for_user(self.user).access_token)
+
+    def test_me_reflects_profile_changes_without_a_new_token(self):
+        self.assertEqual(self.client.get("/api/v1/auth/me/").json()["username"], "antes")
+
+        self.user.username = "despues"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+
+        # Los datos salen de la copia cacheada del usuario, que se invalida al guardarlo
+        self.assertEqual(self.client.get("/api/v1/auth/me/").json()["username"], "despues")
+
+    def test_me_does_not_query_the_database_with_a_warm_cache(self):
+        self.client.get("/api/v1/auth/me/")
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/v1/auth/me/")
+        self.assertEqual(response.json(), {
+            "username": "antes", "email": "me@example.com", "origin_app": self.user.origin_app, "is_staff": False,
+        })
+
+
+@override_settings(JWT_USER_CLAIMS={"ENABLED": True})
+class UserClaimsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = APIUser.objects.create_user(email="claims@example.com", username="antes", password=PASSWORD)
+
+    def setUp(self):
+        user_cache.clear()
+
+    def me(self, token):
+        self.client.cookies["access_token"] = str(token)
+        return self.client.get("/api/v1/auth/me/").json()
+
+    def save_user(self, **fields):
+        for field, value in fields.items():
+            setattr(self.user, field, value)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+
+    def test_tokens_embed_the_user_claims(self):
+        access = APIRefreshToken.for_user(self.user).access_token
+        self.assertEqual(
+            {claim: access[claim] for claim in ("username", "email", "origin_app", "is_staff", CLAIMS_VERSION_CLAIM)},
+            {"username": "antes", "email": "claims@example.com", "origin_app": None, "is_staff": False,
+             CLAIMS_VERSION_CLAIM: 0},
+        )
+
+    def test_claims_version_changes_only_with_the_claims(self):
+        self.save_user(first_name="Ana")
+        self.user.revoke_all_tokens()
+        self.assertEqual(self.user.claims_version, 0)
+
+        self.save_user(username="despues")
+        self.assertEqual(self.user.claims_version, 1)
+        self.user.is_staff = True
+        self.user.save(update_fields=["is_staff"])
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.claims_version, 2)
+
+    def test_me_answers_from_the_token_while_its_version_is_current(self):
+        access = APIRefreshToken.for_user(self.user).access_token
+        # Un valor que solo está en el token demuestra de dónde sale la respuesta
+        access["username"] = "del_token"
+        self.assertEqual(self.me(access)["username"], "del_token")
+
+    def test_me_falls_back_to_the_user_after_a_profile_change(self):
+        access = APIRefreshToken.for_user(self.user).access_token
+        self.save_user(username="despues")
+
+        self.assertIsNone(get_user_claims(access, get_user_snapshot(self.user.pk)))
+        self.assertEqual(self.me(access)["username"], "despues")
+
+    def test_refresh_embeds_the_current_claims(self):
+        refresh = APIRefreshToken.for_user(self.user)
+        self.save_user(username="despues")
+
+        serializer = APITokenRefreshSerializer(data={"refresh": str(refresh)})
+        serializer.is_valid(raise_exception=True)
+        access = APIAccessToken(serializer.validated_data["access"])
+        self.assertEqual((access["username"], access[CLAIMS_VERSION_CLAIM]), ("despues", 1))
+        self.assertEqual(self.me(access)["username"], "despues")
+
+    @override_settings(JWT_USER_CLAIMS={"ENABLED": False})
+    def test_disabled_by_default(self):
+        access = APIRefreshToken.for_user(self.user).access_token
+        self.assertNotIn(CLAIMS_VERSION_CLAIM, access.payload)
+        self.assertIsNone(get_user_claims(access, self.user))
+        self.assertEqual(self.me(access)["username"], "antes")
+
+
+class LoginThrottleTests(SimpleTestCase):
+    # Inicio de una ventana de un minuto
+    T0 = 60 * 1_000_000
+
+    def throttle(self, store=None, **rates):
+        return LoginThrottle(rates or {"email": "5/min"}, store or LocalCounterStore(100))
+
+    def attempts(self, throttle, count, now, **values):
+        values = values or {"email": "ana@example.com"}
+        return [throttle.check(now=now, **values) for _ in range(count)]
+
+    def test_limit_within_a_window(self):
+        throttle = self.throttle()
+        results = self.attempts(throttle, 6, self.T0 + 10)
+        self.assertEqual(results[:5], [None] * 5)
+        self.assertIsNotNone(results[5])
+
+    def test_previous_window_is_weighted_by_its_overlap(self):
+        throttle = self.throttle()
+        self.attempts(throttle, 5, self.T0 + 50)
+        # A mitad de la ventana siguiente la anterior pesa 5 * 0.5 = 2.5: caben 2 intentos más
+        results = self.attempts(throttle, 3, self.T0 + 60 + 30)
+        self.assertEqual(results[:2], [None, None])
+        self.assertIsNotNone(results[2])
+
+    def test_honouring_retry_after_is_enough(self):
+        for offset in (0, 10, 59):
+            with self.subTest(offset=offset):
+                throttle = self.throttle()
+                now = self.T0 + offset
+                self.attempts(throttle, 5, now)
+                wait = throttle.check(email="ana@example.com", now=now)
+                self.assertGreater(wait, 0)
+
+                # Un segundo antes sigue rechazado; al cumplirse Retry-After (en segundos enteros) entra
+                self.assertIsNotNone(throttle.check(email="ana@example.com", now=now + math.ceil(wait) - 1))
+                self.assertIsNone(throttle.check(email="ana@example.com", now=now + math.ceil(wait)))
+
+    def test_retry_after_accounts_for_the_previous_window(self):
+        throttle = self.throttle()
+        self.attempts(throttle, 5, self.T0 + 50)
+        self.attempts(throttle, 2, self.T0 + 60 + 30)
+        wait = throttle.check(email="ana@example.com", now=self.T0 + 90)
+        # Hace falta que 2 + 5 * (1 - elapsed) <= 4, es decir elapsed >= 0.6: segundo 36 de la ventana
+        self.assertAlmostEqual(wait, 6)
+
+    def test_rejected_attempts_do_not_extend_the_lockout(self):
+        throttle = self.throttle()
+        self.attempts(throttle, 5, self.T0)
+        first_wait = throttle.check(email="ana@example.com", now=self.T0)
+        self.attempts(throttle, 50, self.T0 + 1)
+        self.assertAlmostEqual(throttle.check(email="ana@example.com", now=self.T0 + 1), first_wait - 1)
+        self.assertEqual(throttle.stats()["rejected"]["email"], 52)
+
+    def test_rejected_attempt_is_not_counted_in_other_scopes(self):
+        throttle = self.throttle(email="5/min", ip="7/min")
+        self.attempts(throttle, 5, self.T0, email="ana@example.com", ip="10.0.0.1")
+        self.attempts(throttle, 10, self.T0, email="ana@example.com", ip="10.0.0.1")
+        # La IP solo lleva 5 intentos admitidos: otros 2 emails desde ella entran
+        self.assertEqual(self.attempts(throttle, 2, self.T0, email="luis@example.com", ip="10.0.0.1"), [None, None])
+        self.assertIsNotNone(throttle.check(email="eva@example.com", ip="10.0.0.1", now=self.T0))
+
+    def test_stats_count_only_admitted_attempts_as_allowed(self):
+        throttle = self.throttle(email="5/min", ip="30/min")
+        self.attempts(throttle, 8, self.T0, email="ana@example.com", ip="10.0.0.1")
+        stats = throttle.stats()
+        # Los 3 intentos rechazados por el email tampoco cuentan como permitidos para la IP
+        self.assertEqual(stats["allowed"], {"email": 5, "ip": 5})
+        self.assertEqual(stats["rejected"], {"email": 3, "ip": 0})
+
+    def test_email_is_normalized(self):
+        throttle = self.throttle()
+        for email in ("ana@example.com", "ANA@example.com", " Ana@Example.com ", "ana@EXAMPLE.com", "ana@example.COM"):
+            throttle.check(email=email, now=self.T0)
+        self.assertIsNotNone(throttle.check(email="ana@example.com", now=self.T0))
+
+    def test_local_store_is_bounded(self):
+        store = LocalCounterStore(10)
+        throttle = self.throttle(store=store)
+        for i in range(50):
+            throttle.check(email=f"u{i}@example.com", now=self.T0)
+        self.assertLessEqual(len(store), 10)
+
+    @override_settings(CACHES={"default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "login-throttle-tests",
+    }})
+    def test_cache_store_is_shared_between_workers(self):
+        # Dos throttles con la misma caché, como dos workers
+        first, second = self.throttle(store=CacheCounterStore("default")), self.throttle(store=CacheCounterStore("default"))
+        self.attempts(first, 3, self.T0 + 50)
+        self.attempts(second, 2, self.T0 + 50)
+        self.assertIsNotNone(first.check(email="ana@example.com", now=self.T0 + 50))
+
+        # Los rechazados se descuentan también en la caché y la ventana anterior se pondera
+        results = self.attempts(second, 3, self.T0 + 60 + 30)
+        self.assertEqual(results[:2], [None, None])
+        self.assertIsNotNone(results[2])
+
+
+class LoginThrottleResponseTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(login_throttle, "store", LocalCounterStore(100))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(login_throttle, "enabled", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_token_endpoint_returns_429_with_retry_after(self):
+        credentials = {"email": "nadie@example.com", "password": "incorrecta"}
+        for _ in range(5):
+            response = self.client.post("/api/v1/auth/token/", credentials, content_type="application/json",
+                                        HTTP_X_APP_NAME="mi_app_web")
+            self.assertEqual(response.status_code, 400)
+
+        response = self.client.post("/api/v1/auth/token/", credentials, content_type="application/json",
+                                    HTTP_X_APP_NAME="mi_app_web")
+
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response["Retry-After"]), 1)
+        self.assertLessEqual(int(response["Retry-After"]), 120)
+
+    def test_basic_auth_is_throttled_before_checking_the_password(self):
+        credentials = base64.b64encode(b"nadie@example.com:incorrecta").decode()
+        request = RequestFactory().get("/", HTTP_AUTHORIZATION=f"Basic {credentials}")
+
+        with mock.patch("rest_framework.authentication.authenticate", return_value=None) as authenticate:
+            for _ in range(5):
+                with self.assertRaises(exceptions.AuthenticationFailed):
+                    ThrottledBasicAuthentication().authenticate(request)
+
+            with self.assertRaises(exceptions.Throttled) as context:
+                ThrottledBasicAuthentication().authenticate(request)
+
+        # El intento rechazado no llega a calcular el hash de la contraseña
+        self.assertEqual(authenticate.call_count, 5)
+        self.assertGreaterEqual(context.exception.wait, 1)
+
+
+class ImportUsersTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        return path
+
+    def import_users(self, path, **options):
+        output = io.StringIO()
+        call_command("import_users", path, stdout=output, **options)
+        return output.getvalue()
+
+    def test_csv_import_skips_existing_emails_ignoring_case(self):
+        APIUser.objects.create_user(email="existente@example.com", password=PASSWORD)
+        path = self.write("usuarios.csv", (
+            "email,first_name,origin_app\n"
+            "Nueva@Example.com,Nueva,pedidos\n"
+            "EXISTENTE@example.com,Existente,pedidos\n"
+            "otra@example.com,Otra,\n"
+        ))
+
+        output = self.import_users(path, origin_app="mi_app_web")
+
+        self.assertIn("2 creado(s), 1 omitido(s)", output)
+        nueva = APIUser.objects.get(email="nueva@example.com")
+        self.assertEqual((nueva.first_name, nueva.origin_app), ("Nueva", "pedidos"))
+        self.assertFalse(nueva.has_usable_password())
+        self.assertEqual(APIUser.objects.get(email="otra@example.com").origin_app, "mi_app_web")
+        self.assertEqual(APIUser.objects.count(), 3)
+
+    def test_created_users_get_their_outbox_message(self):
+        path = self.write("usuarios.jsonl", '{"email": "uno@example.com"}\n{"email": "dos@example.com"}\n')
+
+        self.import_users(path)
+
+        user_ids = set(APIUser.objects.values_list("id", flat=True))
+        messages = OutboxMessage.objects.filter(event=OutboxMessage.DOMAIN_USER_CREATED)
+        self.assertEqual({message.payload["user_id"] for message in messages}, user_ids)
+        self.assertEqual(len(user_ids), 2)
+
+    def test_duplicate_and_invalid_records_are_counted(self):
+        path = self.write("usuarios.jsonl", "\n".join(json.dumps(record) for record in [
+            {"email": "ana@example.com"},
+            {"email": "ANA@example.com"},
+            {"email": "no-es-un-email"},
+            {"email": "hash@example.com", "password_hash": "md5$no-es-un-hasher"},
+        ]))
+
+        result = UserImporter(path, batch_size=10).run()
+
+        self.assertEqual(
+            {key: result[key] for key in ("records", "created", "skipped", "invalid")},
+            {"records": 4, "created": 1, "skipped": 1, "invalid": 2},
+        )
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+
+    def test_pre_hashed_passwords_are_stored_as_is(self):
+        encoded = make_password(PASSWORD)
+        path = self.write("usuarios.csv", f"email,password_hash\nhash@example.com,{encoded}\n")
+
+        result = UserImporter(path).run()
+
+        self.assertEqual(result["hashed"], 0)
+        user = APIUser.objects.get(email="hash@example.com")
+        self.assertEqual(user.password, encoded)
+        self.assertTrue(user.check_password(PASSWORD))
+
+    def test_interrupted_import_resumes_from_the_checkpoint(self):
+        path = self.write("usuarios.csv", "email\n" + "".join(f"u{i}@example.com\n" for i in range(5)))
+
+        def interrupt(stats, rate):
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            UserImporter(path, batch_size=2, progress=interrupt).run()
+        self.assertEqual(APIUser.objects.count(), 2)
+
+        result = UserImporter(path, batch_size=2).run()
+
+        self.assertEqual(result["resumed_from"], 2)
+        self.assertEqual((result["records"], result["created"]), (5, 5))
+        self.assertEqual(APIUser.objects.count(), 5)
+        self.assertEqual(OutboxMessage.objects.count(), 5)
+
+    def test_email_taken_during_the_import_is_skipped(self):
+        path = self.write("usuarios.csv", "email\ncarrera@example.com\nlibre@example.com\n")
+        importer = UserImporter(path)
+        # Un registro por /signup/ que llega entre la comprobación de existentes y el INSERT
+        original_insert = importer._insert
+
+        def insert_after_signup(users):
+            APIUser.objects.create_user(email="carrera@example.com", password=PASSWORD)
+            return original_insert(users)
+
+        with mock.patch.object(importer, "_insert", insert_after_signup):
+            result = importer.run()
+
+        self.assertEqual((result["created"], result["skipped"]), (1, 1))
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+
+
+@override_settings(OUTBOX={
+    "BATCH_SIZE": 10, "CONCURRENCY": 1, "POLL_SECONDS": 0, "LEASE_SECONDS": 60,
+    "MAX_ATTEMPTS": 2, "BACKOFF_BASE_SECONDS": 2, "BACKOFF_MAX_SECONDS": 60,
+})
+@mock.patch("apps.services.domain_user.notify_domain_user")
+class OutboxDispatchTests(TestCase):
+    def enqueue(self, user_id=1):
+        return OutboxMessage.enqueue(OutboxMessage.DOMAIN_USER_CREATED, {"user_id": user_id})
+
+    def test_delivered_messages_are_deleted(self, notify_domain_user):
+        message = self.enqueue()
+
+        result = dispatch_batch()
+
+        self.assertEqual(result["delivered"], 1)
+        notify_domain_user.assert_called_once_with(1, idempotency_key=f"outbox-{message.pk}")
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_failures_are_retried_with_backoff_and_then_abandoned(self, notify_domain_user):
+        notify_domain_user.side_effect = Exception("503")
+        message = self.enqueue()
+
+        self.assertEqual(dispatch_batch()["failed"], 1)
+        message.refresh_from_db()
+        self.assertEqual(message.attempts, 1)
+        self.assertEqual(message.last_error, "503")
+        # No se reintenta hasta que vence el backoff
+        self.assertEqual(dispatch_batch()["claimed"], 0)
+
+        OutboxMessage.objects.update(available_at=message.created_at)
+        self.assertEqual(dispatch_batch()["abandoned"], 1)
+        message.refresh_from_db()
+        self.assertIsNone(message.available_at)
+        self.assertEqual(dispatch_batch()["claimed"], 0)
+
+
+class _FakeChannel:
+    def __init__(self):
+        self.events = {"basic_ack": set(), "basic_nack": set()}
+        self.published = []
+
+    def queue_declare(self, **kwargs):
+        pass
+
+    def confirm_select(self):
+        pass
+
+    def basic_publish(self, message, exchange, routing_key):
+        self.published.append(json.loads(message.body))
+
+
+class _FakeConnection:
+    """Conexión de ``amqp`` en memoria: ``drain_events`` entrega las confirmaciones pendientes"""
+
+    def __init__(self, broker, drop_after):
+        self.broker = broker
+        self.drop_after = drop_after
+        self.fake_channel = _FakeChannel()
+        self.confirmed = 0
+        self.closed = False
+
+    def connect(self):
+        pass
+
+    def channel(self):
+        return self.fake_channel
+
+    def close(self):
+        self.closed = True
+
+    collect = close
+
+    def drain_events(self, timeout=None):
+        broker = self.broker
+        if broker.gate is not None:
+            gate, broker.gate = broker.gate, None
+            broker.waiting.set()
+            gate.wait(5)
+        if not broker.confirm:
+            time.sleep(timeout)
+            raise TimeoutError("timed out")
+
+        channel = self.fake_channel
+        for tag in range(self.confirmed + 1, len(channel.published) + 1):
+            if self.drop_after is not None and self.confirmed >= self.drop_after:
+                raise ConnectionResetError("conexión cerrada por el broker")
+            event = "basic_nack" if channel.published[tag - 1]["user_id"] in broker.nack else "basic_ack"
+            for callback in channel.events[event]:
+                callback(tag, False)
+            self.confirmed = tag
+
+
+class _FakeBroker:
+    """
+    Broker con confirmaciones del publicador guionizadas: ``nack`` son los user_id
+    rechazados, ``drops`` las confirmaciones que da cada conexión antes de cortarse y
+    ``gate`` bloquea la primera espera de confirmaciones hasta que se activa.
+    """
+
+    def __init__(self, nack=(), drops=(), confirm=True, gate=None):
+        self.nack = set(nack)
+        self.drops = list(drops)
+        self.confirm = confirm
+        self.gate = gate
+        self.waiting = threading.Event()
+        self.connections = []
+
+    def connect(self, **kwargs):
+        connection = _FakeConnection(self, self.drops.pop(0) if self.drops else None)
+        self.connections.append(connection)
+        return connection
+
+    def published(self):
+        return [connection.fake_channel.published for connection in self.connections]
+
+
+class UserQueuePublisherTests(SimpleTestCase):
+    MESSAGES = [{"user_id": i} for i in range(5)]
+
+    def publisher(self, broker, **config):
+        patcher = mock.patch("apps.services.user_queue.amqp.Connection", side_effect=broker.connect)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return UserQueuePublisher({
+            **settings.USER_QUEUE, "RECONNECT_BACKOFF_SECONDS": 0, "STATS_LOG_SECONDS": 0, **config,
+        })
+
+    def test_batch_is_published_and_confirmed(self):
+        broker = _FakeBroker()
+        publisher = self.publisher(broker)
+
+        publisher.publish_many(self.MESSAGES)
+        publisher.publish({"user_id": 5})
+
+        # Una sola conexión para los dos lotes
+        self.assertEqual(broker.published(), [self.MESSAGES + [{"user_id": 5}]])
+        stats = publisher.stats()
+        self.assertEqual((stats["confirmed"], stats["failed"], stats["batches"]), (6, 0, 2))
+        self.assertEqual(stats["connections"], 1)
+        self.assertTrue(stats["connected"])
+
+    def test_nack_raises_without_republishing(self):
+        broker = _FakeBroker(nack={2})
+        publisher = self.publisher(broker)
+
+        with self.assertRaisesMessage(UserQueuePublishError, "1 mensaje(s) sin confirmar por el broker: nack"):
+            publisher.publish_many(self.MESSAGES)
+
+        self.assertEqual(broker.published(), [self.MESSAGES])
+        stats = publisher.stats()
+        self.assertEqual((stats["confirmed"], stats["nacked"], stats["failed"]), (4, 1, 1))
+
+    def test_dropped_connection_republishes_only_unconfirmed_messages(self):
+        broker = _FakeBroker(drops=[2])
+        publisher = self.publisher(broker)
+
+        publisher.publish_many(self.MESSAGES)
+
+        self.assertEqual(broker.published(), [self.MESSAGES, self.MESSAGES[2:]])
+        self.assertTrue(broker.connections[0].closed)
+        stats = publisher.stats()
+        self.assertEqual((stats["confirmed"], stats["republished"]), (5, 3))
+        self.assertEqual((stats["connections"], stats["connection_errors"]), (2, 1))
+
+    def test_concurrent_callers_share_one_batch(self):
+        gate = threading.Event()
+        broker = _FakeBroker(gate=gate)
+        publisher = self.publisher(broker)
+        errors = []
+
+        def publish(user_id):
+            try:
+                publisher.publish({"user_id": user_id})
+            except Exception as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=publish, args=(0,))
+        leader.start()
+        self.assertTrue(broker.waiting.wait(5))
+        # Mientras el primer lote espera sus confirmaciones llegan otros tres mensajes
+        followers = [threading.Thread(target=publish, args=(i,)) for i in range(1, 4)]
+        for thread in followers:
+            thread.start()
+        deadline = time.monotonic() + 5
+        while len(publisher._queue) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        gate.set()
+        for thread in [leader, *followers]:
+            thread.join(5)
+
+        self.assertEqual(errors, [])
+        published, = broker.published()
+        self.assertEqual(published[0], {"user_id": 0})
+        self.assertCountEqual(published[1:], [{"user_id": i} for i in range(1, 4)])
+        stats = publisher.stats()
+        self.assertEqual((stats["batches"], stats["max_batch"], stats["confirmed"]), (2, 3, 4))
+
+    def test_confirm_timeout_fails_the_batch_after_the_retries(self):
+        broker = _FakeBroker(confirm=False)
+        publisher = self.publisher(broker, CONFIRM_TIMEOUT_SECONDS=0.05, RECONNECT_ATTEMPTS=1)
+
+        with self.assertRaisesMessage(UserQueuePublishError, "1 mensaje(s) sin confirmar por el broker: TimeoutError"):
+            publisher.publish({"user_id": 0})
+
+        self.assertEqual(broker.published(), [[{"user_id": 0}], [{"user_id": 0}]])
+        stats = publisher.stats()
+        self.assertEqual((stats["failed"], stats["republished"], stats["connection_errors"]), (1, 1, 2))
+        self.assertFalse(stats["connected"])
+
+
+def _create_tenants():
+    """Una aplicación grande y otra pequeña, como en los listados por aplicación del admin"""
+    users = [
+        APIUser(email=f"web{i}@example.com", username=f"web{i}", origin_app="mi_app_web", is_active=i % 10 != 0)
+        for i in range(5000)
+    ]
+    users += [
+        APIUser(email=f"pedido{i}@example.com", username=f"pedido{i}", origin_app="pedidos", is_active=i % 2 == 0)
+        for i in range(500)
+    ]
+    APIUser.objects.bulk_create(users)
+
+
+class UserFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        _create_tenants()
+        cls.admin = APIUser.objects.create_user("admin@example.com", PASSWORD, is_staff=True)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def list_users(self, query):
+        return self.client.get(f"/api/v1/auth/users/?{query}", HTTP_X_APP_NAME="mi_app_web")
+
+    def test_filters_are_applied_in_the_query_without_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.list_users("origin_app=pedidos&is_active=false&fields=id,email,is_active&page_size=10")
+
+        self.assertEqual(response.status_code, 200, response.content)
+        results = response.json()["results"]
+        self.assertEqual(len(results), 10)
+        self.assertTrue(all(user["email"].startswith("pedido") and not user["is_active"] for user in results))
+        self.assertIsNotNone(response.json()["next"])
+        self.assertFalse(any("COUNT(" in q["sql"].upper() for q in queries.captured_queries))
+
+    def test_email_prefix(self):
+        response = self.list_users("email_prefix=pedido49")
+
+        emails = [user["email"] for user in response.json()["results"]]
+        self.assertEqual(sorted(emails), sorted(["pedido49@example.com"] + [f"pedido49{i}@example.com" for i in range(10)]))
+
+    def test_unknown_origin_app_is_rejected(self):
+        self.assertEqual(self.list_users("origin_app=otra").status_code, 400)
+
+
+class UserListPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = APIUser.objects.create_user("admin@example.com", PASSWORD, is_staff=True)
+        APIUser.objects.bulk_create(
+            APIUser(email=f"pagina{i}@example.com", username=f"pagina{i}") for i in range(24)
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def get(self, url):
+        return self.client.get(url, HTTP_X_APP_NAME="mi_app_web")
+
+    def test_cursor_traversal_is_stable_while_rows_are_inserted(self):
+        expected = list(APIUser.objects.order_by("id").values_list("id", flat=True))
+        seen, pages = [], []
+        url = "/api/v1/auth/users/?fields=id&page_size=10"
+        while url:
+            response = self.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            pages.append(response.json())
+            seen += [user["id"] for user in pages[-1]["results"]]
+            # Altas durante el recorrido: aparecen al final, sin repetir ni saltar filas
+            APIUser.objects.create_user(f"alta{len(pages)}@example.com", PASSWORD)
+            url = pages[-1]["next"]
+
+        self.assertEqual(seen[:len(expected)], expected)
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(seen, list(APIUser.objects.filter(id__lte=seen[-1]).order_by("id").values_list("id", flat=True)))
+
+        # previous devuelve exactamente la página anterior
+        previous = self.get(pages[2]["previous"]).json()
+        self.assertEqual(previous["results"], pages[1]["results"])
+        self.assertEqual(self.get(previous["previous"]).json()["results"], pages[0]["results"])
+
+    def test_list_runs_a_single_query_without_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get("/api/v1/auth/users/?page_size=10")
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertNotIn("count", response.json())
+        self.assertEqual(len(queries.captured_queries), 1, queries.captured_queries)
+        self.assertNotIn("COUNT(", queries.captured_queries[0]["sql"].upper())
+
+    def test_unknown_fields_are_rejected(self):
+        for fields in ("id,password", "nada", ","):
+            with self.subTest(fields=fields):
+                response = self.get(f"/api/v1/auth/users/?fields={fields}")
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("fields", response.json())
+
+    def test_fields_prune_the_selected_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get("/api/v1/auth/users/?fields=id,email&page_size=5")
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertTrue(all(set(user) == {"id", "email"} for user in response.json()["results"]))
+        sql = queries.captured_queries[0]["sql"]
+        columns = sql[:sql.upper().index(" FROM ")]
+        self.assertIn("email", columns)
+        for column in ("password", "username", "origin_app", "is_staff"):
+            self.assertNotIn(column, columns)
+
+
+@skipUnless(connection.vendor == "postgresql", "Los planes de consulta se comprueban en PostgreSQL")
+class UserFilterQueryPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        _create_tenants()
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE authentication_apiuser")
+
+    def plan(self, params):
+        """Plan de una página del listado filtrado, tal como la pide la paginación por cursor"""
+        queryset = UserFilter(params, queryset=APIUser.objects.only("id", "email")).qs
+        return queryset.filter(id__gt=0).order_by("id")[:101].explain()
+
+    def test_tenant_list_uses_origin_app_index(self):
+        plan = self.plan({"origin_app": "pedidos"})
+        self.assertIn("Index Scan using apiuser_origin_", plan)
+        # El índice ya devuelve las filas en orden de id
+        self.assertNotIn("Sort", plan)
+
+    def test_tenant_and_status_use_composite_index(self):
+        plan = self.plan({"origin_app": "pedidos", "is_active": "false"})
+        self.assertIn("apiuser_origin_active_id_idx", plan)
+        # Filtros y posición del cursor se resuelven dentro del índice
+        self.assertRegex(plan, r"Index Cond: .*origin_app.*is_active = false.*id > 0")
+        self.assertNotIn("Seq Scan", plan)
+
+    def test_email_prefix_uses_an_index(self):
+        plan = self.plan({"email_prefix": "pedido49"})
+        self.assertRegex(plan, r"Index Cond: .*email")
+        self.assertNotIn("Seq Scan", plan)
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT datcollate FROM pg_database WHERE datname = current_database()")
+            collation = cursor.fetchone()[0]
+        # Con la collation C también sirve el índice UNIQUE; con cualquier otra solo el de patrones
+        if collation not in ("C", "POSIX"):
+            self.assertIn("apiuser_email_prefix_idx", plan)
+            self.assertIn("~>=~", plan)
+
+    def test_login_lookup_is_a_single_index_probe(self):
+        plan = APIUser.objects.by_email("Pedido49@Example.com").explain()
+        self.assertIn("Index Scan using apiuser_email_lower_uniq", plan)
+        self.assertRegex(plan, r"Index Cond: \(lower\(\(email\)::text\) = 'pedido49@example.com'")
+        self.assertNotIn("Seq Scan", plan)
+
+
+class _BlockingHandler(logging.Handler):
+    """Guarda los mensajes; el primero se queda esperando a ``unblock`` (un disco bloqueado)"""
+
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+        self.blocked = threading.Event()
+        self.unblock = threading.Event()
+
+    def emit(self, record):
+        if not self.blocked.is_set():
+            self.blocked.set()
+            self.unblock.wait(5)
+        self.messages.append(record.getMessage())
+
+
+class LogPipelineTests(SimpleTestCase):
+    def setUp(self):
+        self.sink_handler = _BlockingHandler()
+        sink = logging.getLogger("tests.log_pipeline.output")
+        sink.handlers, sink.propagate = [self.sink_handler], False
+        self.addCleanup(setattr, sink, "handlers", [])
+        self.record_logger = logging.getLogger("tests.log_pipeline")
+        self.record_logger.propagate = False
+
+    def pipeline(self, drop_policy):
+        handler = QueueLogHandler("tests.log_pipeline.output", maxsize=2, drop_policy=drop_policy)
+        self.record_logger.handlers = [handler]
+        self.addCleanup(setattr, self.record_logger, "handlers", [])
+        self.record_logger.warning("first")
+        self.assertTrue(self.sink_handler.blocked.wait(5))
+        return handler
+
+    def test_full_queue_drops_newest_but_keeps_errors(self):
+        handler = self.pipeline("newest")
+        for message in ("a", "b", "c", "d"):
+            self.record_logger.warning(message)
+        self.record_logger.error("error")
+
+        self.sink_handler.unblock.set()
+        handler.close()
+        messages = self.sink_handler.messages
+        self.assertEqual([m for m in messages if not m.startswith("{")], ["first", "b", "error"])
+        self.assertEqual(handler.stats()["dropped"], 3)
+        self.assertIn('"dropped_total": 3', messages[1])
+
+    def test_full_queue_can_drop_oldest(self):
+        handler = self.pipeline("oldest")
+        for message in ("a", "b", "c", "d"):
+            self.record_logger.warning(message)
+
+        self.sink_handler.unblock.set()
+        handler.close()
+        self.assertEqual([m for m in self.sink_handler.messages if not m.startswith("{")], ["first", "c", "d"])
+        self.assertEqual(handler.stats()["dropped"], 2)
+
+    def test_message_is_serialized_when_formatted(self):
+        message = JSONLogMessage({"message": "hola", "id": object()})
+        self.assertIsNone(message._text)
+        self.assertIn('"message": "hola"', str(message))
+
+    def test_rotated_files_are_compressed(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "api.log")
+            handler = CompressedRotatingFileHandler(filename, maxBytes=100, backupCount=2)
+            for i in range(10):
+                handler.emit(logging.makeLogRecord({"msg": f"registro {i} " + "x" * 40}))
+            handler.close()
+
+            self.assertEqual(sorted(os.listdir(directory)), ["api.log", "api.log.1.gz", "api.log.2.gz"])
+            with gzip.open(filename + ".1.gz", "rt") as rotated:
+                self.assertIn("registro 8", rotated.read())
+
+
+class _LoggedView:
+    error = None
+
+    @log_api_call(level="info")
+    def post(self, request):
+        if self.error:
+            raise self.error
+        return Response({"ok": True}, status=201)
+
+
+class RequestLoggingTests(SimpleTestCase):
+    def request(self):
+        request = Request(
+            APIRequestFactory().post(
+                "/api/v1/auth/signup/",
+                {"email": "ana@example.com", "password1": PASSWORD, "password2": PASSWORD},
+                format="json",
+                HTTP_X_APP_NAME="mi_app_web",
+                HTTP_COOKIE="access_token=secreto",
+                HTTP_AUTHORIZATION="Bearer secreto",
+            ),
+            parsers=[JSONParser()],
+        )
+        request.user = AnonymousUser()
+        return request
+
+    def test_only_allowlisted_headers_and_no_passwords(self):
+        with self.assertLogs("api", "INFO") as logs:
+            _LoggedView().post(self.request())
+
+        started, finished = [json.loads(record.getMessage()) for record in logs.records]
+        self.assertEqual(started["headers"], {
+            "Content-Type": "application/json", "Content-Length": started["headers"]["Content-Length"],
+            "X-App-Name": "mi_app_web",
+        })
+        self.assertEqual(started["body"], "[FILTERED]")
+        self.assertNotIn("secreto", json.dumps(started))
+        self.assertEqual(finished["status_code"], 201)
+        self.assertNotIn("response_data", finished)
+
+    @override_settings(API_LOG_SAMPLING={"default": 0.0})
+    def test_success_is_sampled_but_errors_are_always_logged(self):
+        with self.assertNoLogs("api", "INFO"):
+            _LoggedView().post(self.request())
+
+        view = _LoggedView()
+        view.error = ValueError("fallo")
+        with self.assertLogs("api", "INFO") as logs, self.assertRaises(ValueError):
+            view.post(self.request())
+        self.assertEqual([record.levelname for record in logs.records], ["ERROR"])
+        self.assertEqual(json.loads(logs.records[0].getMessage())["error"], "fallo")
+
+    @override_settings(API_LOG_RESPONSE_DATA=True)
+    def test_body_and_response_are_copied_when_logged(self):
+        request = Request(APIRequestFactory().post("/api/v1/auth/users/", {"email": "ana@example.com"}, format="json"),
+                          parsers=[JSONParser()])
+        request.user = AnonymousUser()
+        # Los registros se capturan sin formatear, como quedan en la cola del listener
+        with mock.patch.object(logging.getLogger("api"), "handle") as handle:
+            response = _LoggedView().post(request)
+
+        # La vista (o un middleware) sigue modificando los datos antes de que el listener los serialice
+        request.data["email"] = "otro@example.com"
+        response.data["ok"] = False
+        started, finished = [json.loads(call.args[0].getMessage()) for call in handle.call_args_list]
+        self.assertEqual(started["body"], {"email": "ana@example.com"})
+        self.assertEqual(finished["response_data"], {"ok": True})
+
+    def test_disabled_level_does_not_read_the_request(self):
+        api_logger = logging.getLogger("api")
+        self.addCleanup(api_logger.setLevel, api_logger.level)
+        api_logger.setLevel(logging.ERROR)
+
+        # Cualquier acceso a la request fallaría
+        request = mock.NonCallableMock(spec=[])
+        APILogger.log_request("info", "Sin registrar", request)
+        self.assertEqual(_LoggedView().post(request).status_code, 201)
@@ -0,0 +1,222 @@
+"""
+Limitación de intentos de login previa al hash de la contraseña.
+
+Cada intento de login (``/token/`` o ``BasicAuthentication``) cuesta un PBKDF2
+completo, por lo que los intentos por encima del límite se rechazan antes de
+consultar al usuario. Se cuentan por separado por email, por IP y por
+aplicación (``X-App-Name``) con contadores de ventana deslizante: la estimación
+es ``actual + anterior * fracción_de_la_ventana_anterior_que_aún_solapa``, con
+memoria constante por clave. Los intentos rechazados no cuentan: reintentar
+durante el bloqueo no lo alarga, y quien respeta ``Retry-After`` entra al primer
+intento.
+
+Los contadores viven en memoria de cada worker (``STORE = "local"``) o en la
+caché de Django configurada (``STORE = "cache"``, p. ej. Redis) para que los
+límites se respeten entre workers y servidores.
+"""
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+from apps.authentication.cache import TTLCache
+
+_PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    """Convierte ``"5/min"`` en ``(5, 60)`` (mismo formato que los throttles de DRF)"""
+    num, period = rate.split("/")
+    return int(num), _PERIODS[period[0]]
+
+
+class LocalCounterStore:
+    """Contadores por worker en una caché LRU acotada"""
+
+    shared = False
+
+    def __init__(self, max_keys):
+        self._counters = TTLCache(maxsize=max_keys)
+        self._lock = threading.Lock()
+
+    def hit(self, key, window, now):
+        """Registra un intento y devuelve ``(actual, anterior, inicio_de_ventana)``"""
+        index = int(now // window)
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None or counter[0] < index - 1:
+                counter = [index, 0, 0]
+            elif counter[0] == index - 1:
+                counter = [index, 0, counter[1]]
+            counter[1] += 1
+            self._counters.set(key, counter, ttl=2 * window)
+        return counter[1], counter[2], index * window
+
+    def undo(self, key, window, now):
+        """Descuenta el intento registrado por ``hit`` (intento rechazado)"""
+        index = int(now // window)
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is not None and counter[0] == index and counter[1] > 0:
+                counter[1] -= 1
+
+    def __len__(self):
+        return len(self._counters)
+
+
+class CacheCounterStore:
+    """Contadores compartidos en la caché de Django: una clave por ventana fija"""
+
+    shared = True
+
+    def __init__(self, alias):
+        self._alias = alias
+
+    def hit(self, key, window, now):
+        cache = caches[self._alias]
+        index = int(now // window)
+        current_key = f"login_throttle:{key}:{index}"
+
+        cache.add(current_key, 0, timeout=2 * window)
+        try:
+            current = cache.incr(current_key)
+        except ValueError:
+            # La clave expiró entre add() e incr()
+            cache.add(current_key, 1, timeout=2 * window)
+            current = 1
+        previous = cache.get(f"login_throttle:{key}:{index - 1}", 0)
+        return current, previous, index * window
+
+    def undo(self, key, window, now):
+        try:
+            caches[self._alias].decr(f"login_throttle:{key}:{int(now // window)}")
+        except ValueError:
+            pass
+
+
+def retry_after(limit, window, current, previous, window_start, now):
+    """
+    Segundos hasta que un nuevo intento quepa en el límite, con ``current`` y
+    ``previous`` los intentos admitidos en la ventana actual y en la anterior.
+    """
+    # En la ventana actual: current + 1 + previous * (1 - elapsed) <= limit
+    if current + 1 <= limit:
+        if previous == 0:
+            return 0
+        elapsed = max(0.0, 1 - (limit - current - 1) / previous)
+        return max(0.0, window_start + elapsed * window - now)
+    # En la siguiente: la actual pasa a ser la anterior, 1 + current * (1 - elapsed) <= limit
+    elapsed = max(0.0, 1 - (limit - 1) / current)
+    return window_start + window + elapsed * window - now
+
+
+class LoginThrottle:
+    """
+    Límites de intentos de login por ámbito. ``check`` devuelve ``None`` si el
+    intento está permitido o los segundos que hay que esperar si no. Un intento
+    rechazado en cualquier ámbito no se cuenta en ninguno.
+    """
+
+    def __init__(self, rates, store, enabled=True):
+        self.rates = {scope: parse_rate(rate) for scope, rate in rates.items() if rate}
+        self.store = store
+        self.enabled = enabled
+        self._allowed = dict.fromkeys(self.rates, 0)
+        self._rejected = dict.fromkeys(self.rates, 0)
+        self._lock = threading.Lock()
+
+    def check(self, email=None, ip=None, app=None, now=None):
+        if not self.enabled:
+            return None
+
+        now = time.time() if now is None else now
+        values = {"email": (email or "").strip().lower(), "ip": ip, "app": app}
+        wait = None
+        hits, rejected = [], []
+
+        for scope, (limit, window) in self.rates.items():
+            value = values.get(scope)
+            if not value:
+                continue
+
+            key = f"{scope}:{value}"
+            current, previous, window_start = self.store.hit(key, window, now)
+            hits.append((key, window))
+            elapsed = (now - window_start) / window
+            estimate = current + previous * (1 - elapsed)
+
+            if estimate > limit:
+                rejected.append(scope)
+                wait = max(wait or 0, retry_after(limit, window, current - 1, previous, window_start, now))
+
+        if rejected:
+            for key, window in hits:
+                self.store.undo(key, window, now)
+
+        # Un intento solo cuenta como permitido si lo admiten todos los ámbitos
+        with self._lock:
+            if rejected:
+                for scope in rejected:
+                    self._rejected[scope] += 1
+            else:
+                for key, _window in hits:
+                    self._allowed[key.split(":", 1)[0]] += 1
+
+        return wait
+
+    async def acheck(self, email=None, ip=None, app=None):
+        """Variante para vistas asíncronas: con caché compartida la consulta sale del bucle de eventos"""
+        if self.store.shared:
+            return await sync_to_async(self.check, thread_sensitive=False)(email=email, ip=ip, app=app)
+        return self.check(email=email, ip=ip, app=app)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "store": "cache" if self.store.shared else "local",
+                "rates": {scope: f"{limit}/{window}s" for scope, (limit, window) in self.rates.items()},
+                "allowed": dict(self._allowed),
+                "rejected": dict(self._rejected),
+                # Las claves de la caché compartida no se pueden contar desde un worker
+                "tracked_keys": None if self.store.shared else len(self.store),
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self._allowed = dict.fromkeys(self.rates, 0)
+            self._rejected = dict.fromkeys(self.rates, 0)
+
+
+def client_ip(request):
+    """IP del cliente con la misma lógica que los throttles de DRF (respeta NUM_PROXIES)"""
+    return BaseThrottle().get_ident(request)
+
+
+class LoginRateThrottle(BaseThrottle):
+    """Throttle de DRF para las vistas de login: se evalúa antes de validar las credenciales"""
+
+    def allow_request(self, request, view):
+        data = request.data if hasattr(request.data, "get") else {}
+        self._wait = login_throttle.check(
+            email=data.get("email"),
+            ip=self.get_ident(request),
+            app=request.headers.get("X-App-Name"),
+        )
+        return self._wait is None
+
+    def wait(self):
+        return self._wait
+
+
+_throttle_settings = settings.LOGIN_THROTTLE
+
+if _throttle_settings["STORE"] == "cache":
+    _store = CacheCounterStore(_throttle_settings["CACHE_ALIAS"])
+else:
+    _store = LocalCounterStore(_throttle_settings["MAX_KEYS"])
+
+login_throttle = LoginThrottle(_throttle_settings["RATES"], _store, enabled=_throttle_settings["ENABLED"])
@@ -0,0 +1,110 @@
+"""
+Tokens JWT propios con un claim ``jti`` corto y su clave binaria de revocación.
+Se firman y verifican con el ``token_backend`` de ``signing.py`` (claves con ``kid``).
+"""
+import base64
+import hashlib
+import secrets
+
+from django.conf import settings
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken, Token
+
+from apps.authentication.models import APIUser
+from apps.authentication.signing import token_backend
+
+# Longitud fija (en bytes) de la clave con la que se guardan las revocaciones
+JTI_KEY_BYTES = 16
+
+# Campos del usuario que se embeben en el token cuando JWT_USER_CLAIMS está activo
+USER_CLAIMS = APIUser.CLAIM_FIELDS
+CLAIMS_VERSION_CLAIM = "claims_v"
+
+
+def new_jti():
+    """
+    Genera un ``jti`` aleatorio de 16 bytes codificado en base64url sin relleno
+    (22 caracteres, frente a los 32 del uuid4 hexadecimal de Simple JWT).
+    """
+    return base64.urlsafe_b64encode(secrets.token_bytes(JTI_KEY_BYTES)).rstrip(b"=").decode()
+
+
+def jti_key(jti):
+    """
+    Convierte un claim ``jti`` en la clave binaria de ``JTI_KEY_BYTES`` bytes.
+
+    Acepta los ``jti`` propios (base64url), los de Simple JWT (uuid4 hexadecimal)
+    y, para cualquier otro formato, usa los primeros bytes de su SHA-256.
+    """
+    key = None
+    try:
+        if len(jti) == 22:
+            key = base64.urlsafe_b64decode(jti + "==")
+        elif len(jti) == 32:
+            key = bytes.fromhex(jti)
+    except ValueError:
+        pass
+
+    if key is not None and len(key) == JTI_KEY_BYTES:
+        return key
+    return hashlib.sha256(jti.encode()).digest()[:JTI_KEY_BYTES]
+
+
+def token_key(payload, token=None):
+    """
+    Clave de revocación de un token a partir de su payload. Los tokens sin ``jti``
+    se identifican por el hash del token completo.
+    """
+    jti = payload.get(api_settings.JTI_CLAIM)
+    if jti:
+        return jti_key(jti)
+    return hashlib.sha256(token.encode()).digest()[:JTI_KEY_BYTES]
+
+
+def add_user_claims(token, user):
+    """
+    Embebe en el token los datos del usuario y su ``claims_version`` si JWT_USER_CLAIMS
+    está activo. ``user`` puede ser un ``APIUser`` o su copia cacheada (``UserSnapshot``).
+    """
+    if not settings.JWT_USER_CLAIMS["ENABLED"]:
+        return
+
+    for claim in USER_CLAIMS:
+        token[claim] = getattr(user, claim)
+    token[CLAIMS_VERSION_CLAIM] = user.claims_version
+
+
+def get_user_claims(token, user):
+    """
+    Devuelve los datos del usuario embebidos en un token validado, o ``None`` si el
+    token no los contiene o son de otra versión que la actual del usuario (hay que
+    usar ``user``). ``user`` es la copia cacheada que carga la autenticación.
+    """
+    if not isinstance(token, Token) or not settings.JWT_USER_CLAIMS["ENABLED"]:
+        return None
+    if token.get(CLAIMS_VERSION_CLAIM) != getattr(user, "claims_version", None):
+        return None
+
+    return {claim: token.get(claim) for claim in USER_CLAIMS}
+
+
+class APIAccessToken(AccessToken):
+    _token_backend = token_backend
+
+    def set_jti(self):
+        self.payload[api_settings.JTI_CLAIM] = new_jti()
+
+
+class APIRefreshToken(RefreshToken):
+    access_token_class = APIAccessToken
+    _token_backend = token_backend
+
+    def set_jti(self):
+        self.payload[api_settings.JTI_CLAIM] = new_jti()
+
+    @classmethod
+    def for_user(cls, user):
+        # Los claims del usuario se copian también al token de acceso derivado
+        token = super().for_user(user)
+        add_user_claims(token, user)
+        return token
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path, include
 from oauth2_provider import urls as oauth2_urls
 from oauth2_provider import views as oauth2_views
@@ -10,8 +11,32 @@ from apps.authentication.views import (
     UserViewSet,
     MeView,
     LogoutView,
+    LoginThrottleStatsView,
 )
 
+# Con las vistas asíncronas (despliegue ASGI) login y registro calculan el hash en el pool de
+# procesos y las vistas autenticadas por cookie JWT no salen del bucle de eventos
+if settings.AUTH_ASYNC_VIEWS:
+    from apps.authentication.async_views import (
+        AsyncJWTObtainPairView,
+        AsyncJWTRefreshView,
+        AsyncJWTRevokeView,
+        AsyncMeView,
+        AsyncSignUpView,
+    )
+
+    token_obtain_pair_view = AsyncJWTObtainPairView.as_view()
+    token_refresh_view = AsyncJWTRefreshView.as_view()
+    token_revoke_view = AsyncJWTRevokeView.as_view()
+    me_view = AsyncMeView.as_view()
+    signup_urlpatterns = [path("signup/", AsyncSignUpView.as_view(), name="signup-list")]
+else:
+    token_obtain_pair_view = JWTViews.JWTObtainPairToken.as_view()
+    token_refresh_view = JWTViews.JWTRefreshToken.as_view()
+    token_revoke_view = JWTViews.JWTRevokeToken.as_view()
+    me_view = MeView.as_view()
+    signup_urlpatterns = []
+
 router = SimpleRouter()
 
 router.register(r"signup", SignUpViewSet, basename="signup")
@@ -20,9 +45,11 @@ router.register(r"users", UserViewSet, basename="users")
 
 urlpatterns = [
     # Rutas para JWT
-    path("token/", JWTViews.JWTObtainPairToken.as_view(), name="token_obtain_pair"),
-    path("token/refresh/", JWTViews.JWTRefreshToken.as_view(), name="token_refresh"),
-    path("token/revoke/", JWTViews.JWTRevokeToken.as_view(), name="token_revoke"),
+    path("token/", token_obtain_pair_view, name="token_obtain_pair"),
+    path("token/refresh/", token_refresh_view, name="token_refresh"),
+    path("token/revoke/", token_revoke_view, name="token_revoke"),
+    path("token/revoke/bulk/", JWTViews.JWTBulkRevokeToken.as_view(), name="token_revoke_bulk"),
+    path("throttle/stats/", LoginThrottleStatsView.as_view(), name="login_throttle_stats"),
     # Rutas para OAuth2
     # Incluye las siguientes rutas de django-oauth-toolkit:
     # - o/authorize/: Autorización del usuario para la aplicación cliente.
@@ -49,6 +76,11 @@ urlpatterns = [
                     OAuthViews.IntrospectOAuthTokenEndpoint.as_view(),
                     name="introspect_token",
                 ),
+                path(
+                    "introspect/batch/",
+                    OAuthViews.IntrospectBatchOAuthTokenEndpoint.as_view(),
+                    name="introspect_token_batch",
+                ),
                 path(
                     "authorize/",
                     oauth2_views.AuthorizationView.as_view(),
@@ -61,7 +93,8 @@ urlpatterns = [
             ]
         ),
     ),
-    path("me/", MeView.as_view(), name="me"),
+    path("me/", me_view, name="me"),
     path("logout/", LogoutView.as_view(), name="logout"),
+    *signup_urlpatterns,
     path("", include(router.urls)),
 ]
@@ -0,0 +1,121 @@
+"""
+Caché en memoria por proceso de los usuarios autenticados por JWT.
+
+En lugar de la instancia de ``APIUser`` se guarda una copia ligera (``UserSnapshot``)
+con los campos que se consultan en cada petición, de forma que las peticiones
+autenticadas no necesitan tocar la base de datos mientras la entrada sea válida.
+Los cambios de un usuario invalidan solo su entrada, en todos los workers.
+"""
+from django.conf import settings
+
+from apps.authentication.cache import KeyInvalidatedTTLCache
+from apps.authentication.models import APIUser
+
+USER_VERSION_KEY = "api_user"
+
+
+class UserSnapshot:
+    """
+    Copia de solo lectura de un ``APIUser`` que se comporta como usuario autenticado.
+    """
+
+    FIELDS = (
+        "id",
+        "email",
+        "username",
+        "origin_app",
+        "is_active",
+        "is_staff",
+        "is_superuser",
+        "tokens_valid_after",
+        "claims_version",
+    )
+    __slots__ = FIELDS
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, **values):
+        for field in self.FIELDS:
+            setattr(self, field, values.get(field))
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(**{field: getattr(user, field) for field in cls.FIELDS})
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __str__(self):
+        return self.email
+
+    def get_username(self):
+        return self.email
+
+    def get_user(self):
+        """Carga la instancia completa de ``APIUser`` cuando se necesita escribir"""
+        return APIUser.objects.get(id=self.id)
+
+    token_issued_before_revocation = APIUser.token_issued_before_revocation
+
+
+_user_settings = settings.AUTH_CACHES["USERS"]
+
+user_cache = KeyInvalidatedTTLCache(
+    USER_VERSION_KEY,
+    maxsize=_user_settings["MAX_SIZE"],
+    ttl=_user_settings["TTL_SECONDS"],
+    poll_interval=settings.AUTH_CACHES["VERSION_POLL_SECONDS"],
+)
+
+
+def get_user_snapshot(user_id):
+    """
+    Devuelve la copia cacheada del usuario o la carga de la base de datos.
+    Devuelve ``None`` si el usuario no existe.
+    """
+    user_cache.sync()
+
+    # Las claves son texto, como las de CacheInvalidation
+    key = str(user_id)
+    generation = user_cache.generation
+    snapshot = user_cache.get(key)
+    if snapshot is None:
+        user = APIUser.objects.filter(id=user_id).only(*UserSnapshot.FIELDS).first()
+        if user is None:
+            return None
+
+        snapshot = UserSnapshot.from_user(user)
+        # No se guarda si el usuario se ha invalidado durante la lectura (p. ej. desactivado)
+        user_cache.set(key, snapshot, generation=generation)
+
+    return snapshot
+
+
+async def aget_user_snapshot(user_id):
+    """Variante asíncrona de ``get_user_snapshot``"""
+    await user_cache.apoll()
+
+    key = str(user_id)
+    generation = user_cache.generation
+    snapshot = user_cache.get(key)
+    if snapshot is None:
+        try:
+            user = await APIUser.objects.only(*UserSnapshot.FIELDS).aget(id=user_id)
+        except APIUser.DoesNotExist:
+            return None
+
+        snapshot = UserSnapshot.from_user(user)
+        user_cache.set(key, snapshot, generation=generation)
+
+    return snapshot
+
+
+def invalidate_user_snapshots(user_ids):
+    """
+    Invalida la copia cacheada de los usuarios indicados en este worker y en el
+    resto. Las señales de ``APIUser`` la llaman automáticamente; las escrituras con
+    ``QuerySet.update()`` deben llamarla explícitamente tras el commit.
+    """
+    user_cache.invalidate(str(user_id) for user_id in user_ids)
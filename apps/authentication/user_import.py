@@ -0,0 +1,247 @@
+"""
+Importación masiva de usuarios desde otras aplicaciones (CSV o JSONL).
+
+El fichero se lee en streaming y se procesa por lotes:
+
+- Las contraseñas en claro se hashean en un pool de procesos (``hashing.py``) y el
+  hash del lote siguiente se calcula mientras se inserta el actual. Las que ya
+  vienen en formato de Django (``password_hash``, p. ej. ``pbkdf2_sha256$...``) se
+  guardan tal cual: con millones de cuentas es la única forma de terminar en
+  minutos, porque cada hash PBKDF2 cuesta cientos de milisegundos de CPU.
+- Cada lote se inserta con ``bulk_create`` en su propia transacción; los emails
+  que ya existen (o repetidos en el fichero) se omiten. En la misma transacción se
+  encola el aviso ``domain_user.created`` de cada usuario creado, como en el registro,
+  para que el servicio de dominio también cree los usuarios importados.
+- Tras cada lote se guarda un checkpoint con los registros procesados, de forma
+  que una importación interrumpida continúa donde se quedó.
+"""
+import csv
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import identify_hasher
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Lower
+
+from apps.authentication.hashing import _init_worker, _make_password
+from apps.authentication.models import APIUser, OutboxMessage
+
+COUNTERS = ("records", "created", "skipped", "invalid", "hashed")
+
+
+class UserImportError(Exception):
+    pass
+
+
+def read_records(path, file_format=None):
+    """Devuelve los registros del fichero como diccionarios, sin cargarlo entero en memoria"""
+    file_format = file_format or ("jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv")
+
+    with open(path, newline="", encoding="utf-8") as f:
+        if file_format == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _chunks(records, size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class _Batch:
+    """Usuarios de un lote listos para insertar, con sus contadores y los hashes pendientes"""
+
+    def __init__(self, size):
+        self.size = size
+        self.users = []
+        # [(índice en users, contraseña en claro)]
+        self.raw_passwords = []
+        self.hashes = None
+        self.stats = dict.fromkeys(COUNTERS, 0)
+        self.stats["records"] = size
+
+
+class UserImporter:
+    def __init__(self, path, file_format=None, batch_size=1000, workers=None, default_origin_app=None,
+                 checkpoint_path=None, progress=None):
+        self.path = os.path.abspath(path)
+        self.file_format = file_format
+        self.batch_size = batch_size
+        self.workers = workers or os.cpu_count() or 1
+        self.default_origin_app = default_origin_app
+        self.checkpoint_path = checkpoint_path or f"{path}.checkpoint"
+        self.progress = progress
+        self._executor = None
+
+    def run(self):
+        """
+        Importa el fichero. Devuelve los contadores acumulados (``records``,
+        ``created``, ``skipped``, ``invalid``, ``hashed``) más ``seconds`` y
+        ``resumed_from`` (registros ya importados en ejecuciones anteriores).
+        """
+        stats = self._load_checkpoint()
+        resumed_from = stats["records"]
+
+        records = read_records(self.path, self.file_format)
+        # Los registros ya importados se saltan sin procesarlos
+        for _ in range(resumed_from):
+            next(records, None)
+
+        start = time.perf_counter()
+        try:
+            pending = None
+            for chunk in _chunks(records, self.batch_size):
+                # El hash de este lote avanza en el pool mientras se inserta el anterior
+                batch = self._prepare(chunk)
+                if pending is not None:
+                    self._commit(pending, stats, start, resumed_from)
+                pending = batch
+            if pending is not None:
+                self._commit(pending, stats, start, resumed_from)
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+
+        return {**stats, "seconds": time.perf_counter() - start, "resumed_from": resumed_from}
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return dict.fromkeys(COUNTERS, 0)
+
+        if state.get("input") != self.path:
+            raise UserImportError(f"El checkpoint {self.checkpoint_path} es de otro fichero: {state.get('input')}")
+        return {key: state.get(key, 0) for key in COUNTERS}
+
+    def _save_checkpoint(self, stats):
+        # Escritura atómica: un corte a mitad no deja un checkpoint corrupto
+        tmp = f"{self.checkpoint_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"input": self.path, **stats}, f)
+        os.replace(tmp, self.checkpoint_path)
+
+    def _get_executor(self):
+        # Solo se arranca el pool si el fichero trae contraseñas en claro
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return self._executor
+
+    def _prepare(self, records):
+        batch = _Batch(len(records))
+        seen = set()
+
+        for record in records:
+            email = APIUser.objects.normalize_email((record.get("email") or "").strip())
+            try:
+                validate_email(email)
+            except ValidationError:
+                batch.stats["invalid"] += 1
+                continue
+            if email in seen:
+                batch.stats["skipped"] += 1
+                continue
+
+            user = APIUser(
+                email=email,
+                username=APIUser.default_username(email),
+                first_name=(record.get("first_name") or "")[:30],
+                last_name=(record.get("last_name") or "")[:30],
+                origin_app=APIUser.origin_app_for(record.get("origin_app") or self.default_origin_app),
+            )
+
+            encoded, raw = record.get("password_hash"), record.get("password")
+            if encoded:
+                try:
+                    identify_hasher(encoded)
+                except ValueError:
+                    batch.stats["invalid"] += 1
+                    continue
+                user.password = encoded
+            elif raw:
+                batch.raw_passwords.append((len(batch.users), raw))
+            else:
+                # Sin contraseña: tendrá que restablecerla
+                user.set_unusable_password()
+
+            seen.add(email)
+            batch.users.append(user)
+
+        if batch.raw_passwords:
+            passwords = [raw for _index, raw in batch.raw_passwords]
+            # map() encola el lote entero; los resultados se recogen al insertarlo
+            batch.hashes = self._get_executor().map(
+                _make_password, passwords, chunksize=max(1, len(passwords) // (self.workers * 4))
+            )
+        return batch
+
+    def _commit(self, batch, stats, start, resumed_from):
+        if batch.hashes is not None:
+            for (index, _raw), encoded in zip(batch.raw_passwords, batch.hashes):
+                batch.users[index].password = encoded
+            batch.stats["hashed"] = len(batch.raw_passwords)
+
+        emails = [user.email for user in batch.users]
+        with transaction.atomic():
+            existing = set(
+                APIUser.objects.annotate(email_lower=Lower("email"))
+                .filter(email_lower__in=emails)
+                .values_list("email_lower", flat=True)
+            )
+            new_users = [user for user in batch.users if user.email not in existing]
+            created = self._insert(new_users)
+            OutboxMessage.objects.bulk_create([
+                OutboxMessage(event=OutboxMessage.DOMAIN_USER_CREATED, payload={"user_id": user.id})
+                for user in created
+            ])
+
+        batch.stats["created"] = len(created)
+        batch.stats["skipped"] += len(batch.users) - len(created)
+        for key in COUNTERS:
+            stats[key] += batch.stats[key]
+
+        self._save_checkpoint(stats)
+        if self.progress:
+            elapsed = time.perf_counter() - start
+            self.progress(stats, (stats["records"] - resumed_from) / elapsed if elapsed else 0)
+
+    def _insert(self, users):
+        """
+        Inserta los usuarios y devuelve los creados (con su id). Si un registro
+        simultáneo por /signup/ ocupa un email entre la comprobación y la inserción,
+        el lote se reintenta de uno en uno omitiendo los que chocan.
+        """
+        try:
+            with transaction.atomic():
+                return APIUser.objects.bulk_create(users)
+        except IntegrityError:
+            pass
+
+        created = []
+        for user in users:
+            try:
+                with transaction.atomic():
+                    APIUser.objects.bulk_create([user])
+            except IntegrityError:
+                continue
+            created.append(user)
+        return created
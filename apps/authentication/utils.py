@@ -1,10 +1,29 @@
 import datetime
-import uuid
+import secrets
 from datetime import timedelta
 from enum import Enum
 
+from django.conf import settings
+from django.db import transaction
 from oauth2_provider.models import AccessToken as OAuthAccessToken, RefreshToken as OAuthRefreshToken, Application
-from rest_framework_simplejwt.tokens import RefreshToken as JWTRefreshToken, AccessToken as JWTAccessToken
+
+from apps.authentication.cache import VersionedTTLCache
+from apps.authentication.introspection import CLIENT_VERSION_KEY
+from apps.authentication.tokens import APIRefreshToken as JWTRefreshToken, APIAccessToken as JWTAccessToken
+
+# Aplicación OAuth2 con la que se emiten los tokens de los usuarios registrados
+OAUTH2_APPLICATION_NAME = "api_auth"
+
+# Bytes aleatorios de los tokens OAuth2 (32 caracteres base64url, 192 bits)
+OAUTH2_TOKEN_BYTES = 24
+
+# Comparte la versión de las credenciales de cliente: cualquier cambio en Application la invalida
+_application_cache = VersionedTTLCache(
+    CLIENT_VERSION_KEY,
+    maxsize=16,
+    ttl=3600,
+    poll_interval=settings.AUTH_CACHES["VERSION_POLL_SECONDS"],
+)
 
 
 class AuthType(Enum):
@@ -53,21 +72,40 @@ def generate_jwt_token(user):
     }
 
 
+def get_oauth2_application():
+    """Aplicación OAuth2 de los tokens de usuario, cacheada por proceso"""
+    _application_cache.sync()
+
+    application = _application_cache.get(OAUTH2_APPLICATION_NAME)
+    if application is None:
+        application = Application.objects.get(name=OAUTH2_APPLICATION_NAME)
+        _application_cache.set(OAUTH2_APPLICATION_NAME, application)
+    return application
+
+
+def new_oauth2_token():
+    """Token opaco de longitud fija: no revela el usuario ni la fecha de emisión"""
+    return secrets.token_urlsafe(OAUTH2_TOKEN_BYTES)
+
+
 def generate_oauth2_token(user):
-    application = Application.objects.get(name="api_auth")
+    application = get_oauth2_application()
     expires = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=1)
-    access_token = OAuthAccessToken.objects.create(
-        user=user,
-        application=application,
-        expires=expires,
-        token=f"oauth2_{user.id}_{uuid.uuid4()}",
-    )
-    refresh_token = OAuthRefreshToken.objects.create(
-        user=user,
-        token=f"oauth2_refresh_{user.id}_{uuid.uuid4()}",
-        access_token=access_token,
-        application=application,
-    )
+
+    # Ambos tokens en una sola transacción: un único commit en lugar de dos
+    with transaction.atomic():
+        access_token = OAuthAccessToken.objects.create(
+            user=user,
+            application=application,
+            expires=expires,
+            token=new_oauth2_token(),
+        )
+        refresh_token = OAuthRefreshToken.objects.create(
+            user=user,
+            token=new_oauth2_token(),
+            access_token=access_token,
+            application=application,
+        )
     return {
         "access": access_token.token,
         "refresh": refresh_token.token,
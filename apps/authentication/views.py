@@ -1,34 +1,197 @@
 import datetime
 
-from django.contrib.auth.hashers import check_password
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.http import parse_etags
+from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.types import OpenApiTypes
-from drf_spectacular.utils import extend_schema, inline_serializer, OpenApiParameter
-from oauth2_provider.views import TokenView, IntrospectTokenView
+from drf_spectacular.utils import extend_schema, extend_schema_view, inline_serializer, OpenApiParameter
+from oauth2_provider.views import TokenView
 from rest_framework import serializers
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import SAFE_METHODS, AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
+from apps.authentication.filters import UserFilter
+from apps.authentication.introspection import authenticate_introspection_client, introspect_tokens
 from apps.authentication.models import APIUser
+from apps.authentication.pagination import UserCursorPagination
 from apps.authentication.serializers import (
     APIUserRegistrationSerializer,
     OAuthTokenRequestSerializer,
     OAuthRevokeSerializer,
     APIUserSerializer,
     APITokenObtainPairSerializer,
+    APITokenRefreshSerializer,
+    BulkRevokeSerializer,
     LogoutResponseSerializer,
     MeResponseSerializer,
 )
+from apps.authentication.signing import keyring
+from apps.authentication.throttling import LoginRateThrottle, login_throttle
+from apps.authentication.tokens import get_user_claims
 from apps.authentication.utils import generate_auth_token
 from main.logging_config import log_api_call, APILogger
-from apps.services.domain_user import notify_domain_user
 
 
 # Create your views here.
 
 
+def complete_signup(user, app_name, auth_type):
+    """
+    Pasos del registro posteriores a crear el usuario (que ya incluye ``origin_app`` y
+    deja encolado el aviso al servicio de dominio): emisión de tokens. Devuelve los
+    datos de la respuesta. Compartido por ``SignUpViewSet`` y la vista asíncrona de registro.
+    """
+    # Generamos los tokens de autenticación según el tipo
+    token_data = generate_auth_token(user, auth_type)
+
+    response_data = {
+        "message": "Usuario creado exitosamente",
+        # Agregamos el nombre de la aplicación a la respuesta y los datos del token
+        "app": app_name,
+    }
+    response_data.update(token_data)
+
+    # Llamamos a la tarea de Celery para enviar los datos a RabbitMQ
+    # send_user_to_queue.delay(user.id, auth_type)
+
+    return response_data
+
+
+def login_response_data(data, user):
+    """Cuerpo de la respuesta de login a partir de los tokens emitidos y el usuario"""
+    return {
+        "message": "Token generado exitosamente",
+        **data,
+        "username": user.username if user.is_authenticated else None,
+        "is_staff": user.is_staff,
+    }
+
+
+def refresh_response_data(data):
+    """Cuerpo de la respuesta de refresco a partir de los datos del serializador"""
+    response_data = {
+        "message": "Token refrescado exitosamente",
+        "access": data["access"],
+    }
+    # Solo hay un refresh nuevo si está activada la rotación de tokens de refresco
+    if "refresh" in data:
+        response_data["refresh"] = data["refresh"]
+    return response_data
+
+
+def refresh_error_data(error):
+    """
+    Cuerpo de la respuesta 401 cuando el error de validación indica un refresh inválido
+    o expirado; ``None`` para el resto de errores.
+    """
+    if "token" in str(error).lower() or "invalid" in str(error).lower():
+        return {
+            "error": "Token de refresco inválido o expirado. Por favor, inicia sesión de nuevo.",
+            "detail": str(error)
+        }
+    return None
+
+
+def revoke_session_tokens(request, payload):
+    """
+    Revoca el access y el refresh del usuario autenticado, tomados del body o de las
+    cookies, en una sola transacción. Devuelve ``(datos, status)`` de la respuesta.
+    Compartido por ``JWTViews.JWTRevokeToken`` y su variante asíncrona.
+    """
+    from apps.authentication.revocation import ALREADY_REVOKED, REVOKED, revoke_tokens
+
+    # Obtener token del body o de las cookies
+    token = payload.get("token") or request.COOKIES.get("access_token")
+    refresh_token = payload.get("refresh_token") or request.COOKIES.get("refresh_token")
+
+    if not token and not refresh_token:
+        APILogger.log_request(
+            "warning",
+            "Token revocation failed - Token not provided",
+            request,
+            {"validation_error": "Token not provided"},
+        )
+        return {"error": "Token no proporcionado"}, 400
+
+    user_id = request.user.id
+
+    # Revocar access y refresh token en una sola transacción
+    results = revoke_tokens([t for t in (token, refresh_token) if t], user_id=user_id)
+    revoked_count = sum(r["status"] in (REVOKED, ALREADY_REVOKED) for r in results)
+
+    if revoked_count > 0:
+        APILogger.log_request(
+            "info",
+            f"Token(s) revoked successfully - Count: {revoked_count}",
+            request,
+            {"user_id": user_id, "revoked_count": revoked_count},
+        )
+        return {"message": f"Token(s) revocado(s) exitosamente ({revoked_count})"}, 200
+
+    APILogger.log_request(
+        "warning",
+        "Token revocation failed - Unable to revoke tokens",
+        request,
+        {"user_id": user_id},
+    )
+    return {"error": "No se pudo revocar el token"}, 400
+
+
+def me_response_data(user, token):
+    """
+    Datos de ``/me/``: del propio token si lleva los claims del usuario en su versión
+    actual, si no de ``user``, la copia cacheada (``UserSnapshot``) que carga la
+    autenticación. En ningún caso hace falta consultar la base de datos.
+    """
+    user_data = get_user_claims(token, user)
+    if user_data is not None:
+        return user_data
+
+    return {
+        "username": user.username,
+        "email": user.email,
+        "origin_app": user.origin_app,
+        "is_staff": user.is_staff,
+    }
+
+
+def set_login_cookies(response, app_name, data):
+    """Cookies de sesión del login JWT (aplicación, access y refresh)"""
+    response.set_cookie(
+        key="app_name",
+        value=app_name,
+        expires=datetime.timedelta(days=7),
+        secure=True,
+        httponly=True,
+        domain="localhost",
+        samesite="None",  # O "Lax" si no necesitas acceso cross-origin estricto
+    )
+
+    response.set_cookie(
+        key="access_token",
+        value=data["access"],
+        expires=datetime.timedelta(days=7),
+        secure=True,
+        httponly=True,
+        domain="localhost",
+        samesite="None",  # O "Lax" si no necesitas acceso cross-origin estricto
+    )
+
+    response.set_cookie(
+        key="refresh_token",
+        value=data["refresh"],
+        expires=datetime.timedelta(days=30),
+        secure=True,
+        httponly=True,
+        domain="localhost",
+        samesite="None",  # O "Lax" si no necesitas acceso cross-origin estricto
+    )
+
+
 @extend_schema(
     tags=["SignUp"],
     summary="Registro de usuario",
@@ -81,31 +244,11 @@ class SignUpViewSet(ModelViewSet):
 
         try:
             serializer.is_valid(raise_exception=True)
-            user = serializer.save()
-
-            # Actualizamos el nombre de la aplicación en el usuario
-            user_update = APIUser.objects.get(id=user.id)
+            user = serializer.save(origin_app=APIUser.origin_app_for(app_name))
 
-            if app_name in [choice[0] for choice in APIUser.APP_CHOICES]:
-                user_update.origin_app = app_name
-                user_update.save()
-
-            # Generamos los tokens de autenticación según el tipo
-            token_data = generate_auth_token(user, auth_type)
-
-            response_data = {
-                "message": "Usuario creado exitosamente",
-                # Agregamos el nombre de la aplicación a la respuesta y los datos del token
-                "app": app_name,
-            }
-            response_data.update(token_data)
+            response_data = complete_signup(user, app_name, auth_type)
             headers = self.get_success_headers(serializer.data)
 
-            # Llamamos a la tarea de Celery para enviar los datos a RabbitMQ
-            # send_user_to_queue.delay(user.id, auth_type)
-
-            notify_domain_user(user.id)
-
             return Response(response_data, headers=headers)
 
         except Exception:
@@ -157,12 +300,15 @@ class OAuthViews:
             pass
 
     class IntrospectOAuthTokenEndpoint(APIView):
+        # El cliente (servidor de recursos) se autentica con sus credenciales OAuth2, no como usuario
+        authentication_classes = []
         permission_classes = [AllowAny]
 
         @extend_schema(
             operation_id="introspect_token",
             summary="Introspección de un token de acceso",
-            description="Endpoint para introspección de tokens OAuth2.",
+            description="Endpoint para introspección de tokens OAuth2. Requiere credenciales de cliente "
+                        "(HTTP Basic) o un token de acceso con el scope `introspection`.",
             request=inline_serializer(
                 name="IntrospectTokenSerializer",
                 fields={
@@ -189,11 +335,45 @@ class OAuthViews:
                 )
                 return Response({"error": "Token not provided"}, status=400)
 
-            introspection_view = IntrospectTokenView.as_view()
-            validate_data = {"token": token}
-            request._data = validate_data  # Ensure the token is passed correctly
+            if not authenticate_introspection_client(request):
+                return Response({"error": "invalid_client"}, status=403)
+
+            # Respuesta cacheada por token hasta su expiración (ver apps.authentication.introspection)
+            return Response(introspect_tokens([token])[0])
+
+    class IntrospectBatchOAuthTokenEndpoint(APIView):
+        authentication_classes = []
+        permission_classes = [AllowAny]
+
+        @extend_schema(
+            operation_id="introspect_token_batch",
+            summary="Introspección de varios tokens de acceso",
+            description="Introspecta una lista de tokens OAuth2 con una sola consulta. Devuelve los "
+                        "resultados en el mismo orden, con el formato de `/o/introspect/`.",
+            request=inline_serializer(
+                name="IntrospectTokenBatchSerializer",
+                fields={
+                    "tokens": serializers.ListField(child=serializers.CharField()),
+                },
+            ),
+            responses={200: OpenApiTypes.OBJECT},
+            tags=["OAuth2"],
+        )
+        @log_api_call(level="info")
+        def post(self, request, *args, **kwargs):
+            tokens = request.data.get("tokens") if hasattr(request.data, "get") else None
+            max_batch = settings.AUTH_CACHES["INTROSPECTION"]["MAX_BATCH"]
+
+            if not isinstance(tokens, list) or not tokens:
+                return Response({"error": "Tokens not provided"}, status=400)
+            if len(tokens) > max_batch:
+                return Response({"error": f"No se pueden introspectar más de {max_batch} tokens por petición"},
+                                status=400)
+
+            if not authenticate_introspection_client(request):
+                return Response({"error": "invalid_client"}, status=403)
 
-            return introspection_view(request, *args, **kwargs)
+            return Response({"results": introspect_tokens(tokens)})
 
 
 class JWTViews:
@@ -217,60 +397,18 @@ class JWTViews:
     )
     class JWTObtainPairToken(TokenObtainPairView):
         serializer_class = APITokenObtainPairSerializer
+        # Los intentos por encima del límite se rechazan antes de comprobar la contraseña
+        throttle_classes = [LoginRateThrottle]
 
         def post(self, request, *args, **kwargs):
-            response = super().post(request, *args, **kwargs)
-            app_name = getattr(request, "app_name", None)
-            data = response.data
-
-            user = APIUser.objects.filter(email=request.data.get("email")).first()
-            if not user or not user.is_active:
-                raise serializers.ValidationError("Usuario no válido o inactivo")
-
-            if not check_password(request.data.get("password"), user.password):
-                raise serializers.ValidationError("Credenciales inválidas")
-
-            user_data = {
-                "username": user.username if user.is_authenticated else None,
-                "is_staff": user.is_staff,
-            }
-
-            response.set_cookie(
-                key="app_name",
-                value=app_name,
-                expires=datetime.timedelta(days=7),
-                secure=True,
-                httponly=True,
-                domain="localhost",
-                samesite="None",  # O "Lax" si no necesitas acceso cross-origin estricto
-            )
-
-            response.set_cookie(
-                key="access_token",
-                value=data["access"],
-                expires=datetime.timedelta(days=7),
-                secure=True,
-                httponly=True,
-                domain="localhost",
-                samesite="None",  # O "Lax" si no necesitas acceso cross-origin estricto
-            )
-
-            response.set_cookie(
-                key="refresh_token",
-                value=data["refresh"],
-                expires=datetime.timedelta(days=30),
-                secure=True,
-                httponly=True,
-                domain="localhost",
-                samesite="None",  # O "Lax" si no necesitas acceso cross-origin estricto
-            )
+            # Una sola pasada: el serializador consulta el usuario, comprueba la contraseña
+            # (el único hash del login) y genera los tokens; la respuesta sale de ese resultado
+            serializer = self.get_serializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
 
-            # Combinar los datos originales con el mensaje
-            response.data = {
-                "message": "Token generado exitosamente",
-                **data,
-                **user_data,
-            }
+            data = serializer.validated_data
+            response = Response(login_response_data(data, serializer.user), status=200)
+            set_login_cookies(response, getattr(request, "app_name", None), data)
             return response
 
     @extend_schema(
@@ -280,33 +418,23 @@ class JWTViews:
         responses={200: OpenApiTypes.OBJECT},
     )
     class JWTRefreshToken(TokenRefreshView):
+        serializer_class = APITokenRefreshSerializer
+
         def post(self, request, *args, **kwargs):
             try:
                 response = super().post(request, *args, **kwargs)
-                data = response.data
-
-                response_data = {
-                    "message": "Token refrescado exitosamente",
-                    "access": data["access_token"],
-                    "refresh": data["refresh_token"],
-                }
-                return Response(response_data)
+                return Response(refresh_response_data(response.data))
             except serializers.ValidationError as e:
                 # Capturar específicamente errores de token expirado o inválido
-                if "token" in str(e).lower() or "invalid" in str(e).lower():
+                error_data = refresh_error_data(e)
+                if error_data is not None:
                     APILogger.log_request(
                         "warning",
                         "Token refresh failed - Invalid or expired refresh token",
                         request,
                         {"error": str(e)},
                     )
-                    return Response(
-                        {
-                            "error": "Token de refresco inválido o expirado. Por favor, inicia sesión de nuevo.",
-                            "detail": str(e)
-                        },
-                        status=401,
-                    )
+                    return Response(error_data, status=401)
                 raise
 
     @extend_schema(
@@ -329,58 +457,92 @@ class JWTViews:
         permission_classes = [IsAuthenticated]
 
         def post(self, request, *args, **kwargs):
-            from apps.authentication.models import TokenBlacklist
+            data, status = revoke_session_tokens(request, request.data)
+            return Response(data, status=status)
 
-            # Obtener token del body o de las cookies
-            token = request.data.get("token") or request.COOKIES.get("access_token")
-            refresh_token = request.data.get("refresh_token") or request.COOKIES.get("refresh_token")
+    @extend_schema(
+        tags=["JWT"],
+        summary="Revocar tokens JWT en bloque",
+        description="Endpoint de administración para revocar muchos tokens, o todos los tokens "
+                    "de una lista de usuarios, en una sola transacción.",
+        request=BulkRevokeSerializer,
+        responses={200: OpenApiTypes.OBJECT},
+    )
+    class JWTBulkRevokeToken(APIView):
+        permission_classes = [IsAdminUser]
 
-            if not token and not refresh_token:
-                APILogger.log_request(
-                    "warning",
-                    "Token revocation failed - Token not provided",
-                    request,
-                    {"validation_error": "Token not provided"},
-                )
-                return Response({"error": "Token no proporcionado"}, status=400)
+        def post(self, request, *args, **kwargs):
+            from apps.authentication.revocation import revoke_tokens, revoke_user_tokens
 
-            user_id = request.user.id
-            revoked_count = 0
+            serializer = BulkRevokeSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
 
-            # Revocar access token si existe
-            if token:
-                success = TokenBlacklist.revoke_token(token, user_id, "access")
-                if success:
-                    revoked_count += 1
+            tokens = serializer.validated_data.get("tokens", [])
+            user_ids = serializer.validated_data.get("user_ids", [])
 
-            # Revocar refresh token si existe
-            if refresh_token:
-                success = TokenBlacklist.revoke_token(refresh_token, user_id, "refresh")
-                if success:
-                    revoked_count += 1
+            token_results = revoke_tokens(tokens) if tokens else []
+            user_results = revoke_user_tokens(user_ids) if user_ids else []
 
-            if revoked_count > 0:
-                APILogger.log_request(
-                    "info",
-                    f"Token(s) revoked successfully - Count: {revoked_count}",
-                    request,
-                    {"user_id": user_id, "revoked_count": revoked_count},
-                )
-                return Response(
-                    {"message": f"Token(s) revocado(s) exitosamente ({revoked_count})"},
-                    status=200
-                )
-            else:
-                APILogger.log_request(
-                    "warning",
-                    "Token revocation failed - Unable to revoke tokens",
-                    request,
-                    {"user_id": user_id},
-                )
-                return Response(
-                    {"error": "No se pudo revocar el token"},
-                    status=400
-                )
+            summary = {}
+            for result in token_results + user_results:
+                summary[result["status"]] = summary.get(result["status"], 0) + 1
+
+            APILogger.log_request(
+                "info",
+                "Bulk token revocation",
+                request,
+                {"tokens": len(tokens), "user_ids": len(user_ids), "summary": summary},
+            )
+
+            return Response(
+                {
+                    "message": "Revocación en bloque completada",
+                    "summary": summary,
+                    "tokens": token_results,
+                    "users": user_results,
+                },
+                status=200,
+            )
+
+
+@extend_schema(
+    tags=["JWT"],
+    summary="Contadores del límite de intentos de login",
+    description="Endpoint de administración con los intentos permitidos y rechazados por ámbito "
+                "(email, IP, aplicación) en este worker.",
+    responses={200: OpenApiTypes.OBJECT},
+)
+class LoginThrottleStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(login_throttle.stats())
+
+
+@extend_schema(
+    tags=["JWT"],
+    summary="Claves públicas de firma (JWKS)",
+    description="Claves públicas con las que otros servicios verifican localmente los tokens JWT. "
+                "Incluye la clave activa, la siguiente (publicada antes de empezar a firmar) y las "
+                "retiradas hasta que expiran sus tokens. Cacheable (Cache-Control y ETag).",
+    responses={200: OpenApiTypes.OBJECT},
+)
+class JWKSView(APIView):
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        body, etag = keyring.jwks()
+
+        if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+        if etag in if_none_match or "*" in if_none_match:
+            response = HttpResponse(status=304)
+        else:
+            response = HttpResponse(body, content_type="application/json")
+
+        response["ETag"] = etag
+        response["Cache-Control"] = f"public, max-age={settings.JWT_SIGNING_KEYS['JWKS_MAX_AGE_SECONDS']}"
+        return response
 
 
 from rest_framework.generics import GenericAPIView
@@ -407,13 +569,7 @@ class MeView(GenericAPIView):
     serializer_class = MeResponseSerializer
 
     def get(self, request):
-        user_data = {
-            "username": request.user.username,
-            "email": request.user.email,
-            "origin_app": request.user.origin_app,
-            "is_staff": request.user.is_staff,
-        }
-        return Response(user_data)
+        return Response(me_response_data(request.user, request.auth))
 
 
 @extend_schema(
@@ -427,7 +583,7 @@ class LogoutView(APIView):
     serializer_class = LogoutResponseSerializer
 
     def post(self, request):
-        from apps.authentication.models import TokenBlacklist
+        from apps.authentication.revocation import ALREADY_REVOKED, REVOKED, revoke_tokens
 
         APILogger.log_request(
             "info",
@@ -441,17 +597,9 @@ class LogoutView(APIView):
         refresh_token = request.COOKIES.get("refresh_token")
         user_id = request.user.id
 
-        # ✅ Revocar tokens JWT agregándolos a la blacklist
-        revoked_count = 0
-        if access_token:
-            success = TokenBlacklist.revoke_token(access_token, user_id, "access")
-            if success:
-                revoked_count += 1
-
-        if refresh_token:
-            success = TokenBlacklist.revoke_token(refresh_token, user_id, "refresh")
-            if success:
-                revoked_count += 1
+        # ✅ Revocar tokens JWT agregándolos a la blacklist en una sola transacción
+        results = revoke_tokens([t for t in (access_token, refresh_token) if t], user_id=user_id)
+        revoked_count = sum(r["status"] in (REVOKED, ALREADY_REVOKED) for r in results)
 
         # Eliminar las cookies
         response = Response(
@@ -475,6 +623,15 @@ class LogoutView(APIView):
         return response
 
 
+USER_FIELDS_PARAMETER = OpenApiParameter(
+    name="fields",
+    type=OpenApiTypes.STR,
+    location="query",
+    description="Campos a devolver separados por comas (p. ej. id,email); por defecto todos",
+    required=False,
+)
+
+
 @extend_schema(
     tags=["User"],
     summary="Gestión de usuarios",
@@ -490,9 +647,54 @@ class LogoutView(APIView):
         )
     ],
 )
+@extend_schema_view(
+    list=extend_schema(parameters=[USER_FIELDS_PARAMETER]),
+    retrieve=extend_schema(parameters=[USER_FIELDS_PARAMETER]),
+)
 class UserViewSet(ModelViewSet):
+    """
+    Gestión de usuarios. El listado se pagina por cursor sobre ``id`` (sin ``COUNT(*)``),
+    se filtra en el servidor por ``origin_app``, ``is_active`` y ``email_prefix`` (con
+    índices detrás) y ``?fields=id,email`` limita tanto los campos devueltos como las
+    columnas leídas.
+    """
     queryset = APIUser.objects.all()
     serializer_class = APIUserSerializer
+    pagination_class = UserCursorPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = UserFilter
     permission_classes = [IsAuthenticated]
     scope_required = ["read", "write"]
     http_method_names = ["get", "put", "delete"]
+
+    def requested_fields(self):
+        """
+        Campos de ``?fields=`` validados contra el serializador, o todos si no se indica.
+        Solo se aplica a las lecturas; las escrituras trabajan con el usuario completo.
+        """
+        if not hasattr(self, "_requested_fields"):
+            available = self.get_serializer_class().Meta.fields
+            raw = self.request.query_params.get("fields") if self.request.method in SAFE_METHODS else None
+            if not raw:
+                self._requested_fields = list(available)
+            else:
+                fields = [name.strip() for name in raw.split(",") if name.strip()]
+                unknown = [name for name in fields if name not in available]
+                if unknown or not fields:
+                    raise serializers.ValidationError({
+                        "fields": [f"Campos no válidos: {', '.join(unknown) or raw}. Disponibles: {', '.join(available)}"]
+                    })
+                self._requested_fields = fields
+        return self._requested_fields
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request is not None and self.request.method in SAFE_METHODS:
+            # Solo las columnas que se van a serializar (nunca el hash de la contraseña)
+            queryset = queryset.only(*self.requested_fields())
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request is not None and self.request.method in SAFE_METHODS:
+            kwargs.setdefault("fields", self.requested_fields())
+        return super().get_serializer(*args, **kwargs)
@@ -1,20 +1,62 @@
+import threading
+
 import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
 
 from apps.authentication.utils import generate_service_token
 
+_session = None
+_session_lock = threading.Lock()
+
+
+class DomainServiceError(Exception):
+    pass
+
 
-def notify_domain_user(user_id: str) -> None:
+def get_session() -> requests.Session:
+    """
+    Sesión HTTP compartida por el proceso: reutiliza las conexiones keep-alive con el
+    servicio de dominio en lugar de abrir una nueva (TCP + TLS) por aviso. Sin reintentos
+    a nivel de transporte: los reintentos los gestiona el outbox con backoff.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                pool_size = settings.DOMAIN_USER_SERVICE["POOL_SIZE"]
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+def notify_domain_user(user_id: str, idempotency_key: str = None) -> None:
     service_token = generate_service_token(service_name='authentication-service', user_id=user_id)
+    config = settings.DOMAIN_USER_SERVICE
+
+    headers = {
+        "Authorization": f"Bearer {service_token}",
+        "Content-Type": "application/json"
+    }
+    # La entrega es "al menos una vez": el servicio de dominio puede recibir el mismo aviso
+    # más de una vez y usar esta clave para descartar los repetidos
+    if idempotency_key:
+        headers["Idempotency-Key"] = idempotency_key
 
     # Preparamos la petición HTTP para enviar la notificación al servicio de autenticación
-    request = requests.post(
-        url="http://localhost:8001/auth/create-domain-user/",
-        headers={
-            "Authorization": f"Bearer {service_token}",
-            "Content-Type": "application/json"
-        },
-        #timeout=3,
-    )
+    try:
+        request = get_session().post(
+            url=config["URL"],
+            headers=headers,
+            timeout=(config["CONNECT_TIMEOUT_SECONDS"], config["READ_TIMEOUT_SECONDS"]),
+        )
+    except requests.RequestException as e:
+        raise DomainServiceError(f"Error al notificar al servicio de autenticación: {e}") from e
 
     if request.status_code != 200 and request.status_code != 201:
-        raise Exception(f"Error al notificar al servicio de autenticación: {request.status_code} - {request.text}")
+        raise DomainServiceError(
+            f"Error al notificar al servicio de autenticación: {request.status_code} - {request.text[:500]}"
+        )
@@ -0,0 +1,297 @@
+"""
+Publicador persistente de eventos de usuario en RabbitMQ (cola ``user_queue``).
+
+Cada proceso (worker de Celery, comando) mantiene una única conexión AMQP abierta en
+lugar de conectarse, declarar la cola y desconectarse por mensaje:
+
+- Confirmaciones del publicador (publisher confirms): ``publish`` no vuelve hasta que
+  el broker ha aceptado el mensaje, y un ``nack`` se propaga como error.
+- Micro-lotes: los mensajes se publican en ráfaga y se espera una sola vez por las
+  confirmaciones del lote. Con varios hilos publicando a la vez (pool de hilos de
+  Celery), uno de ellos publica los mensajes acumulados del resto en el mismo lote;
+  sin carga cada mensaje sale solo, sin esperas artificiales.
+- Si la conexión se cae se reconecta con backoff y se reenvían solo los mensajes sin
+  confirmar (entrega "al menos una vez").
+
+Se usa ``amqp`` (py-amqp, el cliente de Celery con RabbitMQ) porque permite publicar sin
+esperar y recibir las confirmaciones después; el canal bloqueante de pika espera la
+confirmación de cada mensaje antes de enviar el siguiente.
+"""
+import json
+import os
+import threading
+import time
+from urllib.parse import unquote, urlparse
+
+import amqp
+from django.conf import settings
+
+_publisher = None
+_publisher_pid = None
+_publisher_lock = threading.Lock()
+
+# Errores tras los que la conexión ya no es fiable y se reconecta
+RECONNECT_ERRORS = (OSError, amqp.exceptions.AMQPError)
+
+
+class UserQueuePublishError(Exception):
+    pass
+
+
+class _Entry:
+    """Mensajes de una llamada a ``publish_many`` a la espera de su lote"""
+
+    def __init__(self, bodies):
+        self.bodies = bodies
+        self.done = False
+        self.failed = 0
+        self.error = None
+
+
+class UserQueuePublisher:
+    def __init__(self, config=None):
+        self.config = config or settings.USER_QUEUE
+        self._connection = None
+        self._channel = None
+        self._next_tag = 1
+        # delivery_tag -> índice del mensaje en el lote en curso
+        self._inflight = {}
+        self._acked = set()
+        self._nacked = set()
+
+        self._cond = threading.Condition()
+        self._queue = []
+        self._flushing = False
+
+        self._stats = {
+            "published": 0,
+            "confirmed": 0,
+            "nacked": 0,
+            "failed": 0,
+            "batches": 0,
+            "max_batch": 0,
+            "republished": 0,
+            "connections": 0,
+            "connection_errors": 0,
+            "confirm_seconds": 0.0,
+        }
+        self._last_error = None
+        self._last_stats_log = time.monotonic()
+
+    # Conexión
+
+    def _connect(self):
+        url = urlparse(self.config["BROKER_URL"])
+        connection = amqp.Connection(
+            host=f"{url.hostname or 'localhost'}:{url.port or 5672}",
+            userid=unquote(url.username or "guest"),
+            password=unquote(url.password or "guest"),
+            virtual_host=unquote(url.path[1:]) if len(url.path) > 1 else "/",
+            connect_timeout=self.config["CONNECT_TIMEOUT_SECONDS"],
+            heartbeat=0,
+        )
+        connection.connect()
+        try:
+            channel = connection.channel()
+            channel.queue_declare(queue=self.config["QUEUE"], durable=True, auto_delete=False)
+            channel.confirm_select()
+            channel.events["basic_ack"].add(self._on_ack)
+            channel.events["basic_nack"].add(self._on_nack)
+        except Exception:
+            connection.collect()
+            raise
+
+        self._connection, self._channel = connection, channel
+        self._next_tag = 1
+        self._stats["connections"] += 1
+
+    def _disconnect(self):
+        connection, self._connection, self._channel = self._connection, None, None
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception:
+                # Conexión ya rota: basta con liberar el socket
+                connection.collect()
+
+    def close(self):
+        with self._cond:
+            self._disconnect()
+
+    def _on_ack(self, delivery_tag, multiple):
+        self._confirm(delivery_tag, multiple, self._acked)
+
+    def _on_nack(self, delivery_tag, multiple):
+        self._confirm(delivery_tag, multiple, self._nacked)
+
+    def _confirm(self, delivery_tag, multiple, target):
+        tags = [tag for tag in self._inflight if tag <= delivery_tag] if multiple else [delivery_tag]
+        for tag in tags:
+            index = self._inflight.pop(tag, None)
+            if index is not None:
+                target.add(index)
+
+    # Publicación
+
+    def publish(self, message):
+        """Publica un mensaje (dict serializable a JSON) y espera su confirmación"""
+        self.publish_many([message])
+
+    def publish_many(self, messages):
+        """
+        Publica los mensajes y espera a que el broker los confirme todos. Lanza
+        ``UserQueuePublishError`` si alguno se rechaza o no se puede entregar.
+        """
+        bodies = [json.dumps(message).encode("utf-8") for message in messages]
+        size = self.config["MAX_BATCH"]
+        entries = [_Entry(bodies[i:i + size]) for i in range(0, len(bodies), size)]
+        if not entries:
+            return
+
+        with self._cond:
+            self._queue.extend(entries)
+            # Otro hilo está publicando: sus lotes incluirán estas entradas
+            while self._flushing and not entries[-1].done:
+                self._cond.wait()
+            leader = not entries[-1].done
+            if leader:
+                self._flushing = True
+
+        if leader:
+            try:
+                self._flush_until(entries[-1])
+            finally:
+                with self._cond:
+                    self._flushing = False
+                    self._cond.notify_all()
+
+        failed = [entry for entry in entries if entry.failed]
+        if failed:
+            raise UserQueuePublishError(
+                f"{sum(entry.failed for entry in failed)} mensaje(s) sin confirmar por el broker: {failed[0].error}"
+            )
+
+    def _flush_until(self, entry):
+        """Publica lotes de la cola (por orden de llegada) hasta que ``entry`` esté publicada"""
+        max_batch = self.config["MAX_BATCH"]
+        while not entry.done:
+            with self._cond:
+                batch, size = [], 0
+                while self._queue and (not batch or size + len(self._queue[0].bodies) <= max_batch):
+                    batch.append(self._queue.pop(0))
+                    size += len(batch[-1].bodies)
+
+            bodies = [body for pending in batch for body in pending.bodies]
+            try:
+                errors = self._send(bodies)
+            except Exception as e:
+                # Ninguna entrada del lote puede quedarse esperando para siempre
+                self._disconnect()
+                errors = dict.fromkeys(range(len(bodies)), f"{e.__class__.__name__}: {e}")
+
+            with self._cond:
+                offset = 0
+                for pending in batch:
+                    failed = [i for i in range(offset, offset + len(pending.bodies)) if i in errors]
+                    if failed:
+                        pending.failed, pending.error = len(failed), errors[failed[0]]
+                    offset += len(pending.bodies)
+                    pending.done = True
+                self._cond.notify_all()
+
+            self._maybe_log_stats()
+
+    def _send(self, bodies):
+        """Publica un lote con reintentos. Devuelve {índice: error} de los mensajes no confirmados"""
+        self._stats["batches"] += 1
+        self._stats["max_batch"] = max(self._stats["max_batch"], len(bodies))
+
+        pending = list(range(len(bodies)))
+        errors = {}
+        attempts = self.config["RECONNECT_ATTEMPTS"]
+        for attempt in range(attempts + 1):
+            if attempt:
+                self._stats["republished"] += len(pending)
+            self._inflight, self._acked, self._nacked = {}, set(), set()
+            try:
+                if self._channel is None:
+                    self._connect()
+                self._publish_and_confirm(bodies, pending, errors)
+                break
+            except RECONNECT_ERRORS as e:
+                self._stats["connection_errors"] += 1
+                self._last_error = f"{e.__class__.__name__}: {e}"
+                # Se reenvían solo los mensajes que el broker no llegó a confirmar
+                pending = [i for i in pending if i not in self._acked and i not in self._nacked]
+                self._stats["nacked"] += len(self._nacked)
+                errors.update((i, "nack") for i in self._nacked)
+                self._disconnect()
+                if attempt < attempts:
+                    time.sleep(self.config["RECONNECT_BACKOFF_SECONDS"] * 2 ** attempt)
+        else:
+            errors.update((i, self._last_error) for i in pending)
+
+        self._stats["confirmed"] += len(bodies) - len(errors)
+        self._stats["failed"] += len(errors)
+        return errors
+
+    def _publish_and_confirm(self, bodies, indices, errors):
+        channel, queue = self._channel, self.config["QUEUE"]
+
+        for index in indices:
+            message = amqp.Message(bodies[index], content_type="application/json", delivery_mode=2)
+            self._inflight[self._next_tag] = index
+            self._next_tag += 1
+            channel.basic_publish(message, exchange="", routing_key=queue)
+        self._stats["published"] += len(indices)
+
+        start = time.monotonic()
+        deadline = start + self.config["CONFIRM_TIMEOUT_SECONDS"]
+        while self._inflight:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"Sin confirmación del broker para {len(self._inflight)} mensaje(s)")
+            self._connection.drain_events(timeout=remaining)
+        self._stats["confirm_seconds"] += time.monotonic() - start
+
+        self._stats["nacked"] += len(self._nacked)
+        errors.update((i, "nack") for i in self._nacked)
+
+    # Métricas
+
+    def stats(self):
+        """Contadores de publicación del proceso"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats["connected"] = self._channel is not None
+            stats["last_error"] = self._last_error
+        stats["avg_batch"] = stats["published"] / stats["batches"] if stats["batches"] else 0
+        return stats
+
+    def _maybe_log_stats(self):
+        interval = self.config["STATS_LOG_SECONDS"]
+        now = time.monotonic()
+        if interval and now - self._last_stats_log >= interval:
+            self._last_stats_log = now
+            stats = self._stats
+            print(
+                f"User queue publisher (pid {os.getpid()}): {stats['confirmed']} confirmed, "
+                f"{stats['failed']} failed, {stats['batches']} batch(es) (max {stats['max_batch']}), "
+                f"{stats['connections']} connection(s), {stats['connection_errors']} connection error(s)"
+            )
+
+
+def get_user_queue_publisher():
+    """Publicador del proceso actual (se recrea tras un fork, p. ej. en el pool prefork de Celery)"""
+    global _publisher, _publisher_pid
+    pid = os.getpid()
+    if _publisher is None or _publisher_pid != pid:
+        with _publisher_lock:
+            if _publisher is None or _publisher_pid != pid:
+                _publisher, _publisher_pid = UserQueuePublisher(), pid
+    return _publisher
+
+
+def close_user_queue_publisher():
+    if _publisher is not None and _publisher_pid == os.getpid():
+        _publisher.close()
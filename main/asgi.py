@@ -11,6 +11,8 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'main.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'main.config.development')
+# Bajo ASGI, login y registro usan las vistas asíncronas con el pool de hashing
+os.environ.setdefault('AUTH_ASYNC_VIEWS', 'true')
 
 application = get_asgi_application()
@@ -2,6 +2,7 @@ import os
 from pathlib import Path
 
 import environ
+from celery.schedules import crontab
 
 # Permite definir la ruta base del proyecto para construir rutas relativas: BASE_DIR / 'subdir'
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
@@ -21,17 +22,33 @@ SECRET_KEY = os.environ.get("SECRET_KEY")
 # Importación de configuraciones específicas
 from .installed_apps import INSTALLED_APPS
 from .authentication import SIMPLE_JWT as JWT, OAUTH2_PROVIDER as OAUTH2, AUTH_METHODS_BY_APP as AUTH_METHODS
+from .authentication import AUTH_CACHES, JWT_USER_CLAIMS, TOKEN_BLACKLIST_CLEANUP, PASSWORD_HASHING_POOL
+from .authentication import LOGIN_THROTTLE, AUTH_ASYNC_VIEWS, JWT_SIGNING_KEYS, OUTBOX, DOMAIN_USER_SERVICE
+from .authentication import USER_QUEUE
 from .rest_framework import REST_FRAMEWORK as DRF_SETTINGS
 from .swagger_doc import SPECTACULAR_SETTINGS as SWAGGER_SETTINGS
-from .logging import LOGGING
+from .logging import LOGGING, API_LOG_SAMPLING, API_LOG_HEADERS, API_LOG_RESPONSE_DATA
 
 INSTALLED_APPS = INSTALLED_APPS
 SIMPLE_JWT = JWT
 OAUTH2 = OAUTH2
 AUTH_METHODS = AUTH_METHODS
+AUTH_CACHES = AUTH_CACHES
+JWT_USER_CLAIMS = JWT_USER_CLAIMS
+TOKEN_BLACKLIST_CLEANUP = TOKEN_BLACKLIST_CLEANUP
+PASSWORD_HASHING_POOL = PASSWORD_HASHING_POOL
+LOGIN_THROTTLE = LOGIN_THROTTLE
+AUTH_ASYNC_VIEWS = AUTH_ASYNC_VIEWS
+JWT_SIGNING_KEYS = JWT_SIGNING_KEYS
+OUTBOX = OUTBOX
+DOMAIN_USER_SERVICE = DOMAIN_USER_SERVICE
+USER_QUEUE = USER_QUEUE
 REST_FRAMEWORK = DRF_SETTINGS
 SWAGGER_SETTINGS = SWAGGER_SETTINGS
 LOGGING = LOGGING
+API_LOG_SAMPLING = API_LOG_SAMPLING
+API_LOG_HEADERS = API_LOG_HEADERS
+API_LOG_RESPONSE_DATA = API_LOG_RESPONSE_DATA
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
@@ -128,6 +145,14 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 
+# Tareas periódicas (celery beat)
+CELERY_BEAT_SCHEDULE = {
+    'cleanup-expired-tokens': {
+        'task': 'apps.authentication.tasks.cleanup_expired_tokens',
+        'schedule': crontab(**TOKEN_BLACKLIST_CLEANUP['SCHEDULE']),
+    },
+}
+
 # Para trabajar con el tiempo de espera, reintentos, etc.
 # CELERY_TASK_ACKS_LATE = True  # Confirmar tareas después de que se hayan procesado
 # CELERY_TIMEZONE = 'UTC'  # Ajusta la zona horaria si es necesario
@@ -1,4 +1,37 @@
 # Configuración de logging para la API
+#
+# El logger ``api`` solo encola los registros (``QueueLogHandler``); un hilo aparte los
+# serializa y los escribe a través de los handlers del logger ``api.output``. Así un disco
+# lento no se nota en la latencia de las peticiones: como mucho se llena la cola y se
+# descartan registros (contados y avisados en el propio log).
+API_LOG_QUEUE_SIZE = 10000
+API_LOG_DROP_POLICY = "newest"  # "newest" descarta el registro entrante, "oldest" el más antiguo
+API_LOG_MAX_BYTES = 20 * 1024 * 1024
+API_LOG_BACKUP_COUNT = 10  # api.log.1.gz ... api.log.10.gz
+
+# Fracción de las peticiones correctas que registra log_api_call, por endpoint ("Vista.método");
+# los errores se registran siempre. La introspección la llaman los servidores de recursos en
+# cada una de sus peticiones, así que basta con una muestra.
+API_LOG_SAMPLING = {
+    "default": 1.0,
+    "IntrospectOAuthTokenEndpoint.post": 0.01,
+    "IntrospectBatchOAuthTokenEndpoint.post": 0.1,
+}
+
+# Cabeceras que se registran; el resto (Cookie, Authorization...) nunca llega al log
+API_LOG_HEADERS = (
+    "Content-Type",
+    "Content-Length",
+    "User-Agent",
+    "Origin",
+    "X-App-Name",
+    "X-Forwarded-For",
+    "X-Request-Id",
+)
+
+# Registrar el body completo de las respuestas correctas (solo para depurar)
+API_LOG_RESPONSE_DATA = False
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -14,8 +47,10 @@ LOGGING = {
     'handlers': {
         'file': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
+            'class': 'main.logging_config.CompressedRotatingFileHandler',
             'filename': 'logs/api.log',
+            'maxBytes': API_LOG_MAX_BYTES,
+            'backupCount': API_LOG_BACKUP_COUNT,
             'formatter': 'json',
         },
         'console': {
@@ -23,12 +58,24 @@ LOGGING = {
             'class': 'logging.StreamHandler',
             'formatter': 'verbose',
         },
+        'queue': {
+            'class': 'main.logging_config.QueueLogHandler',
+            'sink': 'api.output',
+            'maxsize': API_LOG_QUEUE_SIZE,
+            'drop_policy': API_LOG_DROP_POLICY,
+        },
     },
     'loggers': {
         'api': {
-            'handlers': ['file', 'console'],
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': True,
         },
+        # Destino del listener de la cola; no propaga para no volver a pasar por 'api'
+        'api.output': {
+            'handlers': ['file', 'console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
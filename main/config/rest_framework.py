@@ -5,7 +5,8 @@ REST_FRAMEWORK = {
         "oauth2_provider.contrib.rest_framework.OAuth2Authentication",
         "apps.authentication.authentication.CookieJWTAuthentication",
         # "rest_framework_simplejwt.authentication.JWTAuthentication",
-        "rest_framework.authentication.BasicAuthentication",
+        # BasicAuthentication con el límite de intentos de login antes del hash
+        "apps.authentication.authentication.ThrottledBasicAuthentication",
         # "rest_framework.authentication.SessionAuthentication",
     ),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
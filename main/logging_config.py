@@ -1,52 +1,298 @@
+import gzip
 import json
 import logging
+import os
+import queue
+import random
+import shutil
+import threading
 from datetime import datetime
-from functools import wraps
+from functools import lru_cache, wraps
+from logging.handlers import QueueListener, RotatingFileHandler
+
+from django.conf import settings
+from django.http.request import HttpHeaders
+from django.utils.datastructures import MultiValueDict
 
 # Configurar el logger principal
 logger = logging.getLogger('api')
 
+# Campos del body que impiden registrar el body completo (datos sensibles o masivos); se
+# compara por subcadena, así que cubren también password1, refresh_token, tokens...
+FILTERED_BODY_FIELDS = ('password', 'token')
+
+
+class JSONLogMessage:
+    """
+    Mensaje de log que se serializa a JSON la primera vez que se formatea. Con
+    ``QueueLogHandler`` eso ocurre en el hilo del listener, no en el de la petición.
+    """
+
+    __slots__ = ('data', '_text')
+
+    def __init__(self, data):
+        self.data = data
+        self._text = None
+
+    def __str__(self):
+        if self._text is None:
+            # default=str: un valor no serializable no debe hacer fallar la petición ni perder el registro
+            self._text = json.dumps(self.data, default=str)
+        return self._text
+
+
+class QueueLogHandler(logging.Handler):
+    """
+    Handler que solo encola el registro: un ``QueueListener`` en un hilo aparte lo
+    formatea y lo entrega a los handlers del logger ``sink`` (fichero, consola), de
+    modo que la serialización y la E/S no cuentan en el tiempo de la petición.
+
+    La cola está acotada a ``maxsize`` registros. Si el disco no da abasto y se llena,
+    ``drop_policy`` decide qué se pierde: ``"newest"`` descarta el registro entrante y
+    ``"oldest"`` el más antiguo de la cola. Los registros de nivel ERROR o superior
+    siempre entran (desplazando al más antiguo). Los descartes se cuentan en ``stats()``
+    y se avisan en el propio log con un WARNING en cuanto la cola vuelve a tener sitio.
+
+    El listener arranca con el primer registro de cada proceso (también tras un fork,
+    p. ej. en los workers de Celery o gunicorn). ``close()``, que ``logging.shutdown``
+    llama al salir, vacía la cola antes de cerrar los handlers del sink.
+    """
+
+    DROP_POLICIES = ('newest', 'oldest')
+
+    def __init__(self, sink, maxsize=10000, drop_policy='newest', level=logging.NOTSET):
+        if drop_policy not in self.DROP_POLICIES:
+            raise ValueError(f"drop_policy debe ser uno de {self.DROP_POLICIES}")
+        super().__init__(level)
+        self.sink = logging.getLogger(sink)
+        self.maxsize = maxsize
+        self.drop_policy = drop_policy
+        self.queue = None
+        self.listener = None
+        self._pid = None
+        self._closed = False
+        self._start_lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self._reported_dropped = 0
+
+    def start(self):
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            # Tras un fork el hilo del listener no existe en el hijo: cola y listener nuevos
+            self.queue = queue.Queue(self.maxsize)
+            self._reset_stats()
+            self.listener = _SinkListener(self.queue, self)
+            self.listener.start()
+            self._pid = os.getpid()
+
+    def close(self):
+        """Entrega lo pendiente y detiene el listener"""
+        with self._start_lock:
+            self._closed = True
+            if self.listener is not None and self._pid == os.getpid():
+                self.listener.stop()
+            self.listener = None
+            self._pid = None
+        super().close()
+
+    def emit(self, record):
+        if self._closed:
+            # Registros emitidos durante el cierre del proceso: se escriben directamente
+            self.sink.handle(record)
+            return
+        if self._pid != os.getpid():
+            self.start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if self.drop_policy == 'newest' and record.levelno < logging.ERROR:
+                self.dropped += 1
+                return
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+                self.queue.put_nowait(record)
+            except (queue.Empty, queue.Full):
+                # El listener vació la cola o otro hilo ocupó el hueco entretanto
+                self.dropped += 1
+                return
+        self.enqueued += 1
+        depth = self.queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def deliver(self, record):
+        """Entrega un registro a los handlers del sink; se ejecuta en el hilo del listener"""
+        dropped = self.dropped
+        if dropped > self._reported_dropped:
+            self.sink.handle(logging.makeLogRecord({
+                'name': record.name,
+                'levelno': logging.WARNING,
+                'levelname': 'WARNING',
+                'msg': JSONLogMessage({
+                    'timestamp': datetime.now().isoformat(),
+                    'message': 'Log records dropped: queue full',
+                    'event_type': 'log_records_dropped',
+                    'dropped': dropped - self._reported_dropped,
+                    'dropped_total': dropped,
+                }),
+            }))
+            self._reported_dropped = dropped
+        try:
+            self.sink.handle(record)
+        except Exception:
+            # Un handler del sink que falla no debe tumbar el hilo del listener
+            self.handleError(record)
+            return
+        self.written += 1
+
+    def stats(self):
+        return {
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'dropped': self.dropped,
+            'depth': self.queue.qsize() if self.queue is not None else 0,
+            'max_depth': self.max_depth,
+            'maxsize': self.maxsize,
+        }
+
+
+class _SinkListener(QueueListener):
+    def __init__(self, log_queue, handler):
+        super().__init__(log_queue)
+        self.handler = handler
+
+    def handle(self, record):
+        self.handler.deliver(record)
+
+    def enqueue_sentinel(self):
+        # Con la cola llena put_nowait fallaría: se espera a que el listener haga sitio
+        while self._thread.is_alive():
+            try:
+                self.queue.put(self._sentinel, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+
+class CompressedRotatingFileHandler(RotatingFileHandler):
+    """
+    ``RotatingFileHandler`` que comprime con gzip cada fichero rotado
+    (``api.log.1.gz``, ``api.log.2.gz``...). La compresión se hace al rotar, en el hilo
+    que escribe (el del listener si va detrás de ``QueueLogHandler``).
+    """
+
+    def __init__(self, *args, compresslevel=6, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.compresslevel = compresslevel
+
+    def rotation_filename(self, default_name):
+        return f"{default_name}.gz"
+
+    def rotate(self, source, dest):
+        if not os.path.exists(source):
+            return
+        with open(source, 'rb') as plain, gzip.open(dest, 'wb', compresslevel=self.compresslevel) as compressed:
+            shutil.copyfileobj(plain, compressed, 1024 * 1024)
+        os.remove(source)
+
+
+@lru_cache(maxsize=8)
+def _header_keys(headers):
+    """Claves de ``request.META`` de las cabeceras de ``API_LOG_HEADERS``"""
+    return tuple((name, HttpHeaders.to_wsgi_name(name)) for name in headers)
+
+
+def _has_filtered_fields(data):
+    keys = data.keys() if hasattr(data, 'keys') else ()
+    return any(field in str(key).lower() for key in keys for field in FILTERED_BODY_FIELDS)
+
+
+def _shallow_copy(data):
+    """
+    Copia superficial del body o de la respuesta. El registro se serializa más tarde en
+    el hilo del listener y no debe leer objetos que la vista puede seguir modificando.
+    """
+    if isinstance(data, MultiValueDict):
+        # Igual que lo serializaba json.dumps: el último valor de cada clave
+        return data.dict()
+    if isinstance(data, dict):
+        return dict(data)
+    if isinstance(data, (list, tuple)):
+        return list(data)
+    return data
+
 
 class APILogger:
     """
     Clase para registrar mensajes de log en la aplicación.
     """
 
+    @staticmethod
+    def is_enabled(level):
+        """Si el logger ``api`` registra el nivel ``level`` ('info', 'warning'...)"""
+        return logger.isEnabledFor(getattr(logging, level.upper()))
+
+    @staticmethod
+    def sampled(endpoint):
+        """
+        Decide si se registran los eventos correctos de esta petición a ``endpoint``
+        ("Vista.método") según ``API_LOG_SAMPLING``.
+        """
+        rates = settings.API_LOG_SAMPLING
+        rate = rates.get(endpoint, rates.get('default', 1.0))
+        return rate >= 1 or (rate > 0 and random.random() < rate)
+
     @staticmethod
     def get_request_data(request):
         """
-        Extrae los datos de la solicitud HTTP.
+        Extrae los datos de la solicitud HTTP. Acepta tanto la request de DRF como
+        la ``HttpRequest`` de Django de las vistas asíncronas (sin ``request.data``).
+        Solo se incluyen las cabeceras de ``API_LOG_HEADERS``.
         """
+        data = getattr(request, 'data', request.POST)
+        meta = request.META
         return {
             'method': request.method,
             'path': request.path,
             'user_id': str(request.user.id) if request.user.is_authenticated else None,
-            'ip': request.META.get('REMOTE_ADDR'),
+            'ip': meta.get('REMOTE_ADDR'),
             'app_name': getattr(request, 'app_name', None),
             'auth_type': getattr(request, 'auth_type', None),
-            'headers': dict(request.headers),
+            'headers': {name: meta[key] for name, key in _header_keys(tuple(settings.API_LOG_HEADERS)) if key in meta},
             'query_params': dict(request.GET),
             # Evitar loguear datos sensibles
-            'body': '[FILTERED]' if 'password' in request.data else request.data,
+            'body': '[FILTERED]' if _has_filtered_fields(data) else _shallow_copy(data),
         }
 
     @staticmethod
     def format_log_message(message, extra_data):
         """
-        Formatea el mensaje de log.
+        Formatea el mensaje de log. El JSON se genera al formatear el registro (ver
+        ``JSONLogMessage``), no aquí.
         """
         log_data = {
             'timestamp': datetime.now().isoformat(),
             'message': message,
             **(extra_data or {}),
         }
-        return json.dumps(log_data)
+        return JSONLogMessage(log_data)
 
     @classmethod
     def log_request(cls, level, message, request, extra=None):
         """
-        Registra un log con información de la request
+        Registra un log con información de la request. Si el nivel está desactivado
+        no llega a leer la request (ni a parsear su body).
         """
+        if not cls.is_enabled(level):
+            return
         request_data = cls.get_request_data(request)
         extra_data = {**request_data, **(extra if isinstance(extra, dict) else {})}
         formatted_message = cls.format_log_message(message, extra_data)
@@ -56,42 +302,34 @@ class APILogger:
 
 def log_api_call(level='info'):
     """
-    Decorador para registrar logs de llamadas a la API.
+    Decorador para registrar logs de llamadas a la API. Los eventos de inicio y fin
+    se registran solo en la fracción de peticiones de ``API_LOG_SAMPLING`` (y si el
+    nivel está activo); los errores, siempre.
     """
 
     def decorator(func):
+        method_name = func.__name__
+
         @wraps(func)
         def wrapper(view_instance, request, *args, **kwargs):
-            method_name = func.__name__
-            view_name = view_instance.__class__.__name__
-
-            APILogger.log_request(
-                level,
-                f"API Call Started: {view_name}.{method_name}",
-                request,
-                {'event_type': 'api_call_started'}
-            )
-
-            try:
-                response = func(view_instance, request, *args, **kwargs)
+            endpoint = f"{view_instance.__class__.__name__}.{method_name}"
+            sampled = APILogger.is_enabled(level) and APILogger.sampled(endpoint)
 
-                # Log de respuesta exitosa
+            if sampled:
                 APILogger.log_request(
                     level,
-                    f"API Call Finished: {view_name}.{method_name}",
+                    f"API Call Started: {endpoint}",
                     request,
-                    {
-                        'event_type': 'request_completed',
-                        'status_code': response.status_code,
-                        'response_data': '[FILTERED]' if 'token' in response.data else response.data,
-                    }
+                    {'event_type': 'api_call_started'}
                 )
-                return response
+
+            try:
+                response = func(view_instance, request, *args, **kwargs)
             except Exception as e:
                 # Log de error
                 APILogger.log_request(
                     'error',
-                    f"API Call Failed: {view_name}.{method_name}",
+                    f"API Call Failed: {endpoint}",
                     request,
                     {
                         'event_type': 'request_failed',
@@ -101,6 +339,16 @@ def log_api_call(level='info'):
                 )
                 raise
 
+            if sampled:
+                # Log de respuesta exitosa
+                extra = {'event_type': 'request_completed', 'status_code': response.status_code}
+                if settings.API_LOG_RESPONSE_DATA:
+                    # Las respuestas de TokenView (OAuth2) son HttpResponse sin .data
+                    data = getattr(response, 'data', None)
+                    extra['response_data'] = '[FILTERED]' if _has_filtered_fields(data) else _shallow_copy(data)
+                APILogger.log_request(level, f"API Call Finished: {endpoint}", request, extra)
+            return response
+
         return wrapper
 
     return decorator
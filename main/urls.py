@@ -19,6 +19,8 @@ from django.contrib import admin
 from django.urls import path, include
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
+from apps.authentication.views import JWKSView
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("rest-auth/", include("rest_framework.urls")),
@@ -29,4 +31,5 @@ urlpatterns = [
         name="swagger-ui",
     ),
     path("api/v1/auth/", include("apps.authentication.urls")),
+    path(".well-known/jwks.json", JWKSView.as_view(), name="jwks"),
 ]